@@ -1,7 +1,7 @@
 from airflow import DAG
-from airflow.providers.standard.operators.python import PythonOperator
+from airflow.sdk import task
 from datetime import datetime
-import jobnlp.pipeline as pipeline_tasks
+from jobnlp.pipeline import sharded
 
 default_args = {
     'owner': 'airflow',
@@ -9,32 +9,50 @@ default_args = {
     'retries': 1,
 }
 
+# Date of the run (same day as the scrape), shared by every task.
+RUN_DATE = '{{ data_interval_end | ds }}'
+
 with DAG(
     dag_id='jobnlp_pipeline_python',
     default_args=default_args,
-    description='Pipeline diario con PythonOperator',
+    description='Pipeline diario: tareas mapeadas por sitio y por shard',
     schedule='@daily',
     start_date=datetime(2025, 8, 13),
     catchup=False,
 ) as dag:
-    fetch_raw = PythonOperator(
-        task_id='fetch_raw',
-        python_callable=pipeline_tasks.fetch_raw.main,
-    )
-
-    clean_text = PythonOperator(
-        task_id='clean_text',
-        python_callable=pipeline_tasks.clean_text.air_schedule,
-    )
-
-    nlp_extract = PythonOperator(
-        task_id='nlp_extract',
-        python_callable=pipeline_tasks.nlp_extract.air_schedule,
-    )
-
-    entity_count = PythonOperator(
-        task_id='entity_count',
-        python_callable=pipeline_tasks.entity_count.air_schedule,
-    )
-
-    fetch_raw >> clean_text >> nlp_extract >> entity_count
\ No newline at end of file
+
+    @task
+    def sites() -> list[str]:
+        return sharded.sites()
+
+    @task
+    def fetch_raw(site: str) -> dict:
+        return sharded.fetch_site(site)
+
+    @task
+    def clean_text(fetched: dict, run_date: str) -> dict:
+        return sharded.clean_file(fetched, run_date)
+
+    @task
+    def plan_shards(cleaned: list[dict]) -> list[dict]:
+        # NOTE: waits for every site to be in bronze
+        return sharded.plan_shards()
+
+    @task
+    def nlp_extract(shard: dict, run_date: str) -> dict:
+        return sharded.nlp_shard(shard, run_date)
+
+    @task
+    def entity_count(shard_results: list[dict], run_date: str) -> dict:
+        return sharded.aggregate(list(shard_results), run_date)
+
+    @task
+    def entity_trends(totals: dict, run_date: str) -> dict:
+        return sharded.trends(totals, run_date)
+
+    fetched = fetch_raw.expand(site=sites())
+    cleaned = clean_text.partial(run_date=RUN_DATE).expand(fetched=fetched)
+    shards = plan_shards(cleaned)
+    extracted = nlp_extract.partial(run_date=RUN_DATE).expand(shard=shards)
+    counted = entity_count(extracted, RUN_DATE)
+    entity_trends(counted, RUN_DATE)
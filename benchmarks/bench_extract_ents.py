@@ -0,0 +1,61 @@
+'''
+Throughput of `nlp_extract.extract_ents` over a synthetic bronze corpus,
+for a grid of `batch_size` / `n_process` settings.
+
+    python -m benchmarks.bench_extract_ents --n-ads 20000 \
+        --batch-sizes 64 256 1024 --n-process 1 2 4
+'''
+import argparse
+import time
+
+from jobnlp.nlp.nlp_custom import NLPRules
+from jobnlp.nlp.nlp_models import SpacyModel
+from jobnlp.pipeline.nlp_extract import MOD_RUL_PATH, extract_ents
+from jobnlp.utils.logger import get_logger, setup_logging
+from jobnlp.utils.read_labels import PATT_PATH
+
+from benchmarks.corpus import gen_bronze
+
+log = get_logger(__name__)
+
+def load_rules_model():
+    nlp_rul = NLPRules(log)
+    if MOD_RUL_PATH.exists():
+        nlp_rul.load_model(MOD_RUL_PATH)
+    else:
+        # NOTE: same steps as `nlp.es_ruler_builder`, kept in memory
+        nlp_rul.add_ruler_pipe(SpacyModel(log=log).get_blank_mod())
+        nlp_rul.load_patterns(PATT_PATH)
+    return nlp_rul.nlp
+
+def run(nlp, data, batch_size: int, n_process: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    n_ents = sum(1 for _ in extract_ents(nlp, data, batch_size=batch_size,
+                                         n_process=n_process))
+    return time.perf_counter() - start, n_ents
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-ads", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+",
+                        default=[32, 128, 512, 2048])
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1, 2])
+    args = parser.parse_args()
+
+    setup_logging(level="WARNING")
+    nlp = load_rules_model()
+    data = gen_bronze(args.n_ads, seed=args.seed)
+
+    print(f"{'batch_size':>10} {'n_process':>9} {'secs':>8} "
+          f"{'ads/s':>10} {'ents':>8}")
+    for n_process in args.n_process:
+        for batch_size in args.batch_sizes:
+            secs, n_ents = run(nlp, data, batch_size, n_process)
+            print(f"{batch_size:>10} {n_process:>9} {secs:>8.2f} "
+                  f"{args.n_ads / secs:>10.0f} {n_ents:>8}")
+
+if __name__ == "__main__":
+
+    main()
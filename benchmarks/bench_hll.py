@@ -0,0 +1,96 @@
+'''
+Accuracy and size of the gold HyperLogLog sketches (`jobnlp.utils.hll`)
+against exact distinct counts, on synthetic ads that stay online for
+several days (so daily counts overlap) and entities of Zipf-like
+popularity. For windows of each length, the merged daily sketches of
+every entity are compared with the exact distinct ads of the window.
+
+    python -m benchmarks.bench_hll [--days 90] [--ads-per-day 2000]
+        [--entities 300] [--windows 1 7 30 90]
+'''
+import argparse
+import hashlib
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from jobnlp.utils.hll import ERROR_SIGMAS, HLL
+
+def gen_days(days: int, ads_per_day: int, n_entities: int,
+             seed: int = 0) -> list[dict[int, set[str]]]:
+    '''
+    Per day, `entity -> hashes` of the ads online that day. Each ad
+    lasts 1-14 days and mentions 1-4 entities.
+    '''
+    rnd = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(n_entities)]
+    per_day: list[dict[int, set[str]]] = [defaultdict(set)
+                                          for _ in range(days)]
+    n = 0
+    for day in range(days):
+        for _ in range(ads_per_day // 5):
+            h = hashlib.sha256(f"ad {n}".encode()).hexdigest()
+            n += 1
+            ents = set(rnd.choices(range(n_entities), weights,
+                                   k=rnd.randint(1, 4)))
+            for d in range(day, min(day + rnd.randint(1, 14), days)):
+                for e in ents:
+                    per_day[d][e].add(h)
+    return per_day
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--ads-per-day", type=int, default=2000,
+                        help="Ads online per day, about")
+    parser.add_argument("--entities", type=int, default=300)
+    parser.add_argument("--windows", type=int, nargs="+",
+                        default=[1, 7, 30, 90])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    per_day = gen_days(args.days, args.ads_per_day, args.entities,
+                       args.seed)
+    start = time.perf_counter()
+    blobs = [{e: HLL().update(hs).to_bytes() for e, hs in day.items()}
+             for day in per_day]
+    build_secs = time.perf_counter() - start
+    sizes = [len(b) for day in blobs for b in day.values()]
+    print(f"{len(sizes)} entity-day sketches, built in {build_secs:.2f} s, "
+          f"{statistics.mean(sizes):.0f} B mean, {max(sizes)} B max, "
+          f"{sum(sizes) / 1024:.0f} KiB total")
+
+    print(f"{'window':>7} {'entities':>9} {'mean err':>9} {'max err':>8} "
+          f"{'in bounds':>10} {'sum daily':>10} {'ms/merge':>9}")
+    for window in args.windows:
+        window = min(window, args.days)
+        errs, inside, overcount, merges, merge_secs = [], 0, [], 0, 0.0
+        for first in range(0, args.days - window + 1, max(window, 7)):
+            days = range(first, first + window)
+            for e in range(args.entities):
+                exact = set().union(*(per_day[d].get(e, ()) for d in days))
+                if not exact:
+                    continue
+                start = time.perf_counter()
+                sketch = HLL()
+                for d in days:
+                    if e in blobs[d]:
+                        sketch |= HLL.from_bytes(blobs[d][e])
+                merge_secs += time.perf_counter() - start
+                merges += 1
+                est = sketch.estimate()
+                low, high = sketch.bounds(ERROR_SIGMAS)
+                errs.append(abs(est / len(exact) - 1))
+                inside += low <= len(exact) <= high
+                overcount.append(sum(len(per_day[d].get(e, ()))
+                                     for d in days) / len(exact))
+        print(f"{window:>7} {merges:>9} {statistics.mean(errs):>9.2%} "
+              f"{max(errs):>8.2%} {inside / merges:>10.1%} "
+              f"{statistics.mean(overcount):>9.1f}x "
+              f"{merge_secs / merges * 1e3:>9.3f}")
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,106 @@
+'''
+Import time of `jobnlp` modules, each in a fresh interpreter (best of
+`--repeat`), checked against a budget. `jobnlp.pipeline.sharded` is
+what the Airflow DAG imports on every parse and task start.
+
+    python -m benchmarks.bench_import [--repeat 5] [--scale 2.0]
+
+Exits with status 1 if a module is over budget (times `--scale`, for
+slow machines), imports a heavy dependency (`HEAVY`) or creates files
+in the working directory when imported.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# module -> budget in milliseconds. Mostly standard library imports
+# (logging, pathlib, re); spaCy, bs4 or requests alone take longer.
+BUDGETS_MS = {
+    "jobnlp.pipeline": 15,
+    "jobnlp.pipeline.sharded": 100,
+    "jobnlp.pipeline.clean_text": 80,
+    "jobnlp.pipeline.nlp_extract": 80,
+    "jobnlp.pipeline.nlp_worker": 90,
+    "jobnlp.pipeline.entity_count": 60,
+    "jobnlp.pipeline.fetch_raw": 60,
+    "jobnlp.pipeline.entity_cooc": 60,
+    "jobnlp.pipeline.entity_distinct": 60,
+    "jobnlp.pipeline.entity_trends": 60,
+    "jobnlp.pipeline.retention": 60,
+    "jobnlp.cli": 120,
+}
+# loaded on first use only, never by an import
+HEAVY = ("spacy", "bs4", "requests", "psycopg2", "yaml", "dotenv",
+         "pyarrow", "jsonlines", "numpy", "scipy")
+
+CHILD = '''
+import json, os, sys, time
+start = time.perf_counter()
+import {module}
+ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": ms, "modules": sorted(sys.modules),
+                  "files": os.listdir(".")}}))
+'''
+
+def measure(module: str) -> dict:
+    # NOTE: runs in an empty directory (to catch files created at
+    # import), so relative PYTHONPATH entries are made absolute.
+    env = dict(os.environ)
+    if env.get("PYTHONPATH"):
+        env["PYTHONPATH"] = os.pathsep.join(
+            os.path.abspath(p) for p in env["PYTHONPATH"].split(os.pathsep))
+    with tempfile.TemporaryDirectory() as cwd:
+        out = subprocess.run([sys.executable, "-c",
+                              CHILD.format(module=module)],
+                             cwd=cwd, env=env, capture_output=True,
+                             text=True, check=True)
+    return json.loads(out.stdout)
+
+def check(module: str, budget_ms: float, repeat: int) -> tuple[float, list]:
+    try:
+        runs = [measure(module) for _ in range(repeat)]
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.strip().splitlines()[-1] if e.stderr else e
+        return float("nan"), [f"import failed: {error}"]
+    problems = []
+    heavy = sorted({m.split(".")[0] for m in runs[0]["modules"]
+                    if m.split(".")[0] in HEAVY})
+    if heavy:
+        problems.append(f"imports {', '.join(heavy)}")
+    if runs[0]["files"]:
+        problems.append(f"creates {', '.join(runs[0]['files'])}")
+    best = min(r["ms"] for r in runs)
+    if best > budget_ms:
+        problems.append(f"over budget ({budget_ms:.0f} ms)")
+    return best, problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float,
+                        default=float(os.getenv("JOBNLP_IMPORT_BUDGET_SCALE",
+                                                1.0)),
+                        help="Budget multiplier "
+                             "(default: $JOBNLP_IMPORT_BUDGET_SCALE or 1)")
+    parser.add_argument("--only", nargs="+", choices=list(BUDGETS_MS),
+                        default=list(BUDGETS_MS))
+    args = parser.parse_args()
+
+    print(f"{'module':<32} {'ms':>7} {'budget':>7}")
+    failed = False
+    for module in args.only:
+        budget = BUDGETS_MS[module] * args.scale
+        best, problems = check(module, budget, args.repeat)
+        status = "FAIL: " + "; ".join(problems) if problems else "ok"
+        print(f"{module:<32} {best:>7.1f} {budget:>7.0f}  {status}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,70 @@
+'''
+Memory per record of the slotted record types (`jobnlp.records`)
+against the dicts they replace, for each layer. Field values are
+built once and shared, so only the containers are measured.
+
+    python -m benchmarks.bench_records --n 100000
+'''
+import argparse
+import gc
+import tracemalloc
+from datetime import date
+from typing import Callable
+
+from jobnlp.records import BronzeRecord, GoldRecord, RawRecord, SilverRecord
+
+from benchmarks.corpus import gen_bronze, gen_raw, gen_silver
+
+def measure(build: Callable[[], list]) -> int:
+    '''
+    Bytes allocated by `build()` and still held by its result.
+    '''
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+def layer_values(n: int) -> dict[str, tuple[type, list[tuple]]]:
+    '''
+    Field values of `n` records of each layer, in the field order of
+    its record type.
+    '''
+    raw = gen_raw(n)
+    bronze = gen_bronze(n)
+    silver = gen_silver(bronze)[:n]
+    gold = [(f"entity {i % 500}", "PUESTO", i % 40, i % 30,
+             date(2025, 8, 13)) for i in range(n)]
+    return {
+        "raw": (RawRecord, [tuple(r.as_dict().values()) for r in raw]),
+        "bronze": (BronzeRecord, [(t, d, "https://example.com/empleos", h)
+                                  for d, t, h in bronze]),
+        "silver": (SilverRecord, [tuple(r.as_dict().values())
+                                  for r in silver]),
+        "gold": (GoldRecord, gold),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000,
+                        help="Records per layer")
+    args = parser.parse_args()
+
+    print(f"{'layer':>8} {'records':>8} {'dict B':>8} {'slots B':>8} "
+          f"{'saved':>7}")
+    for layer, (cls, values) in layer_values(args.n).items():
+        keys = cls.__slots__
+        as_dicts = measure(lambda: [dict(zip(keys, v)) for v in values])
+        as_records = measure(lambda: [cls(*v) for v in values])
+        n = len(values)
+        print(f"{layer:>8} {n:>8} {as_dicts / n:>8.1f} "
+              f"{as_records / n:>8.1f} "
+              f"{1 - as_records / as_dicts:>7.1%}")
+
+if __name__ == "__main__":
+
+    main()
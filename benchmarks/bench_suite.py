@@ -0,0 +1,298 @@
+'''
+Microbenchmarks of the pipeline hot paths over a seeded synthetic
+corpus (`benchmarks.corpus`):
+
+    clean_html, normalize_text, gen_hash    raw record -> bronze
+    extract_ents                             bronze -> silver rows
+    insert_bronze, insert_bronze_many,       inserts into the storage
+    insert_silver_many                       backend
+    gold_aggregation                         agreg_from_silver + insert_gold
+
+    python -m benchmarks.bench_suite --n-ads 5000 --repeat 5
+    python -m benchmarks.bench_suite --compare benchmarks/results/<old>.json
+
+The database benchmarks run against `--backend` (default:
+`$JOBNLP_DB_BACKEND` or postgres): use a local, disposable Postgres,
+rows are written with scrap dates from `BENCH_DATE` and deleted after
+the run. With `sqlite` a temporary file is used. `--no-db` skips them.
+
+Results (best and median of `--repeat` rounds) are saved as JSON in
+`--out`, named by time and commit, so runs of different commits can be
+compared with `--compare`.
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable
+
+from jobnlp.records import BronzeRecord
+from jobnlp.utils.logger import get_logger, setup_logging
+
+from benchmarks.corpus import gen_bronze, gen_raw, gen_silver
+
+log = get_logger(__name__)
+
+RESULTS_DIR = Path("benchmarks/results")
+# scrap dates of the rows written by the database benchmarks
+BENCH_DATE = date(1999, 1, 1)
+# row-by-row inserts are slow, they run on a slice of the corpus
+SINGLE_INSERTS = 1000
+LAYERS = ("ads_gold", "ads_silver", "ads_bronze")
+
+# name -> setup(ctx) returning (ops per round, run(round))
+BENCHES: dict[str, Callable] = {}
+
+def bench(name: str):
+    def register(setup):
+        BENCHES[name] = setup
+        return setup
+    return register
+
+
+class Context:
+    def __init__(self, n_ads: int, seed: int, repeat: int,
+                 backend_name: str | None, engine: str):
+        self.n_ads = n_ads
+        self.seed = seed
+        self.repeat = repeat
+        self.backend_name = backend_name
+        self.engine = engine
+        self.raw = gen_raw(n_ads, seed=seed)
+        self.backend = None
+
+    def bronze(self, rnd: int, offset: int = 0) -> list[tuple]:
+        # NOTE: one date and seed per round, so every round inserts
+        # new rows instead of hitting the conflict path.
+        day = rnd + offset
+        return gen_bronze(self.n_ads, seed=self.seed + day,
+                          scrap_date=BENCH_DATE + timedelta(days=day))
+
+
+# -- raw -> bronze --
+
+@bench("clean_html")
+def bench_clean_html(ctx: Context):
+    from jobnlp.pipeline.clean_text import clean_html
+    raws = [r["raw"] for r in ctx.raw]
+    return len(raws), lambda rnd: [clean_html(r) for r in raws]
+
+@bench("normalize_text")
+def bench_normalize_text(ctx: Context):
+    from jobnlp.pipeline.clean_text import clean_html, normalize_text
+    texts = [clean_html(r["raw"]) for r in ctx.raw]
+    return len(texts), lambda rnd: [normalize_text(t) for t in texts]
+
+@bench("gen_hash")
+def bench_gen_hash(ctx: Context):
+    from jobnlp.pipeline.clean_text import gen_hash
+    texts = [text for _, text, _ in ctx.bronze(0)]
+    return len(texts), lambda rnd: [gen_hash(t) for t in texts]
+
+# -- bronze -> silver --
+
+@bench("extract_ents")
+def bench_extract_ents(ctx: Context):
+    from jobnlp.pipeline.nlp_extract import load_extractor
+    extract = load_extractor(log, ctx.engine, n_process=1)
+    data = ctx.bronze(0)
+    return len(data), lambda rnd: sum(1 for _ in extract(data))
+
+# -- storage backend --
+
+@bench("insert_bronze")
+def bench_insert_bronze(ctx: Context):
+    # NOTE: on the dates after those of the other benchmarks
+    rounds = [[BronzeRecord(norm_text=t, scrap_date=d, source_url="bench",
+                            hash=h)
+               for d, t, h in ctx.bronze(rnd, ctx.repeat)[:SINGLE_INSERTS]]
+              for rnd in range(ctx.repeat)]
+
+    def run(rnd):
+        for add in rounds[rnd]:
+            ctx.backend.insert_bronze(add, log)
+    return len(rounds[0]), run
+
+@bench("insert_bronze_many")
+def bench_insert_bronze_many(ctx: Context):
+    from jobnlp.pipeline.clean_text import BRONZE_BATCH_SIZE
+    from jobnlp.pipeline.writer import batched
+    rounds = [[BronzeRecord(norm_text=t, scrap_date=d, source_url="bench",
+                            hash=h) for d, t, h in ctx.bronze(rnd)]
+              for rnd in range(ctx.repeat)]
+
+    def run(rnd):
+        for batch in batched(rounds[rnd], BRONZE_BATCH_SIZE):
+            ctx.backend.insert_bronze_many(batch, log)
+    return len(rounds[0]), run
+
+@bench("insert_silver_many")
+def bench_insert_silver_many(ctx: Context):
+    from jobnlp.pipeline.nlp_extract import SILVER_BATCH_SIZE
+    from jobnlp.pipeline.writer import batched
+    rounds = [gen_silver(ctx.bronze(rnd), seed=ctx.seed + rnd)
+              for rnd in range(ctx.repeat)]
+
+    def run(rnd):
+        for batch in batched(rounds[rnd], SILVER_BATCH_SIZE):
+            ctx.backend.insert_silver_many(batch, log)
+    return len(rounds[0]), run
+
+@bench("gold_aggregation")
+def bench_gold_aggregation(ctx: Context):
+    # NOTE: aggregates the silver rows of `insert_silver_many`, run it
+    # in the same suite.
+    def run(rnd):
+        day = BENCH_DATE + timedelta(days=rnd)
+        for row in ctx.backend.agreg_from_silver(date_eq=day, log=log):
+            ctx.backend.insert_gold(row, log)
+    n_rows = len(gen_silver(ctx.bronze(0), seed=ctx.seed))
+    return n_rows, run
+
+DB_BENCHES = ("insert_bronze", "insert_bronze_many", "insert_silver_many",
+              "gold_aggregation")
+
+
+def delete_bench_rows(ctx: Context) -> None:
+    last = BENCH_DATE + timedelta(days=2 * ctx.repeat)
+    if ctx.backend_name == "sqlite":
+        return      # temporary file
+    with ctx.backend.conn.cursor() as cur:
+        for table in LAYERS:
+            cur.execute(f"DELETE FROM ads_lakehouse.{table} "
+                        "WHERE scrap_date BETWEEN %s AND %s",
+                        (BENCH_DATE, last))
+    ctx.backend.conn.commit()
+
+def time_bench(name: str, ctx: Context) -> dict:
+    n_ops, run = BENCHES[name](ctx)
+    secs = []
+    for rnd in range(ctx.repeat):
+        start = time.perf_counter()
+        run(rnd)
+        secs.append(time.perf_counter() - start)
+    median = statistics.median(secs)
+    return {"ops": n_ops, "best_s": min(secs), "median_s": median,
+            "ops_per_s": n_ops / median if median > 0 else 0.0}
+
+def git_commit() -> dict:
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True,
+                              text=True).stdout.strip()
+    try:
+        return {"commit": git("rev-parse", "--short", "HEAD") or None,
+                "dirty": bool(git("status", "--porcelain",
+                                  "--untracked-files=no"))}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+def run_suite(ctx: Context, names: list[str]) -> dict:
+    results = {}
+    db_names = [n for n in names if n in DB_BENCHES]
+    if db_names:
+        from jobnlp.db.backends import get_backend
+        try:
+            ctx.backend = get_backend(ctx.backend_name, log=log)
+            ctx.backend.init_schema()
+            delete_bench_rows(ctx)
+        except Exception as e:
+            log.error(f"No {ctx.backend_name} database, skipping "
+                      f"{', '.join(db_names)}. {type(e).__name__}: {e}")
+            names = [n for n in names if n not in DB_BENCHES]
+    try:
+        for name in names:
+            try:
+                results[name] = time_bench(name, ctx)
+            except (ImportError, FileNotFoundError) as e:
+                log.error(f"Skipping {name}. {type(e).__name__}: {e}")
+                continue
+            print(format_row(name, results[name]), flush=True)
+    finally:
+        if ctx.backend is not None:
+            delete_bench_rows(ctx)
+            ctx.backend.close()
+    return results
+
+def format_row(name: str, res: dict, base: dict | None = None) -> str:
+    row = (f"{name:<20} {res['ops']:>8} {res['best_s']:>9.4f} "
+           f"{res['median_s']:>9.4f} {res['ops_per_s']:>12.0f}")
+    if base is not None:
+        change = res["ops_per_s"] / base["ops_per_s"] - 1
+        row += f" {change:>+8.1%}"
+    return row
+
+def compare(report: dict, baseline_path: Path) -> None:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path.name} "
+          f"(commit {baseline['meta'].get('commit')}): median ops/s")
+    for name, res in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(format_row(name, res))
+            continue
+        print(format_row(name, res, base))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-ads", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHES),
+                        default=list(BENCHES))
+    parser.add_argument("--backend", choices=("postgres", "sqlite"),
+                        default=os.getenv("JOBNLP_DB_BACKEND", "postgres"))
+    parser.add_argument("--engine", choices=("spacy", "trie"),
+                        default=os.getenv("JOBNLP_NLP_ENGINE", "spacy"))
+    parser.add_argument("--no-db", action="store_true",
+                        help="Skip the storage backend benchmarks")
+    parser.add_argument("--out", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--compare", type=Path, default=None,
+                        help="Previous results file to compare with")
+    args = parser.parse_args()
+
+    setup_logging(level="WARNING")
+    names = [n for n in args.only
+             if not (args.no_db and n in DB_BENCHES)]
+    if args.backend == "sqlite":
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["JOBNLP_SQLITE_PATH"] = str(Path(tmp.name) / "bench.db")
+
+    ctx = Context(args.n_ads, args.seed, args.repeat, args.backend,
+                  args.engine)
+    print(f"{'benchmark':<20} {'ops':>8} {'best s':>9} {'median s':>9} "
+          f"{'ops/s':>12}")
+    results = run_suite(ctx, names)
+
+    started = datetime.now()
+    report = {
+        "meta": {**git_commit(),
+                 "created_at": started.isoformat(timespec="seconds"),
+                 "python": sys.version.split()[0],
+                 "platform": platform.platform(),
+                 "n_ads": args.n_ads, "seed": args.seed,
+                 "repeat": args.repeat, "backend": args.backend,
+                 "engine": args.engine},
+        "results": results,
+    }
+    args.out.mkdir(parents=True, exist_ok=True)
+    out = args.out / (f"{started.strftime('%Y%m%dT%H%M%S')}_"
+                      f"{report['meta']['commit'] or 'nogit'}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to: {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,100 @@
+'''
+Equivalence check between the spaCy rules model and the compiled trie
+engine (`jobnlp.nlp.trie_matcher`): both must return the same
+`(entity_text, label, start_char, end_char)` spans for every text.
+Also reports start-up and per-ad cost of each engine.
+
+    python -m benchmarks.check_trie_equivalence --n-ads 20000
+
+Exits with status 1 if any text differs.
+'''
+import argparse
+import subprocess
+import sys
+import time
+
+from jobnlp.nlp.trie_matcher import TrieMatcher, compile_rules
+from jobnlp.pipeline.nlp_extract import MOD_RUL_PATH, TRIE_RUL_PATH
+
+from benchmarks.bench_extract_ents import load_rules_model
+from benchmarks.corpus import gen_texts
+
+# Tokenization corner cases around rule words.
+EDGE_CASES = [
+    "cajero.", "cajero,vendedor", "cajero/a", "cajero/as", "(cajero)",
+    "¿cajero?", "¡cajero!", "\"cajero\"", "«cajero»", "cajero-vendedor",
+    "cajero-2", "2-cajero", "cajero2", "cajero:", "cajero;", "cajero...",
+    "cajero…", "c/experiencia", "c/exp.", "con moto", "full time",
+    "carnet de conducir", "sr. cajero", "dr. enfermero", "etc. mozo",
+    "mozo/a y moza", "vendedor(a)", "chofer,", "chofer.con", "chofer.Con",
+    "excel-word", "word/excel.", "albañil!!", "peluquero/a-peluquera",
+    "'farmacéutico'", "kinesiólogo/psicólogo", "CAJERO", "Cajera",
+    "www.cajero.com", "cajero@mail.com", "#cajero", "*cajero*", "_cajero_",
+    "cajero  mozo", "cajero\tmozo", "cajero\nmozo", "  cajero  ",
+    "de 9 a 18hs. cajero", "25años cajera", "cajera25", "$50000 cajero",
+    "cajero:vendedor", "cajero=mozo", "cajero<mozo>", "pal cajero",
+    # chunks without rule words are skipped (`TrieMatcher._tokens`)
+    "supercajero cajero", "cajeros cajero cajero", "cajero x-y mozo",
+    "x cajero x x mozo x",
+]
+
+def spacy_spans(nlp, text: str) -> list[tuple]:
+    return [(e.text, e.label_, e.start_char, e.end_char)
+            for e in nlp(text).ents]
+
+def startup_secs(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n-ads", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    nlp = load_rules_model()
+    ruler = nlp.get_pipe("entity_ruler")
+    matcher = TrieMatcher(compile_rules(nlp, ruler.patterns))
+
+    texts = EDGE_CASES + [t.lower() for t in EDGE_CASES] \
+        + gen_texts(args.n_ads, seed=args.seed)
+
+    failures = 0
+    for text in texts:
+        expected = spacy_spans(nlp, text)
+        got = matcher.find(text)
+        if expected != got:
+            failures += 1
+            print(f"MISMATCH {text!r}\n  spacy: {expected}\n  trie:  {got}")
+
+    start = time.perf_counter()
+    for text in texts:
+        spacy_spans(nlp, text)
+    spacy_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for text in texts:
+        matcher.find(text)
+    trie_secs = time.perf_counter() - start
+
+    n = len(texts)
+    print(f"texts: {n}, mismatches: {failures}")
+    print(f"per-ad  spacy: {spacy_secs / n * 1e6:8.1f} us | "
+          f"trie: {trie_secs / n * 1e6:8.1f} us")
+
+    if MOD_RUL_PATH.exists() and TRIE_RUL_PATH.exists():
+        spacy_start = startup_secs(
+            f"import spacy; spacy.load({str(MOD_RUL_PATH)!r})")
+        trie_start = startup_secs(
+            "from jobnlp.nlp.trie_matcher import TrieMatcher; "
+            f"TrieMatcher.from_file({str(TRIE_RUL_PATH)!r})")
+        print(f"startup spacy: {spacy_start:8.2f} s  | "
+              f"trie: {trie_start:8.2f} s")
+
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+
+    main()
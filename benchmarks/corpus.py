@@ -0,0 +1,153 @@
+'''
+Seeded generator of synthetic Spanish classified job ads,
+built on the vocabulary of `job_ruler_patterns.jsonl`.
+
+    gen_raw     scraper records (`p.pago` HTML and text nodes)
+    gen_texts   normalized ad texts
+    gen_bronze  `(scrap_date, norm_text, hash)` rows
+    gen_silver  `ads_silver` rows for the bronze rows
+'''
+import hashlib
+import json
+import random
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+from jobnlp.records import RawRecord, SilverRecord
+from jobnlp.utils.read_labels import PATT_PATH
+
+TEMPLATES = [
+    "se busca {PUESTO} para {NEGOCIO} {REQUIS}",
+    "{NEGOCIO} necesita {PUESTO} con {REQUIS}",
+    "busco trabajo como {PUESTO}, {REQUIS}",
+    "se necesita {PUESTO} y {PUESTO} para {NEGOCIO} zona centro",
+    "{PUESTO} con {REQUIS} se ofrece para {NEGOCIO}",
+    "importante {NEGOCIO} incorpora {PUESTO}. {REQUIS} excluyente",
+    "me ofrezco como {PUESTO} por horas",
+]
+FILLER = ["urgente", "zona norte", "buen sueldo", "enviar cv",
+          "lunes a viernes", "medio tiempo", "turno mañana",
+          "sin experiencia", "mayor de 25", "presentarse con dni"]
+# contact data, removed by `clean_text.normalize_text`
+CONTACTS = [
+    "Tel. 221-{n3}-{n4}",
+    "Cel. 221 15 {n3} {n4}",
+    "(0221) 4{n2}-{n4}",
+    "Wsp +54 9 221 {n3}{n4}",
+    "Contacto: {name}{n2}@gmail.com",
+    "Enviar CV a {name}.rrhh@hotmail.com",
+    "Presentarse en calle {n2} n° {n4}",
+    "Dirigirse a {n2} e/ {n1} y {n2}",
+    "Av. 7 y 4{n1}, www.{name}.com.ar",
+]
+NAMES = ["empleos", "seleccion", "juanperez", "comercial", "admin"]
+
+def load_lexicon(path: Path = PATT_PATH) -> dict[str, list[str]]:
+    '''
+    `LOWER` values of the rules, by label.
+    '''
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    lexicon = defaultdict(list)
+    for rule in rules:
+        pattern = rule["pattern"]
+        if isinstance(pattern, str):
+            lexicon[rule["label"]].append(pattern.lower())
+        else:
+            lexicon[rule["label"]].append(
+                " ".join(tok.get("LOWER", "") for tok in pattern))
+    return dict(lexicon)
+
+def _fill(tpl: str, rnd: random.Random, lexicon: dict[str, list[str]]
+          ) -> str:
+    text = tpl
+    while "{" in text:
+        start = text.index("{")
+        end = text.index("}", start)
+        label = text[start + 1:end]
+        text = text[:start] + rnd.choice(lexicon[label]) + text[end + 1:]
+    return text
+
+def _ad_text(rnd: random.Random, lexicon: dict[str, list[str]]) -> str:
+    text = _fill(rnd.choice(TEMPLATES), rnd, lexicon)
+    extra = rnd.sample(FILLER, k=rnd.randint(0, 3))
+    return " ".join([text, *extra])
+
+def _contact(rnd: random.Random) -> str:
+    return rnd.choice(CONTACTS).format(
+        n1=rnd.randint(1, 9), n2=rnd.randint(10, 99),
+        n3=rnd.randint(100, 999), n4=rnd.randint(1000, 9999),
+        name=rnd.choice(NAMES))
+
+def gen_texts(n: int, seed: int = 0) -> list[str]:
+    '''
+    `n` normalized ad texts (lowercase, no contact data).
+    '''
+    rnd = random.Random(seed)
+    lexicon = load_lexicon()
+    return [_ad_text(rnd, lexicon) for _ in range(n)]
+
+def gen_raw(n: int, seed: int = 0, html_share: float = 0.3,
+            scrap_date: date = date(2025, 8, 13),
+            source_url: str = "https://example.com/empleos"
+            ) -> list[RawRecord]:
+    '''
+    `n` records shaped like `NewsPapAds.extract` output: `p.pago` HTML
+    (`html_share` of them) and `.avisos.normal` text nodes, with mixed
+    case, contact data and markup for `clean_text` to remove.
+    '''
+    rnd = random.Random(seed)
+    lexicon = load_lexicon()
+    ts = f"{scrap_date.isoformat()}T09:00:00+00:00"
+    records = []
+    for _ in range(n):
+        text = _ad_text(rnd, lexicon)
+        if rnd.random() < 0.3:
+            text = text.upper()
+        else:
+            text = text[0].upper() + text[1:]
+        contact = _contact(rnd)
+        if rnd.random() < html_share:
+            title, _, body = text.partition(" para ")
+            raw = (f'<p class="pago"><b>{title}</b> {body}<br/>'
+                   f'<span class="tel">{contact}</span></p>')
+            kind, selector = "html", "css_class=pago"
+        else:
+            raw = f"{text}. {contact}"
+            kind, selector = "text_node", "css_class=avisos normal"
+        records.append(RawRecord(raw, kind, selector, ts, source_url))
+    return records
+
+def gen_bronze(n: int, seed: int = 0,
+               scrap_date: date = date(2025, 8, 13)) -> list[tuple]:
+    '''
+    Rows shaped like `nlp_extract.load_bronze_adds` output:
+    `(scrap_date, norm_text, hash)`.
+    '''
+    rows = []
+    for i, text in enumerate(gen_texts(n, seed)):
+        # NOTE: index salt keeps hashes unique for repeated texts
+        h = hashlib.sha256(f"{i}:{text}".encode("utf-8")).hexdigest()
+        rows.append((scrap_date, text, h))
+    return rows
+
+def gen_silver(bronze: list[tuple], seed: int = 0,
+               max_ents: int = 4) -> list[SilverRecord]:
+    '''
+    1 to `max_ents` entity rows of the lexicon per bronze row, shaped
+    like `nlp_extract.extract_ents` output.
+    '''
+    rnd = random.Random(seed)
+    lexicon = load_lexicon()
+    labels = sorted(lexicon)
+    rows = []
+    for scrap_date, _, hash_ in bronze:
+        ents = set()
+        for _ in range(rnd.randint(1, max_ents)):
+            label = rnd.choice(labels)
+            ents.add((rnd.choice(lexicon[label]), label))
+        for i, (ent_text, label) in enumerate(sorted(ents)):
+            rows.append(SilverRecord(scrap_date, ent_text, label, i * 3,
+                                     i * 3 + 2, hash_))
+    return rows
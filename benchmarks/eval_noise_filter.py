@@ -0,0 +1,97 @@
+'''
+Evaluation of the pre-NLP noise filter (`jobnlp.nlp.noise_filter`)
+against labelled text nodes (`noise_samples.jsonl`: `{"text", "ad"}`),
+normalized like `clean_text` does. Reports kept/dropped ads and noise,
+precision and recall of the drops, drops by reason, ads the rules
+could match that the heuristics drop, and cost per text.
+
+    python -m benchmarks.eval_noise_filter [--synthetic 10000] \
+        [--min-chars 12 --min-words 2 --min-alpha 0.5 --no-lexicon]
+
+`--synthetic` adds ads of `benchmarks.corpus` to the labelled ones.
+'''
+import argparse
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from jobnlp.nlp.noise_filter import NoiseConfig, NoiseFilter, REASONS
+from jobnlp.nlp.ruleset import load_patterns
+from jobnlp.pipeline.clean_text import normalize_text
+
+from benchmarks.corpus import gen_texts
+
+SAMPLES_PATH = Path(__file__).parent / "noise_samples.jsonl"
+
+def load_samples(path: Path = SAMPLES_PATH) -> list[tuple[str, bool]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [(obj["text"], obj["ad"])
+                for obj in map(json.loads, f) if obj]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=Path, default=SAMPLES_PATH)
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Synthetic ads added to the samples")
+    parser.add_argument("--min-chars", type=int,
+                        default=NoiseConfig().min_chars)
+    parser.add_argument("--min-words", type=int,
+                        default=NoiseConfig().min_words)
+    parser.add_argument("--min-alpha", type=float,
+                        default=NoiseConfig().min_alpha)
+    parser.add_argument("--no-lexicon", action="store_true",
+                        help="Heuristics only")
+    parser.add_argument("--show", action="store_true",
+                        help="Print the misclassified samples")
+    args = parser.parse_args()
+
+    config = NoiseConfig(args.min_chars, args.min_words, args.min_alpha,
+                         lexicon=not args.no_lexicon)
+    noise = NoiseFilter(load_patterns(), config)
+
+    samples = [(normalize_text(t), ad) for t, ad in load_samples(args.samples)]
+    samples += [(t, True) for t in gen_texts(args.synthetic)]
+    # NOTE: texts left empty by the cleaning never reach bronze
+    cleaned = sum(1 for t, _ in samples if not t)
+    samples = [(t, ad) for t, ad in samples if t]
+
+    start = time.perf_counter()
+    reasons = [noise.reason(t) for t, _ in samples]
+    secs = time.perf_counter() - start
+
+    counts = Counter((ad, why is None) for (_, ad), why in zip(samples,
+                                                                reasons))
+    by_reason = Counter((why, ad) for (_, ad), why in zip(samples, reasons)
+                        if why)
+    lost = sum(1 for (t, ad), why in zip(samples, reasons)
+               if ad and why and why != "no_lexicon" and noise.could_match(t))
+    dropped = counts[True, False] + counts[False, False]
+    n_noise = counts[False, True] + counts[False, False]
+
+    print(f"{len(samples)} texts ({cleaned} emptied by the cleaning), "
+          f"{config}")
+    print(f"{'':>8} {'kept':>8} {'dropped':>8}")
+    for ad, name in ((True, "ads"), (False, "noise")):
+        print(f"{name:>8} {counts[ad, True]:>8} {counts[ad, False]:>8}")
+    if dropped:
+        print(f"precision {counts[False, False] / dropped:.3f}", end="  ")
+    if n_noise:
+        print(f"recall {counts[False, False] / n_noise:.3f}", end="")
+    print()
+    for why in REASONS:
+        print(f"{why:>12}: {by_reason[why, False]:>6} noise, "
+              f"{by_reason[why, True]:>6} ads")
+    print(f"ads the rules could match dropped by the heuristics: {lost}")
+    print(f"{secs / max(len(samples), 1) * 1e6:.1f} us per text")
+
+    if args.show:
+        for (t, ad), why in zip(samples, reasons):
+            if ad == bool(why):
+                print(f"{'ad' if ad else 'noise':>6} "
+                      f"{why or 'kept':>10}  {t}")
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,143 @@
+'''
+Worst-case timing of the `clean_patterns.json` regexes, each group
+combined into one alternation as `clean_text.remove_pattern` does.
+
+Inputs are pumped: a short unit is repeated up to each size (plus a
+character that makes the match fail at the end), for hand-picked
+adversarial units and for random units of the characters the
+patterns care about. The time of `re.sub` is fitted against input
+length (log-log slope): about 1 is linear, 2 quadratic.
+
+    python -m benchmarks.regex_worst_case [--sizes 2000 4000 8000 16000]
+        [--fuzz 200] [--max-slope 1.3] [--group phone_patterns]
+
+Exits with status 1 if a group or one of its patterns grows faster
+than `--max-slope`, or takes over `--timeout` seconds on one input.
+'''
+import argparse
+import math
+import random
+import re
+import sys
+import time
+
+from jobnlp.pipeline.clean_text import load_clean_patterns
+
+# repeated units that make the patterns backtrack
+UNITS = {
+    "digits": "1",
+    "digit_space": "1 ",
+    "digit_dash": "1-",
+    "digits_paren": "(11) ",
+    "plus_54": "+54 9 ",
+    "word_dot": "a.",
+    "word_dash": "a-",
+    "word": "a",
+    "spaces": " ",
+    "at_word": "a@a",
+    "at_dot": "a@a.",
+    "e_slash": "1 e/ 1 y ",
+    "y_digits": "1 y ",
+    "calle": "calle 1 ",
+    "numero": "1 n 1",
+    "www": "www.",
+    "url": "http://a ",
+}
+# pieces of the random units
+ALPHABET = ["1", "12", " ", "-", "(", ")", "+", "@", ".", "a", "_", "/",
+            "e/", "y", "n", "°", "calle", "esq", "www.", "http://", "15",
+            "%", ":", "!", ","]
+
+
+def pump(unit: str, size: int) -> str:
+    return unit * max(size // len(unit), 1) + "!"
+
+def sub_secs(regex: re.Pattern, text: str, repeat: int = 3) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        regex.sub("", text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def slope(sizes: list[int], secs: list[float]) -> float:
+    '''
+    Least-squares slope of log(time) over log(size).
+    '''
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-9)) for t in secs]
+    mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+    return (sum((x - mx) * (y - my) for x, y in zip(xs, ys))
+            / sum((x - mx) ** 2 for x in xs))
+
+def growth(regex: re.Pattern, unit: str, sizes: list[int],
+           timeout: float) -> tuple[float, list[float]]:
+    '''
+    `(slope, times)` of the pumped unit; infinite slope if a size
+    takes over `timeout` seconds.
+    '''
+    secs = []
+    for size in sizes:
+        t = sub_secs(regex, pump(unit, size), repeat=1 if secs and
+                     secs[-1] > timeout / 10 else 3)
+        secs.append(t)
+        if t > timeout:
+            return math.inf, secs
+    return slope(sizes, secs), secs
+
+def fuzz_units(n: int, seed: int = 0) -> dict[str, str]:
+    rnd = random.Random(seed)
+    return {f"fuzz{i}": "".join(rnd.choices(ALPHABET, k=rnd.randint(2, 8)))
+            for i in range(n)}
+
+def worst_unit(regex: re.Pattern, units: dict[str, str],
+               size: int) -> str:
+    '''
+    Name of the unit whose pumped input is slowest at `size`.
+    '''
+    return max(units, key=lambda u: sub_secs(regex, pump(units[u], size), 1))
+
+def check(name: str, source: str, units: dict[str, str], sizes: list[int],
+          timeout: float, max_slope: float) -> bool:
+    regex = re.compile(source, flags=re.IGNORECASE)
+    unit = worst_unit(regex, units, sizes[0])
+    k, secs = growth(regex, units[unit], sizes, timeout)
+    ok = k <= max_slope
+    times = " ".join(f"{t * 1e3:8.2f}" for t in secs)
+    print(f"{'ok ' if ok else 'BAD'} {name:<24} {unit:<14} "
+          f"slope {k:5.2f}  ms: {times}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[2000, 4000, 8000, 16000])
+    parser.add_argument("--fuzz", type=int, default=200,
+                        help="Random units tried besides the fixed ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-slope", type=float, default=1.3,
+                        help="Highest log-log slope accepted as linear")
+    parser.add_argument("--timeout", type=float, default=2.0,
+                        help="Seconds of one `re.sub` that fail the check")
+    parser.add_argument("--group", nargs="+", default=None,
+                        help="Pattern groups to check (default: all)")
+    args = parser.parse_args()
+
+    patterns = load_clean_patterns()
+    units = {**UNITS, **fuzz_units(args.fuzz, args.seed)}
+    sizes = sorted(args.sizes)
+    print(f"{len(units)} units, sizes {sizes}")
+    ok = True
+    for group in args.group or list(patterns):
+        ok &= check(group, "|".join(patterns[group]), units, sizes,
+                    args.timeout, args.max_slope)
+        if len(patterns[group]) > 1:
+            for i, source in enumerate(patterns[group]):
+                ok &= check(f"  {group}[{i}]", source, units, sizes,
+                            args.timeout, args.max_slope)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+
+    main()
@@ -15,7 +15,15 @@ setup(
             "fetch_raw=jobnlp.pipeline.fetch_raw:main",
             "clean_text=jobnlp.pipeline.clean_text:main",
             "nlp_extract=jobnlp.pipeline.nlp_extract:main",
-            "entity_count=jobnlp.pipeline.entity_count:main"
+            "nlp_worker=jobnlp.pipeline.nlp_worker:main",
+            "entity_count=jobnlp.pipeline.entity_count:main",
+            "entity_cooc=jobnlp.pipeline.entity_cooc:main",
+            "entity_distinct=jobnlp.pipeline.entity_distinct:main",
+            "entity_trends=jobnlp.pipeline.entity_trends:main",
+            "export_layer=jobnlp.pipeline.export_layer:main",
+            "retention=jobnlp.pipeline.retention:main",
+            "nlp_server=jobnlp.nlp.worker_service:main",
+            "jobnlp=jobnlp.cli:main"
         ]
     },
 )
\ No newline at end of file
@@ -0,0 +1,35 @@
+'''
+`jobnlp` command: whole-pipeline modes.
+
+    jobnlp run --date YYYY-MM-DD
+    jobnlp backfill --since YYYY-MM-DD [--to YYYY-MM-DD]
+    jobnlp search "chofer con registro" [--since YYYY-MM-DD]
+    jobnlp search-index
+
+The per-stage entry points (`fetch_raw`, `clean_text`, `nlp_extract`,
+`entity_count`) remain for running or debugging a single stage.
+'''
+import argparse
+
+from jobnlp.db import search
+from jobnlp.pipeline import backfill, run
+
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    parser = argparse.ArgumentParser(prog="jobnlp", description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run.add_parser(subparsers)
+    backfill.add_parser(subparsers)
+    search.add_parser(subparsers)
+    search.add_index_parser(subparsers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,30 @@
+'''
+Storage backends for the lakehouse layers.
+
+The backend is chosen with the `JOBNLP_DB_BACKEND` environment variable:
+    - `postgres` (default): dockerized PostgreSQL, see `db.connection`.
+    - `sqlite`: embedded file, see `JOBNLP_SQLITE_PATH`.
+'''
+import os
+
+from jobnlp.db.backends.base import StorageBackend
+from jobnlp.utils.logger import Logger
+
+BACKENDS = ("postgres", "sqlite")
+
+def get_backend(name: str | None = None, 
+                log: Logger | None = None) -> StorageBackend:
+    name = (name or os.getenv("JOBNLP_DB_BACKEND") or "postgres").lower()
+
+    # NOTE: imported on demand so the embedded backend does not 
+    # require psycopg2 (nor a database server).
+    if name == "postgres":
+        from jobnlp.db.backends.postgres import PostgresBackend
+        return PostgresBackend(log=log)
+    if name == "sqlite":
+        from jobnlp.db.backends.sqlite import SQLiteBackend
+        return SQLiteBackend(log=log)
+    raise ValueError(f"Unknown storage backend '{name}'. "
+                     f"Choose one of: {', '.join(BACKENDS)}")
+
+__all__ = ["StorageBackend", "get_backend", "BACKENDS"]
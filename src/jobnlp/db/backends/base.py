@@ -0,0 +1,209 @@
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, Iterator, Literal, Optional
+
+from jobnlp.records import BronzeRecord, GoldRecord, SilverRecord
+from jobnlp.utils.logger import Logger
+
+
+class StorageBackend(ABC):
+    '''
+    Storage interface for the lakehouse layers.
+    Each backend owns its connection, its bronze/silver/gold DDL, 
+    the conflict-safe inserts and the silver -> gold aggregation.
+    '''
+    name: str
+
+    def __init__(self, log: Logger | None = None):
+        self.log = log
+        self.conn: Any = None
+
+    @abstractmethod
+    def init_schema(self) -> None:
+        '''Ensure the existence of schemas and tables.'''
+
+    @abstractmethod
+    def insert_bronze(self, add: BronzeRecord | dict, 
+                      log: Logger | None = None) -> Literal[0, 1]:
+        '''Insert an ad; returns 0 if its hash already exists.'''
+
+    @abstractmethod
+    def insert_bronze_many(self, adds: list[BronzeRecord | dict],
+                           log: Logger | None = None) -> list[tuple]:
+        '''Insert a batch of ads; returns the rows actually inserted.'''
+
+    @abstractmethod
+    def insert_silver(self, add: SilverRecord | dict, 
+                      log: Logger | None = None) -> Literal[0, 1]:
+        '''Insert an entity; returns 0 if (hash, entity_text) exists.'''
+
+    @abstractmethod
+    def insert_silver_many(self, adds: list[SilverRecord | dict],
+                           log: Logger | None = None) -> int:
+        '''Insert a batch of entities; returns rows actually inserted.'''
+
+    @abstractmethod
+    def insert_gold(self, add: GoldRecord | dict,
+                    log: Logger | None = None) -> int:
+        '''Upsert an aggregate by (scrap_date, entity_text).'''
+
+    @abstractmethod
+    def replace_gold_cooc(self, adds: list[dict],
+                          log: Logger | None = None) -> int:
+        '''See `jobnlp.db.models.replace_gold_cooc`.'''
+
+    @abstractmethod
+    def replace_gold_trends(self, adds: list[dict],
+                            log: Logger | None = None) -> int:
+        '''See `jobnlp.db.models.replace_gold_trends`.'''
+
+    @abstractmethod
+    def replace_gold_hll(self, adds: list[dict],
+                         log: Logger | None = None) -> int:
+        '''See `jobnlp.db.models.replace_gold_hll`.'''
+
+    @abstractmethod
+    def iter_gold_hll(self, since: date | None = None,
+                      to: date | None = None,
+                      entities: list[str] | None = None,
+                      label: str | None = None,
+                      batch_size: int = 10_000) -> Iterator[list[tuple]]:
+        '''See `jobnlp.db.models.iter_gold_hll`.'''
+
+    @abstractmethod
+    def fetchall_layer(self, table: str, date: str | None = None,
+                       since: str | None = None, to: str | None = None,
+                       filters: dict[str, Any] | None = None,
+                       cols: list[str] | None = None,
+                       schema: str = "ads_lakehouse",
+                       log: Logger | None = None) -> list[tuple]:
+        '''See `jobnlp.db.models.fetchall_layer`.'''
+
+    @abstractmethod
+    def search_bronze(self, query: str, date: date | str | None = None,
+                      since: date | str | None = None,
+                      to: date | str | None = None, limit: int = 50,
+                      cols: list[str] | None = None,
+                      log: Logger | None = None) -> list[tuple]:
+        '''See `jobnlp.db.models.search_bronze`.'''
+
+    @abstractmethod
+    def migrate_search(self) -> None:
+        '''One-time setup of the search of an existing bronze.'''
+
+    @abstractmethod
+    def agreg_from_silver(self, *, date_eq: Optional[date] = None,
+                          since: Optional[date] = None,
+                          to: Optional[date] = None,
+                          label: Optional[str] = None,
+                          log: Logger | None = None) -> list[GoldRecord]:
+        '''See `jobnlp.db.models.agreg_from_silver`.'''
+
+    @abstractmethod
+    def layer_dates(self, table: str, since: str | None = None,
+                    to: str | None = None,
+                    schema: str = "ads_lakehouse") -> list[date]:
+        '''See `jobnlp.db.models.layer_dates`.'''
+
+    @abstractmethod
+    def iter_layer(self, table: str, dates: list[date], cols: list[str],
+                   batch_size: int = 10_000, 
+                   schema: str = "ads_lakehouse",
+                   log: Logger | None = None) -> Iterator[list[tuple]]:
+        '''See `jobnlp.db.models.iter_layer`.'''
+
+    @abstractmethod
+    def delete_partition(self, table: str, scrap_date: date,
+                         expected: int | None = None,
+                         schema: str = "ads_lakehouse",
+                         log: Logger | None = None) -> int:
+        '''See `jobnlp.db.models.delete_partition`.'''
+
+    # -- checkpoints (incremental runs, per stage and date) --
+
+    @abstractmethod
+    def get_checkpoint(self, stage: str, scrap_date: date) -> int:
+        '''Watermark of `stage` for a date, 0 if none.'''
+
+    @abstractmethod
+    def set_checkpoint(self, stage: str, scrap_date: date,
+                       position: int) -> None:
+        '''Store the watermark of `stage` for a date.'''
+
+    @abstractmethod
+    def fetch_bronze_after(self, scrap_date: date, after_id: int = 0,
+                           limit: int = 5000,
+                           hash_range: tuple[str, str | None] | None = None
+                           ) -> list[tuple]:
+        '''See `jobnlp.db.models.fetch_bronze_after`.'''
+
+    @abstractmethod
+    def max_bronze_id(self, scrap_date: date) -> int:
+        '''Highest bronze id of a date, 0 if none.'''
+
+    # -- rulesets (see `nlp.ruleset`) --
+
+    @abstractmethod
+    def save_ruleset(self, fingerprint: str, patterns: list[dict]) -> None:
+        '''Store a version of the rules (no-op if already stored).'''
+
+    @abstractmethod
+    def get_ruleset(self, fingerprint: str | None) -> list[dict] | None:
+        '''Patterns of a stored ruleset, None if unknown.'''
+
+    @abstractmethod
+    def set_bronze_ruleset(self, hashes: list[str], fingerprint: str) -> int:
+        '''Tag bronze ads as processed with `fingerprint`.'''
+
+    @abstractmethod
+    def stale_rulesets(self, fingerprint: str, since: date | None = None,
+                       to: date | None = None) -> list[str | None]:
+        '''Distinct bronze rulesets in range that differ from `fingerprint`.'''
+
+    @abstractmethod
+    def fetch_bronze_by_ruleset(self, ruleset: str | None,
+                                since: date | None = None,
+                                to: date | None = None,
+                                contains: list[list[str]] | None = None,
+                                after_id: int = 0, limit: int = 5000
+                                ) -> list[tuple]:
+        '''See `jobnlp.db.models.fetch_bronze_by_ruleset`.'''
+
+    @abstractmethod
+    def delete_silver(self, hashes: list[str]) -> int:
+        '''Remove the entities of the given ads.'''
+
+    @abstractmethod
+    def retag_ruleset(self, old: str | None, new: str,
+                      since: date | None = None,
+                      to: date | None = None) -> int:
+        '''Move bronze ads and their silver rows from `old` to `new`.'''
+
+    @abstractmethod
+    def enqueue_nlp_batches(self, scrap_date: date, batch_size: int) -> int:
+        '''See `jobnlp.db.models.enqueue_nlp_batches`.'''
+
+    @abstractmethod
+    def claim_nlp_batch(self, worker: str, lease_secs: int,
+                        max_attempts: int) -> tuple | None:
+        '''See `jobnlp.db.models.claim_nlp_batch`.'''
+
+    @abstractmethod
+    def heartbeat_nlp_batch(self, batch_id: int, worker: str,
+                            lease_secs: int) -> bool:
+        '''See `jobnlp.db.models.heartbeat_nlp_batch`.'''
+
+    @abstractmethod
+    def finish_nlp_batch(self, batch_id: int, worker: str,
+                         error: str | None = None,
+                         max_attempts: int = 3) -> bool:
+        '''See `jobnlp.db.models.finish_nlp_batch`.'''
+
+    @abstractmethod
+    def nlp_queue_status(self, since: date | None = None,
+                         to: date | None = None) -> list[tuple]:
+        '''See `jobnlp.db.models.nlp_queue_status`.'''
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
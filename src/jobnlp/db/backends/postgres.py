@@ -0,0 +1,147 @@
+from jobnlp.db import models
+from jobnlp.db.backends.base import StorageBackend
+from jobnlp.db.connection import get_connection
+from jobnlp.db.schemas import db_init, migrate_search
+from jobnlp.utils.logger import Logger
+
+
+class PostgresBackend(StorageBackend):
+    '''
+    Default backend: the dockerized PostgreSQL lakehouse 
+    (`ads_lakehouse` schema). Thin wrapper over `db.models` 
+    and `db.schemas`.
+    '''
+    name = "postgres"
+
+    def __init__(self, conn=None, log: Logger | None = None):
+        super().__init__(log)
+        self.conn = conn if conn is not None else get_connection()
+
+    def init_schema(self):
+        db_init(self.conn)
+
+    def insert_bronze(self, add, log=None):
+        return models.insert_bronze(self.conn, add, log)
+
+    def insert_bronze_many(self, adds, log=None):
+        return models.insert_bronze_many(self.conn, adds, log)
+
+    def insert_silver(self, add, log=None):
+        return models.insert_silver(self.conn, add, log)
+
+    def insert_silver_many(self, adds, log=None):
+        return models.insert_silver_many(self.conn, adds, log)
+
+    def insert_gold(self, add, log=None):
+        return models.insert_gold(self.conn, add, log)
+
+    def replace_gold_cooc(self, adds, log=None):
+        return models.replace_gold_cooc(self.conn, adds, log)
+
+    def replace_gold_trends(self, adds, log=None):
+        return models.replace_gold_trends(self.conn, adds, log)
+
+    def replace_gold_hll(self, adds, log=None):
+        return models.replace_gold_hll(self.conn, adds, log)
+
+    def iter_gold_hll(self, since=None, to=None, entities=None, label=None,
+                      batch_size=10_000):
+        return models.iter_gold_hll(self.conn, since, to, entities, label,
+                                    batch_size)
+
+    def fetchall_layer(self, table, date=None, since=None, to=None,
+                       filters=None, cols=None, schema="ads_lakehouse",
+                       log=None):
+        return models.fetchall_layer(self.conn, table, date=date, 
+                                     since=since, to=to, filters=filters,
+                                     cols=cols, schema=schema, log=log)
+
+    def search_bronze(self, query, date=None, since=None, to=None,
+                      limit=50, cols=None, log=None):
+        return models.search_bronze(self.conn, query, date=date, 
+                                    since=since, to=to, limit=limit,
+                                    cols=cols, log=log)
+
+    def migrate_search(self):
+        migrate_search(self.conn)
+
+    def agreg_from_silver(self, *, date_eq=None, since=None, to=None,
+                          label=None, log=None):
+        return models.agreg_from_silver(self.conn, date_eq=date_eq,
+                                        since=since, to=to, label=label,
+                                        log=log)
+
+    def layer_dates(self, table, since=None, to=None, 
+                    schema="ads_lakehouse"):
+        return models.layer_dates(self.conn, table, since=since, to=to,
+                                  schema=schema)
+
+    def iter_layer(self, table, dates, cols, batch_size=10_000,
+                   schema="ads_lakehouse", log=None):
+        return models.iter_layer(self.conn, table, dates, cols,
+                                 batch_size=batch_size, schema=schema,
+                                 log=log)
+
+    def delete_partition(self, table, scrap_date, expected=None,
+                         schema="ads_lakehouse", log=None):
+        return models.delete_partition(self.conn, table, scrap_date,
+                                       expected=expected, schema=schema,
+                                       log=log)
+
+    def get_checkpoint(self, stage, scrap_date):
+        return models.get_checkpoint(self.conn, stage, scrap_date)
+
+    def set_checkpoint(self, stage, scrap_date, position):
+        models.set_checkpoint(self.conn, stage, scrap_date, position)
+
+    def fetch_bronze_after(self, scrap_date, after_id=0, limit=5000,
+                           hash_range=None):
+        return models.fetch_bronze_after(self.conn, scrap_date, 
+                                         after_id=after_id, limit=limit,
+                                         hash_range=hash_range)
+
+    def max_bronze_id(self, scrap_date):
+        return models.max_bronze_id(self.conn, scrap_date)
+
+    def save_ruleset(self, fingerprint, patterns):
+        models.save_ruleset(self.conn, fingerprint, patterns)
+
+    def get_ruleset(self, fingerprint):
+        return models.get_ruleset(self.conn, fingerprint)
+
+    def set_bronze_ruleset(self, hashes, fingerprint):
+        return models.set_bronze_ruleset(self.conn, hashes, fingerprint)
+
+    def stale_rulesets(self, fingerprint, since=None, to=None):
+        return models.stale_rulesets(self.conn, fingerprint, since, to)
+
+    def fetch_bronze_by_ruleset(self, ruleset, since=None, to=None,
+                                contains=None, after_id=0, limit=5000):
+        return models.fetch_bronze_by_ruleset(self.conn, ruleset, since, to,
+                                              contains, after_id=after_id,
+                                              limit=limit)
+
+    def delete_silver(self, hashes):
+        return models.delete_silver(self.conn, hashes)
+
+    def retag_ruleset(self, old, new, since=None, to=None):
+        return models.retag_ruleset(self.conn, old, new, since, to)
+
+    def enqueue_nlp_batches(self, scrap_date, batch_size):
+        return models.enqueue_nlp_batches(self.conn, scrap_date, batch_size)
+
+    def claim_nlp_batch(self, worker, lease_secs, max_attempts):
+        return models.claim_nlp_batch(self.conn, worker, lease_secs,
+                                      max_attempts)
+
+    def heartbeat_nlp_batch(self, batch_id, worker, lease_secs):
+        return models.heartbeat_nlp_batch(self.conn, batch_id, worker,
+                                          lease_secs)
+
+    def finish_nlp_batch(self, batch_id, worker, error=None, 
+                         max_attempts=3):
+        return models.finish_nlp_batch(self.conn, batch_id, worker, error,
+                                       max_attempts)
+
+    def nlp_queue_status(self, since=None, to=None):
+        return models.nlp_queue_status(self.conn, since, to)
@@ -0,0 +1,863 @@
+import json
+import os
+import pathlib
+import re
+import sqlite3
+from datetime import date, datetime
+
+from jobnlp.db.backends.base import StorageBackend
+from jobnlp.db.errors import (BronzeQueryError, SilverQueryError,
+                              GoldQueryError)
+from jobnlp.db.search import SEARCH_COLS, SEARCH_LIMIT, fts5_query
+from jobnlp.db.validation import (validate_db_identifiers, validate_cols,
+                                  validate_filters, validate_date,
+                                  RETAINED_TABLES)
+from jobnlp.records import GoldRecord
+from jobnlp.utils.logger import Logger
+
+DB_PATH = pathlib.Path("data/processed/jobnlp.sqlite3")
+# seconds to wait for another writer
+LOCK_TIMEOUT = 60.0
+
+# NOTE: dates are stored as ISO text and returned as `datetime.date`,
+# like psycopg2 does for DATE columns.
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter("DATE",
+                           lambda b: date.fromisoformat(b.decode()[:10]))
+
+DDL = {
+    "ads_bronze": """
+        CREATE TABLE IF NOT EXISTS ads_bronze (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            source_url TEXT,
+            norm_text TEXT,
+            hash TEXT,
+            ruleset TEXT,
+            CONSTRAINT unique_hash UNIQUE (hash)
+        );
+        CREATE INDEX IF NOT EXISTS ads_bronze_date ON ads_bronze (scrap_date);
+    """,
+    "ads_silver": """
+        CREATE TABLE IF NOT EXISTS ads_silver (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            entity_text TEXT,
+            label TEXT,
+            start_pos INT,
+            end_pos INT,
+            hash TEXT,
+            ruleset TEXT,
+            CONSTRAINT unique_entry_entity UNIQUE (hash, entity_text)
+        );
+        CREATE INDEX IF NOT EXISTS ads_silver_date ON ads_silver (scrap_date);
+    """,
+    "ads_gold": """
+        CREATE TABLE IF NOT EXISTS ads_gold (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity_text TEXT,
+            label TEXT,
+            count INT,
+            count_ads INT,
+            scrap_date DATE NOT NULL,
+            CONSTRAINT unique_ent_txt_date UNIQUE (scrap_date, entity_text)
+        );
+    """,
+    "ads_gold_cooc": """
+        CREATE TABLE IF NOT EXISTS ads_gold_cooc (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            since DATE NOT NULL,
+            entity_a TEXT,
+            label_a TEXT,
+            entity_b TEXT,
+            label_b TEXT,
+            count INT,
+            count_a INT,
+            count_b INT,
+            n_ads INT,
+            lift REAL,
+            pmi REAL,
+            CONSTRAINT unique_cooc_range_pair UNIQUE
+                (scrap_date, since, entity_a, entity_b)
+        );
+    """,
+    "ads_gold_trends": """
+        CREATE TABLE IF NOT EXISTS ads_gold_trends (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            entity_text TEXT,
+            label TEXT,
+            count_ads INT,
+            mean_7d REAL,
+            mean_prev_7d REAL,
+            wow_growth REAL,
+            zscore REAL,
+            spike BOOLEAN NOT NULL DEFAULT 0,
+            CONSTRAINT unique_trend_date_ent UNIQUE (scrap_date, entity_text)
+        );
+    """,
+    "ads_gold_hll": """
+        CREATE TABLE IF NOT EXISTS ads_gold_hll (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            entity_text TEXT,
+            label TEXT,
+            sketch BLOB NOT NULL,
+            CONSTRAINT unique_hll_date_ent UNIQUE (scrap_date, entity_text)
+        );
+    """,
+    "ads_nlp_queue": """
+        CREATE TABLE IF NOT EXISTS ads_nlp_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scrap_date DATE NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER NOT NULL,
+            n_ads INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            lease_until TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT unique_queue_batch UNIQUE (scrap_date, first_id)
+        );
+        CREATE INDEX IF NOT EXISTS ads_nlp_queue_claim
+            ON ads_nlp_queue (status, id);
+    """,
+    "ads_checkpoints": """
+        CREATE TABLE IF NOT EXISTS ads_checkpoints (
+            stage TEXT NOT NULL,
+            scrap_date DATE NOT NULL,
+            position INTEGER NOT NULL,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (stage, scrap_date)
+        );
+    """,
+    "ads_rulesets": """
+        CREATE TABLE IF NOT EXISTS ads_rulesets (
+            fingerprint TEXT PRIMARY KEY,
+            patterns TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """,
+}
+
+# full-text index of bronze (see `db.search`), synced by triggers
+FTS_DDL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS ads_bronze_fts USING fts5(
+        norm_text, content='ads_bronze', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS ads_bronze_fts_ai AFTER INSERT ON ads_bronze
+    BEGIN
+        INSERT INTO ads_bronze_fts (rowid, norm_text)
+        VALUES (new.id, new.norm_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS ads_bronze_fts_ad AFTER DELETE ON ads_bronze
+    BEGIN
+        INSERT INTO ads_bronze_fts (ads_bronze_fts, rowid, norm_text)
+        VALUES ('delete', old.id, old.norm_text);
+    END;
+    CREATE TRIGGER IF NOT EXISTS ads_bronze_fts_au
+    AFTER UPDATE OF norm_text ON ads_bronze
+    BEGIN
+        INSERT INTO ads_bronze_fts (ads_bronze_fts, rowid, norm_text)
+        VALUES ('delete', old.id, old.norm_text);
+        INSERT INTO ads_bronze_fts (rowid, norm_text)
+        VALUES (new.id, new.norm_text);
+    END;
+"""
+
+# columns added after the first release: (table, column, type)
+MIGRATIONS = [
+    ("ads_bronze", "ruleset", "TEXT"),
+    ("ads_silver", "ruleset", "TEXT"),
+]
+
+def _as_date(value) -> str:
+    '''
+    `scrap_date` may arrive as a date or as the scraper's ISO timestamp.
+    '''
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+def _range_where(since, to) -> tuple[list, list]:
+    where_clauses, params = [], []
+    if since:
+        where_clauses.append("scrap_date >= ?")
+        params.append(_as_date(since))
+    if to:
+        where_clauses.append("scrap_date <= ?")
+        params.append(_as_date(to))
+    return where_clauses, params
+
+def _like(token: str) -> str:
+    return "%" + re.sub(r"([\\%_])", r"\\\1", token) + "%"
+
+def _date_where(date_eq=None, since=None, to=None) -> tuple[str, list]:
+    '''
+    Same date semantics as `db.models`: exact date, [since, to],
+    since..today, or only `to` as exact date.
+    '''
+    if date_eq:
+        return "scrap_date = ?", [_as_date(date_eq)]
+    if since and to:
+        return "scrap_date BETWEEN ? AND ?", [_as_date(since), _as_date(to)]
+    if since:
+        return "scrap_date BETWEEN ? AND ?", [_as_date(since),
+                                             _as_date(date.today())]
+    if to:
+        return "scrap_date = ?", [_as_date(to)]
+    raise ValueError("Must specify `date` or `since`/`to`.")
+
+
+class SQLiteBackend(StorageBackend):
+    '''
+    Embedded, file-based backend for local development, CI and
+    single-node runs. No server or container needed.
+
+    The file path is taken from `JOBNLP_SQLITE_PATH`
+    (default: `data/processed/jobnlp.sqlite3`); `:memory:` is accepted.
+    '''
+    name = "sqlite"
+
+    def __init__(self, path: str | pathlib.Path | None = None,
+                 log: Logger | None = None):
+        super().__init__(log)
+        path = path or os.getenv("JOBNLP_SQLITE_PATH") or DB_PATH
+        if str(path) != ":memory:":
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # NOTE: the connection may be handed to a writer thread
+        # (see `pipeline.writer`); access is never concurrent. Other
+        # processes (e.g. backfill workers) wait for the write lock.
+        self.conn = sqlite3.connect(path,
+                                    detect_types=sqlite3.PARSE_DECLTYPES,
+                                    check_same_thread=False,
+                                    timeout=LOCK_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+
+    def init_schema(self):
+        with self.conn:
+            for ddl in DDL.values():
+                self.conn.executescript(ddl)
+            for table, col, col_type in MIGRATIONS:
+                cols = {r[1] for r in 
+                        self.conn.execute(f"PRAGMA table_info({table});")}
+                if col not in cols:
+                    self.conn.execute(
+                        f"ALTER TABLE {table} ADD COLUMN {col} {col_type};")
+            self.conn.execute("""CREATE INDEX IF NOT EXISTS ads_bronze_ruleset
+                                 ON ads_bronze (scrap_date, ruleset);""")
+        self._init_search()
+        if self.log:
+            self.log.info(f"SQLite lakehouse ready at: {self.path}")
+
+    def _init_search(self) -> None:
+        '''
+        FTS5 index of bronze; ads stored before it existed are indexed
+        when it is created.
+        '''
+        exists = self.conn.execute("""SELECT 1 FROM sqlite_master
+                                      WHERE name = 'ads_bronze_fts';"""
+                                   ).fetchone()
+        try:
+            with self.conn:
+                self.conn.executescript(FTS_DDL)
+                if not exists:
+                    self.conn.execute("""INSERT INTO ads_bronze_fts
+                                             (ads_bronze_fts)
+                                         VALUES ('rebuild');""")
+        except sqlite3.OperationalError as e:
+            # NOTE: SQLite built without FTS5; only search is unavailable
+            if self.log:
+                self.log.warning(f"No full-text search of bronze: {e}")
+
+    def _insert(self, query: str, values: tuple, error: type[Exception],
+                add: dict, log: Logger | None) -> int:
+        try:
+            with self.conn:
+                cur = self.conn.execute(query, values)
+            return 1 if cur.rowcount > 0 else 0
+        except Exception as e:
+            log = log or self.log
+            if log: log.error(("Error inserting record with hash: "
+                              f"{add.get('hash', '?')}. "
+                              f"{type(e).__name__}: {e}"))
+            raise error from e
+
+    def insert_bronze(self, add, log=None):
+        query = """INSERT INTO ads_bronze (scrap_date, source_url,
+                        norm_text, hash)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (hash) DO NOTHING;"""
+        return self._insert(query, (
+            _as_date(add["scrap_date"]),
+            add["source_url"],
+            add["norm_text"],
+            add["hash"]
+        ), BronzeQueryError, add, log)
+
+    def insert_bronze_many(self, adds, log=None):
+        query = """INSERT INTO ads_bronze (scrap_date, source_url,
+                        norm_text, hash)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (hash) DO NOTHING;"""
+        inserted = []
+        try:
+            with self.conn:
+                for add in adds:
+                    scrap_date = _as_date(add["scrap_date"])
+                    cur = self.conn.execute(query, (
+                        scrap_date,
+                        add["source_url"],
+                        add["norm_text"],
+                        add["hash"]
+                    ))
+                    if cur.rowcount > 0:
+                        inserted.append((date.fromisoformat(scrap_date),
+                                         add["norm_text"], add["hash"]))
+        except Exception as e:
+            log = log or self.log
+            if log: log.error((f"Error inserting batch of {len(adds)} "
+                              "records, first hash: "
+                              f"{adds[0].get('hash', '?')}. "
+                              f"{type(e).__name__}: {e}"))
+            raise BronzeQueryError from e
+        return inserted
+
+    def insert_silver(self, add, log=None):
+        query = """INSERT INTO ads_silver (scrap_date, entity_text,
+                        label, start_pos, end_pos, hash, ruleset)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (hash, entity_text) DO NOTHING;"""
+        return self._insert(query, (
+            _as_date(add["scrap_date"]),
+            add["entity_text"],
+            add["label"],
+            add["start_pos"],
+            add["end_pos"],
+            add["hash"],
+            add.get("ruleset")
+        ), SilverQueryError, add, log)
+
+    def insert_silver_many(self, adds, log=None):
+        if not adds:
+            return 0
+        query = """INSERT INTO ads_silver (scrap_date, entity_text,
+                        label, start_pos, end_pos, hash, ruleset)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (hash, entity_text) DO NOTHING;"""
+        before = self.conn.total_changes
+        try:
+            with self.conn:
+                self.conn.executemany(query, [(
+                    _as_date(add["scrap_date"]),
+                    add["entity_text"],
+                    add["label"],
+                    add["start_pos"],
+                    add["end_pos"],
+                    add["hash"],
+                    add.get("ruleset")
+                ) for add in adds])
+        except Exception as e:
+            log = log or self.log
+            if log: log.error((f"Error inserting batch of {len(adds)} "
+                              "records, first hash: "
+                              f"{adds[0].get('hash', '?')}. "
+                              f"{type(e).__name__}: {e}"))
+            raise SilverQueryError from e
+        return self.conn.total_changes - before
+
+    def insert_gold(self, add, log=None):
+        query = """INSERT INTO ads_gold (entity_text, label, count,
+                        count_ads, scrap_date)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (scrap_date, entity_text)
+                   DO UPDATE SET
+                        count = excluded.count,
+                        count_ads = excluded.count_ads,
+                        label = excluded.label;"""
+        self._insert(query, (
+            add["entity_text"],
+            add["label"],
+            add["count"],
+            add["count_ads"],
+            _as_date(add["scrap_date"])
+        ), GoldQueryError, add, log)
+        return 1
+
+    def replace_gold_cooc(self, adds, log=None):
+        if not adds:
+            return 0
+        ranges = sorted({(_as_date(add["scrap_date"]), _as_date(add["since"]))
+                         for add in adds})
+        query = """INSERT INTO ads_gold_cooc (scrap_date, since, entity_a,
+                        label_a, entity_b, label_b, count, count_a,
+                        count_b, n_ads, lift, pmi)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);"""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    """DELETE FROM ads_gold_cooc
+                       WHERE scrap_date = ? AND since = ?;""", ranges)
+                self.conn.executemany(query, [(
+                    _as_date(add["scrap_date"]),
+                    _as_date(add["since"]),
+                    add["entity_a"],
+                    add["label_a"],
+                    add["entity_b"],
+                    add["label_b"],
+                    add["count"],
+                    add["count_a"],
+                    add["count_b"],
+                    add["n_ads"],
+                    add["lift"],
+                    add["pmi"]
+                ) for add in adds])
+        except Exception as e:
+            log = log or self.log
+            if log: log.error(("Error inserting co-occurrences into gold "
+                              f"layer for: {ranges}. "
+                              f"{type(e).__name__}: {e}"))
+            raise GoldQueryError from e
+        return len(adds)
+
+    def replace_gold_trends(self, adds, log=None):
+        if not adds:
+            return 0
+        dates = sorted({_as_date(add["scrap_date"]) for add in adds})
+        query = """INSERT INTO ads_gold_trends (scrap_date, entity_text,
+                        label, count_ads, mean_7d, mean_prev_7d,
+                        wow_growth, zscore, spike)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);"""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM ads_gold_trends WHERE scrap_date = ?;",
+                    [(d,) for d in dates])
+                self.conn.executemany(query, [(
+                    _as_date(add["scrap_date"]),
+                    add["entity_text"],
+                    add["label"],
+                    add["count_ads"],
+                    add["mean_7d"],
+                    add["mean_prev_7d"],
+                    add["wow_growth"],
+                    add["zscore"],
+                    add["spike"]
+                ) for add in adds])
+        except Exception as e:
+            log = log or self.log
+            if log: log.error(("Error inserting trends into gold layer "
+                              f"for: {dates[0]}..{dates[-1]}. "
+                              f"{type(e).__name__}: {e}"))
+            raise GoldQueryError from e
+        return len(adds)
+
+    def replace_gold_hll(self, adds, log=None):
+        if not adds:
+            return 0
+        dates = sorted({_as_date(add["scrap_date"]) for add in adds})
+        query = """INSERT INTO ads_gold_hll (scrap_date, entity_text,
+                        label, sketch)
+                   VALUES (?, ?, ?, ?);"""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM ads_gold_hll WHERE scrap_date = ?;",
+                    [(d,) for d in dates])
+                self.conn.executemany(query, [(
+                    _as_date(add["scrap_date"]),
+                    add["entity_text"],
+                    add["label"],
+                    bytes(add["sketch"])
+                ) for add in adds])
+        except Exception as e:
+            log = log or self.log
+            if log: log.error(("Error inserting sketches into gold layer "
+                              f"for: {dates[0]}..{dates[-1]}. "
+                              f"{type(e).__name__}: {e}"))
+            raise GoldQueryError from e
+        return len(adds)
+
+    def iter_gold_hll(self, since=None, to=None, entities=None, label=None,
+                      batch_size=10_000):
+        where_clauses, params = _range_where(since, to)
+        if entities:
+            where_clauses.append(
+                f"entity_text IN ({', '.join('?' * len(entities))})")
+            params.extend(entities)
+        if label:
+            where_clauses.append("label = ?")
+            params.append(label)
+        where_sql = (f"WHERE {' AND '.join(where_clauses)}"
+                     if where_clauses else "")
+        cur = self.conn.execute(f"""
+            SELECT entity_text, label, sketch
+            FROM ads_gold_hll {where_sql}
+            ORDER BY scrap_date, id;""", params)
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    def fetchall_layer(self, table, date=None, since=None, to=None,
+                       filters=None, cols=None, schema="ads_lakehouse",
+                       log=None):
+        validate_db_identifiers(schema, table)
+        if cols:
+            validate_cols(cols)
+        if filters:
+            validate_filters(filters)
+
+        where_sql, values = _date_where(
+            validate_date(date) if date else None,
+            validate_date(since) if since else None,
+            validate_date(to) if to else None)
+        where_clauses = [where_sql]
+        for col, val in (filters or {}).items():
+            where_clauses.append(f"{col} = ?")
+            values.append(val)
+
+        col_sel = ", ".join(cols) if cols else "*"
+        query = f"""SELECT {col_sel} FROM {table}
+                    WHERE {" AND ".join(where_clauses)};"""
+        if log:
+            log.info(f"Executing query on {table} | Filters: {filters} "
+                     f"| Dates: {date or (since, to)}")
+        try:
+            return self.conn.execute(query, values).fetchall()
+        except Exception as e:
+            if log:
+                log.error(f"Query failed: {query.strip()} | Args: {values}")
+            raise sqlite3.OperationalError from e
+
+    def search_bronze(self, query, date=None, since=None, to=None,
+                      limit=SEARCH_LIMIT, cols=None, log=None):
+        cols = cols or SEARCH_COLS
+        validate_cols(cols)
+        match = fts5_query(query)
+        if match is None:
+            return []
+        if date:
+            where_clauses, params = ["b.scrap_date = ?"], [_as_date(date)]
+        else:
+            where_clauses, params = _range_where(since, to)
+            where_clauses = [f"b.{w}" for w in where_clauses]
+        where_clauses.append("ads_bronze_fts MATCH ?")
+        params.append(match)
+        sql_query = f"""
+            SELECT {", ".join(f"b.{c}" for c in cols)},
+                   -bm25(ads_bronze_fts) AS rank
+            FROM ads_bronze_fts
+            JOIN ads_bronze b ON b.id = ads_bronze_fts.rowid
+            WHERE {" AND ".join(where_clauses)}
+            ORDER BY bm25(ads_bronze_fts), b.scrap_date DESC
+            LIMIT ?;
+        """
+        try:
+            return self.conn.execute(sql_query, (*params, limit)).fetchall()
+        except Exception as e:
+            log = log or self.log
+            if log: log.error(f"Search failed: '{query}' | Dates: "
+                              f"{date or (since, to)}. "
+                              f"{type(e).__name__}: {e}")
+            raise BronzeQueryError from e
+
+    def migrate_search(self):
+        # NOTE: the FTS5 index is built by `init_schema`
+        self._init_search()
+
+    def agreg_from_silver(self, *, date_eq=None, since=None, to=None,
+                          label=None, log=None):
+        if not (date_eq or since or to):
+            raise ValueError("Provide date_eq or since/to")
+        where_sql, params = _date_where(date_eq, since, to)
+        if label:
+            where_sql += " AND label = ?"
+            params.append(label)
+
+        query = f"""
+            SELECT entity_text,
+                   label,
+                   COUNT(*) AS count,
+                   COUNT(DISTINCT hash) AS count_ads,
+                   scrap_date
+            FROM ads_silver
+            WHERE {where_sql}
+            GROUP BY entity_text, label, scrap_date
+            ORDER BY count DESC;
+        """
+        try:
+            cur = self.conn.execute(query, params)
+            return [GoldRecord(*r) for r in cur.fetchall()]
+        except Exception as e:
+            if log: log.error("Error querying silver layer: %s", e)
+            raise sqlite3.OperationalError from e
+
+    def layer_dates(self, table, since=None, to=None,
+                    schema="ads_lakehouse"):
+        validate_db_identifiers(schema, table)
+        where_clauses, values = [], []
+        if since:
+            where_clauses.append("scrap_date >= ?")
+            values.append(validate_date(since))
+        if to:
+            where_clauses.append("scrap_date <= ?")
+            values.append(validate_date(to))
+        where_sql = (f"WHERE {' AND '.join(where_clauses)}"
+                     if where_clauses else "")
+        query = f"""SELECT DISTINCT scrap_date
+                    FROM {table} {where_sql} ORDER BY scrap_date;"""
+        return [r[0] for r in self.conn.execute(query, values).fetchall()]
+
+    def iter_layer(self, table, dates, cols, batch_size=10_000,
+                   schema="ads_lakehouse", log=None):
+        validate_db_identifiers(schema, table)
+        validate_cols(cols)
+        if not dates:
+            return
+        marks = ", ".join("?" for _ in dates)
+        query = f"""SELECT {", ".join(cols)} FROM {table}
+                    WHERE scrap_date IN ({marks})
+                    ORDER BY scrap_date, id;"""
+        if log:
+            log.info(f"Streaming {table} | Dates: {dates[0]}..{dates[-1]}")
+        cur = self.conn.execute(query, [_as_date(d) for d in dates])
+        try:
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    def delete_partition(self, table, scrap_date, expected=None,
+                         schema="ads_lakehouse", log=None):
+        validate_db_identifiers(schema, table)
+        if table not in RETAINED_TABLES:
+            raise ValueError(f"Rows of '{table}' are not deleted.")
+        try:
+            with self.conn:
+                cur = self.conn.execute(f"DELETE FROM {table} "
+                                        "WHERE scrap_date = ?;",
+                                        (_as_date(scrap_date),))
+                if expected is not None and cur.rowcount != expected:
+                    raise ValueError(f"{table} has {cur.rowcount} rows for "
+                                     f"{scrap_date}, {expected} archived.")
+        except Exception:
+            log = log or self.log
+            if log: log.error(f"Rows of {table} for {scrap_date} "
+                              "not deleted.")
+            raise
+        return cur.rowcount
+
+    def get_checkpoint(self, stage, scrap_date):
+        row = self.conn.execute("""SELECT position FROM ads_checkpoints
+                                   WHERE stage = ? AND scrap_date = ?;""",
+                                (stage, _as_date(scrap_date))).fetchone()
+        return row[0] if row else 0
+
+    def set_checkpoint(self, stage, scrap_date, position):
+        with self.conn:
+            self.conn.execute("""INSERT INTO ads_checkpoints
+                                     (stage, scrap_date, position)
+                                 VALUES (?, ?, ?)
+                                 ON CONFLICT (stage, scrap_date) DO UPDATE 
+                                 SET position = excluded.position,
+                                     updated_at = CURRENT_TIMESTAMP;""",
+                              (stage, _as_date(scrap_date), position))
+
+    def fetch_bronze_after(self, scrap_date, after_id=0, limit=5000,
+                           hash_range=None):
+        where_clauses = ["scrap_date = ?", "id > ?"]
+        params = [_as_date(scrap_date), after_id]
+        if hash_range is not None:
+            lo, hi = hash_range
+            where_clauses.append("hash >= ?")
+            params.append(lo)
+            if hi is not None:
+                where_clauses.append("hash < ?")
+                params.append(hi)
+        query = f"""SELECT id, scrap_date, norm_text, hash FROM ads_bronze
+                    WHERE {" AND ".join(where_clauses)}
+                    ORDER BY id LIMIT ?;"""
+        return self.conn.execute(query, (*params, limit)).fetchall()
+
+    def max_bronze_id(self, scrap_date):
+        row = self.conn.execute("""SELECT COALESCE(MAX(id), 0) 
+                                   FROM ads_bronze WHERE scrap_date = ?;""",
+                                (_as_date(scrap_date),)).fetchone()
+        return row[0]
+
+    def save_ruleset(self, fingerprint, patterns):
+        with self.conn:
+            self.conn.execute("""INSERT INTO ads_rulesets
+                                     (fingerprint, patterns)
+                                 VALUES (?, ?)
+                                 ON CONFLICT (fingerprint) DO NOTHING;""",
+                              (fingerprint, 
+                               json.dumps(patterns, ensure_ascii=False)))
+
+    def get_ruleset(self, fingerprint):
+        if fingerprint is None:
+            return None
+        row = self.conn.execute("""SELECT patterns FROM ads_rulesets
+                                   WHERE fingerprint = ?;""",
+                                (fingerprint,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_bronze_ruleset(self, hashes, fingerprint):
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE ads_bronze SET ruleset = ? WHERE hash = ?;",
+                [(fingerprint, h) for h in hashes])
+        return self.conn.total_changes - before
+
+    def stale_rulesets(self, fingerprint, since=None, to=None):
+        where_clauses, params = _range_where(since, to)
+        where_clauses.append("ruleset IS NOT ?")
+        params.append(fingerprint)
+        query = f"""SELECT DISTINCT ruleset FROM ads_bronze
+                    WHERE {" AND ".join(where_clauses)};"""
+        return [r[0] for r in self.conn.execute(query, params)]
+
+    def fetch_bronze_by_ruleset(self, ruleset, since=None, to=None,
+                                contains=None, after_id=0, limit=5000):
+        where_clauses, params = _range_where(since, to)
+        where_clauses.append("ruleset IS ?")
+        params.append(ruleset)
+        where_clauses.append("id > ?")
+        params.append(after_id)
+        if contains is not None:
+            if not contains:
+                return []
+            ors = []
+            for tokens in contains:
+                ors.append("(" + " AND ".join(
+                    "norm_text LIKE ? ESCAPE '\\'" for _ in tokens) + ")")
+                params.extend(_like(t) for t in tokens)
+            where_clauses.append("(" + " OR ".join(ors) + ")")
+        query = f"""SELECT id, scrap_date, norm_text, hash FROM ads_bronze
+                    WHERE {" AND ".join(where_clauses)}
+                    ORDER BY id LIMIT ?;"""
+        return self.conn.execute(query, (*params, limit)).fetchall()
+
+    def delete_silver(self, hashes):
+        before = self.conn.total_changes
+        with self.conn:
+            self.conn.executemany("DELETE FROM ads_silver WHERE hash = ?;",
+                                  [(h,) for h in hashes])
+        return self.conn.total_changes - before
+
+    def retag_ruleset(self, old, new, since=None, to=None):
+        where_clauses, params = _range_where(since, to)
+        where_clauses.append("ruleset IS ?")
+        params.append(old)
+        where_sql = " AND ".join(where_clauses)
+        with self.conn:
+            self.conn.execute(f"""UPDATE ads_silver SET ruleset = ?
+                                  WHERE hash IN (SELECT hash FROM ads_bronze
+                                                 WHERE {where_sql});""",
+                              (new, *params))
+            cur = self.conn.execute(f"""UPDATE ads_bronze SET ruleset = ?
+                                        WHERE {where_sql};""",
+                                    (new, *params))
+        return cur.rowcount
+
+    # NOTE: each statement below takes the database write lock, so 
+    # claims from several processes on one host are serialized (the 
+    # SQLite version of `FOR UPDATE SKIP LOCKED`). Leases are UTC 
+    # `datetime('now')` strings, compared as text.
+
+    def enqueue_nlp_batches(self, scrap_date, batch_size):
+        scrap_date = _as_date(scrap_date)
+        with self.conn:
+            cur = self.conn.execute("""
+                INSERT INTO ads_nlp_queue
+                    (scrap_date, first_id, last_id, n_ads)
+                SELECT ?, min(id), max(id), count(*)
+                FROM (
+                    SELECT id, (row_number() OVER (ORDER BY id) - 1) / ?
+                               AS batch
+                    FROM ads_bronze
+                    WHERE scrap_date = ?
+                      AND id > (SELECT coalesce(max(last_id), 0)
+                                FROM ads_nlp_queue WHERE scrap_date = ?)
+                )
+                GROUP BY batch
+                ON CONFLICT (scrap_date, first_id) DO NOTHING;""",
+                (scrap_date, batch_size, scrap_date, scrap_date))
+        return cur.rowcount
+
+    def claim_nlp_batch(self, worker, lease_secs, max_attempts):
+        with self.conn:
+            self.conn.execute("""
+                UPDATE ads_nlp_queue
+                SET status = 'failed', worker = NULL, lease_until = NULL,
+                    error = coalesce(error, 'lease expired'),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE status = 'leased' AND lease_until < datetime('now')
+                  AND attempts >= ?;""", (max_attempts,))
+            return self.conn.execute("""
+                UPDATE ads_nlp_queue
+                SET status = 'leased', worker = ?,
+                    lease_until = datetime('now', ? || ' seconds'),
+                    attempts = attempts + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM ads_nlp_queue
+                    WHERE (status = 'pending'
+                           OR (status = 'leased' 
+                               AND lease_until < datetime('now')))
+                      AND attempts < ?
+                    ORDER BY id
+                    LIMIT 1)
+                RETURNING id, scrap_date, first_id, last_id, n_ads, 
+                          attempts;""",
+                (worker, f"+{lease_secs}", max_attempts)).fetchone()
+
+    def heartbeat_nlp_batch(self, batch_id, worker, lease_secs):
+        with self.conn:
+            cur = self.conn.execute("""
+                UPDATE ads_nlp_queue
+                SET lease_until = datetime('now', ? || ' seconds'),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker = ? AND status = 'leased';""",
+                (f"+{lease_secs}", batch_id, worker))
+        return cur.rowcount == 1
+
+    def finish_nlp_batch(self, batch_id, worker, error=None, 
+                         max_attempts=3):
+        with self.conn:
+            cur = self.conn.execute("""
+                UPDATE ads_nlp_queue
+                SET status = CASE WHEN ? IS NULL THEN 'done'
+                                  WHEN attempts >= ? THEN 'failed'
+                                  ELSE 'pending' END,
+                    worker = CASE WHEN ? IS NULL THEN worker END,
+                    lease_until = NULL, error = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND worker = ? AND status = 'leased';""",
+                (error, max_attempts, error, error, batch_id, worker))
+        return cur.rowcount == 1
+
+    def nlp_queue_status(self, since=None, to=None):
+        where_clauses, params = _range_where(since, to)
+        where_sql = (f"WHERE {' AND '.join(where_clauses)}"
+                     if where_clauses else "")
+        return self.conn.execute(f"""
+            SELECT scrap_date, status, count(*), sum(n_ads)
+            FROM ads_nlp_queue {where_sql}
+            GROUP BY scrap_date, status
+            ORDER BY scrap_date, status;""", params).fetchall()
@@ -1,15 +1,23 @@
 import os, psycopg2
-from dotenv import load_dotenv
 import pathlib
+from functools import lru_cache
 
 ENV_PATH = pathlib.Path("docker/.db.env")
 
-if ENV_PATH.exists(): 
-    load_dotenv(ENV_PATH)
-else:
-    load_dotenv("/opt/airflow/.env")
+@lru_cache(maxsize=1)
+def load_env() -> None:
+    """
+    Load the connection variables, once, on the first connection 
+    (not at import).
+    """
+    from dotenv import load_dotenv
+    if ENV_PATH.exists(): 
+        load_dotenv(ENV_PATH)
+    else:
+        load_dotenv("/opt/airflow/.env")
 
 def get_connection():
+    load_env()
     try:
         return psycopg2.connect(
             dbname=os.getenv("DB_NAME"),
@@ -0,0 +1,13 @@
+class BronzeQueryError(Exception):
+    """Raised when querying the bronze layer fails."""
+    pass
+
+
+class SilverQueryError(Exception):
+    """Raised when querying the silver layer fails."""
+    pass
+
+
+class GoldQueryError(Exception):
+    """Raised when querying the gold layer fails."""
+    pass
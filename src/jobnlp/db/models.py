@@ -1,45 +1,21 @@
 from psycopg2.errors import OperationalError
-from typing import Literal, Any, Optional
+from psycopg2 import Binary
+from psycopg2.extras import execute_values, Json
+import re
+from typing import Literal, Any, Optional, Iterator
 from datetime import datetime, date
 
-from jobnlp.db.schemas import validate_db_identifiers
+from jobnlp.db.validation import (validate_db_identifiers, validate_cols,
+                                  validate_filters, validate_date,
+                                  RETAINED_TABLES)
+from jobnlp.db.errors import (BronzeQueryError, SilverQueryError,
+                              GoldQueryError)
+from jobnlp.db.search import SEARCH_COLS, SEARCH_LIMIT
+from jobnlp.records import BronzeRecord, GoldRecord, SilverRecord
 from jobnlp.utils.logger import Logger
 
-COLS_WHITE_LIST = {"scrap_date", "source_url", "norm_text", "hash",
-                   "entity_text", "label", "start_pos", "end_pos"}
 
-def validate_cols(cols: list[str]) -> None:
-    invalid = [c for c in cols if c not in COLS_WHITE_LIST]
-    if invalid:
-        raise ValueError(f"Invalid column(s): {', '.join(invalid)}")
-    
-def validate_filters(filters: dict[str, Any]) -> None:
-    invalid = [k for k in filters if k not in COLS_WHITE_LIST]
-    if invalid:
-        raise ValueError(f"Invalid filter column(s): {', '.join(invalid)}")
-
-def validate_date(d):
-    try:
-        return datetime.strptime(d, "%Y-%m-%d").strftime("%Y-%m-%d")
-    except Exception:
-        raise ValueError(f"Date '{d}' must be in YYYY-MM-DD format")
-
-class BronzeQueryError(Exception):
-    """Raised when querying the bronze layer fails."""
-    pass
-
-
-class SilverQueryError(Exception):
-    """Raised when querying the silver layer fails."""
-    pass
-
-
-class GoldQueryError(Exception):
-    """Raised when querying the gold layer fails."""
-    pass
-
-
-def insert_bronze(conn, add: dict, log: Logger|None = None) -> Literal[0, 1]:
+def insert_bronze(conn, add: BronzeRecord | dict, log: Logger|None = None) -> Literal[0, 1]:
     '''
     Insert row into table `ads_bronze`.
 
@@ -76,7 +52,7 @@ def insert_bronze(conn, add: dict, log: Logger|None = None) -> Literal[0, 1]:
                           f"{add.get('hash', '?')}. {type(e).__name__}: {e}"))
         raise BronzeQueryError from e
 
-def insert_silver(conn, add: dict, log: Logger|None = None):
+def insert_silver(conn, add: SilverRecord | dict, log: Logger|None = None):
     '''
     Insert row into table `ads_silver`.
 
@@ -85,15 +61,18 @@ def insert_silver(conn, add: dict, log: Logger|None = None):
     
     add: `dict` (Mandatory keys: colnames)   
         - scrap_date  
-        - source_url  
-        - norm_text  
+        - entity_text  
+        - label  
+        - start_pos  
+        - end_pos  
         - hash  
+        - ruleset (optional)  
     
     log: logging object.
     '''
     query = """INSERT INTO ads_lakehouse.ads_silver (scrap_date, entity_text, 
-                        label, start_pos, end_pos, hash)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                        label, start_pos, end_pos, hash, ruleset)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 ON CONFLICT (hash, entity_text) DO NOTHING
                 RETURNING id;
                 """
@@ -105,7 +84,8 @@ def insert_silver(conn, add: dict, log: Logger|None = None):
             add["label"],
             add["start_pos"],
             add["end_pos"],
-            add["hash"]
+            add["hash"],
+            add.get("ruleset")
         ))
         inserted = cur.fetchone()
         cur.close()
@@ -116,6 +96,91 @@ def insert_silver(conn, add: dict, log: Logger|None = None):
                           f"{add.get('hash', '?')}. {type(e).__name__}: {e}"))
         raise SilverQueryError from e
 
+def insert_bronze_many(conn, adds: list[BronzeRecord | dict], 
+                       log: Logger|None = None) -> list[tuple]:
+    '''
+    Insert a batch of rows into table `ads_bronze` in a single 
+    round trip and transaction.
+
+    ### Parameters
+    conn: psycopg2 connection object.   
+    
+    adds: list of `dict`, same keys as `insert_bronze`.
+    
+    log: logging object.
+
+    Returns `(scrap_date, norm_text, hash)` of the rows actually 
+    inserted (ads whose hash already exists are skipped), i.e. the 
+    rows `nlp_extract` would read back.
+    '''
+    if not adds:
+        return []
+    query = """INSERT INTO ads_lakehouse.ads_bronze (scrap_date, source_url, 
+                        norm_text, hash)
+                VALUES %s
+                ON CONFLICT (hash) DO NOTHING
+                RETURNING scrap_date, norm_text, hash;
+                """
+    try:
+        with conn.cursor() as cur:
+            inserted = execute_values(cur, query, [(
+                add["scrap_date"],
+                add["source_url"],
+                add["norm_text"],
+                add["hash"]
+            ) for add in adds], page_size=len(adds), fetch=True)
+        conn.commit()
+        return inserted
+    except Exception as e:
+        conn.rollback()
+        if log: log.error((f"Error inserting batch of {len(adds)} records, "
+                          f"first hash: {adds[0].get('hash', '?')}. "
+                          f"{type(e).__name__}: {e}"))
+        raise BronzeQueryError from e
+
+def insert_silver_many(conn, adds: list[SilverRecord | dict], 
+                       log: Logger|None = None) -> int:
+    '''
+    Insert a batch of rows into table `ads_silver` in a single 
+    round trip and transaction.
+
+    ### Parameters
+    conn: psycopg2 connection object.   
+    
+    adds: list of `dict`, same keys as `insert_silver`.
+    
+    log: logging object.
+
+    Returns the number of rows actually inserted (conflicts are skipped).
+    '''
+    if not adds:
+        return 0
+    query = """INSERT INTO ads_lakehouse.ads_silver (scrap_date, entity_text, 
+                        label, start_pos, end_pos, hash, ruleset)
+                VALUES %s
+                ON CONFLICT (hash, entity_text) DO NOTHING
+                RETURNING id;
+                """
+    try:
+        with conn.cursor() as cur:
+            inserted = execute_values(cur, query, [(
+                add["scrap_date"],
+                add["entity_text"],
+                add["label"],
+                add["start_pos"],
+                add["end_pos"],
+                add["hash"],
+                add.get("ruleset")
+            ) for add in adds], page_size=len(adds), fetch=True)
+        conn.commit()
+        return len(inserted)
+    except Exception as e:
+        conn.rollback()
+        if log: log.error((f"Error inserting batch of {len(adds)} records, "
+                          f"first hash: {adds[0].get('hash', '?')}. "
+                          f"{type(e).__name__}: {e}"))
+        raise SilverQueryError from e
+
 def insert_gold_disc(conn, table_name: str,
                 add: dict, log: Logger|None = None):
     '''
@@ -250,6 +315,155 @@ def fetchall_layer(
                 log.error(f"Query failed: {query.strip()} | Args: {values}")
             raise OperationalError from e
 
+def search_bronze(
+    conn,
+    query: str,
+    date: date | str | None = None,
+    since: date | str | None = None,
+    to: date | str | None = None,
+    limit: int = SEARCH_LIMIT,
+    cols: list[str] | None = None,
+    log: Logger | None = None
+) -> list[tuple]:
+    '''
+    Full-text search of the bronze ads (see `db.search` for the query 
+    syntax), best matches first.
+
+    Parameters:
+        conn: psycopg2 connection object.
+        query: words, "phrases", `or`, `-word`.
+        date: only ads of this date.
+        since/to: only ads in this range (either bound is optional).
+        limit: maximum number of ads returned.
+        cols: bronze columns to select (default: `SEARCH_COLS`).
+        log: logger.
+
+    Returns the selected columns of each ad plus its rank 
+    (`ts_rank_cd`, higher is better) as last column.
+    '''
+    cols = cols or SEARCH_COLS
+    validate_cols(cols)
+    if date:
+        where_clauses, params = ["scrap_date = %s"], [_search_date(date)]
+    else:
+        where_clauses, params = _range_where(_search_date(since),
+                                             _search_date(to))
+    where_clauses.append("search_tsv @@ q")
+    sql_query = f"""
+        SELECT {", ".join(cols)}, ts_rank_cd(search_tsv, q) AS rank
+        FROM ads_lakehouse.ads_bronze,
+             websearch_to_tsquery('spanish', %s) AS q
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY rank DESC, scrap_date DESC
+        LIMIT %s;
+    """
+    with conn.cursor() as cur:
+        try:
+            cur.execute(sql_query, (query, *params, limit))
+            return cur.fetchall()
+        except Exception as e:
+            conn.rollback()
+            if log:
+                log.error(f"Search failed: '{query}' | Dates: "
+                          f"{date or (since, to)}. {type(e).__name__}: {e}")
+            raise BronzeQueryError from e
+
+def _search_date(value: date | str | None) -> date | str | None:
+    return validate_date(value) if isinstance(value, str) else value
+
+def layer_dates(
+    conn,
+    table: str,
+    since: str | None = None,
+    to: str | None = None,
+    schema: str = "ads_lakehouse",
+) -> list[date]:
+    '''
+    Distinct `scrap_date` values stored in a layer, ascending.
+    Optionally bounded by [since, to].
+    '''
+    validate_db_identifiers(schema, table)
+
+    where_clauses = []
+    values = []
+    if since:
+        where_clauses.append("scrap_date >= %s")
+        values.append(validate_date(since))
+    if to:
+        where_clauses.append("scrap_date <= %s")
+        values.append(validate_date(to))
+    where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+
+    query = f"""
+        SELECT DISTINCT scrap_date
+        FROM {schema}.{table}
+        {where_sql}
+        ORDER BY scrap_date;
+    """
+    with conn.cursor() as cur:
+        try:
+            cur.execute(query, tuple(values))
+            return [r[0] for r in cur.fetchall()]
+        except Exception as e:
+            raise OperationalError from e
+
+def iter_layer(
+    conn,
+    table: str,
+    dates: list[date],
+    cols: list[str],
+    batch_size: int = 10_000,
+    schema: str = "ads_lakehouse",
+    log: Logger | None = None
+) -> Iterator[list[tuple]]:
+    '''
+    Stream rows of a layer for the given dates through a server-side 
+    (named) cursor. Only `batch_size` rows are held client-side at a time.
+
+    Rows are ordered by `scrap_date`, so consumers can write one date 
+    partition at a time.
+
+    Parameters:
+        conn: psycopg2 connection object.
+        table: table name.
+        dates: `scrap_date` values to export.
+        cols: list of column names to select.
+        batch_size: rows per round trip (`fetchmany`).
+        schema: schema name.
+        log: logger.
+    '''
+    validate_db_identifiers(schema, table)
+    validate_cols(cols)
+    if not dates:
+        return
+
+    query = f"""
+        SELECT {", ".join(cols)}
+        FROM {schema}.{table}
+        WHERE scrap_date = ANY(%s)
+        ORDER BY scrap_date, id;
+    """
+    if log:
+        log.info(f"Streaming {schema}.{table} | Dates: {dates[0]}..{dates[-1]}")
+
+    # NOTE: named cursor -> rows stay on the server until fetched.
+    cur = conn.cursor(name=f"iter_{table}")
+    cur.itersize = batch_size
+    try:
+        cur.execute(query, (list(dates),))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    except Exception as e:
+        if log:
+            log.error(f"Streaming query failed on {schema}.{table}")
+        raise OperationalError from e
+    finally:
+        cur.close()
+        conn.commit()
+
 def agreg_from_silver(conn, *,
                       date_eq: Optional[date] = None,
                       since: Optional[date] = None,
@@ -257,7 +471,8 @@ def agreg_from_silver(conn, *,
                       label: Optional[str] = None,
                       log=None):
     """
-    Returns aggregates by entity_text (+ label) for a date or range.
+    Returns aggregates by entity_text (+ label) for a date or range, 
+    as `GoldRecord`s.
 
     #### Parameters
     date_eq: Filters by an exact date.  
@@ -308,13 +523,12 @@ def agreg_from_silver(conn, *,
         with conn.cursor() as cur:
             cur.execute(query, tuple(params))
             rows = cur.fetchall()
-            cols = [d[0] for d in cur.description]
-            return [dict(zip(cols, r)) for r in rows]
+            return [GoldRecord(*r) for r in rows]
     except Exception as e:
         if log: log.error("Error querying silver layer: %s", e)
         raise OperationalError from e
     
-def insert_gold(conn, add: dict, log: Logger):
+def insert_gold(conn, add: GoldRecord | dict, log: Logger):
     query = """
         INSERT INTO ads_lakehouse.ads_gold
         (entity_text, label, count, count_ads, scrap_date)
@@ -342,3 +556,567 @@ def insert_gold(conn, add: dict, log: Logger):
             log.error(("Error inserting into gold layer for: "
                       f"{add.get('scrap_date')}"))
         raise GoldQueryError from e
+
+def replace_gold_cooc(conn, adds: list[dict], 
+                      log: Logger | None = None) -> int:
+    '''
+    Store the top entity pairs of a date range (see 
+    `pipeline.entity_cooc`) in `ads_gold_cooc`, replacing the pairs 
+    previously stored for the same range, in one transaction.
+
+    ### Parameters
+    conn: psycopg2 connection object.
+
+    adds: list of `dict` (keys: colnames of `ads_gold_cooc`, 
+        `scrap_date` is the last date of the range and `since` the first).
+
+    log: logging object.
+    '''
+    if not adds:
+        return 0
+    ranges = sorted({(add["scrap_date"], add["since"]) for add in adds})
+    query = """
+        INSERT INTO ads_lakehouse.ads_gold_cooc
+        (scrap_date, since, entity_a, label_a, entity_b, label_b,
+         count, count_a, count_b, n_ads, lift, pmi)
+        VALUES %s;
+    """
+    try:
+        with conn.cursor() as cur:
+            for scrap_date, since in ranges:
+                cur.execute("""
+                    DELETE FROM ads_lakehouse.ads_gold_cooc
+                    WHERE scrap_date = %s AND since = %s;
+                """, (scrap_date, since))
+            execute_values(cur, query, [(
+                add["scrap_date"],
+                add["since"],
+                add["entity_a"],
+                add["label_a"],
+                add["entity_b"],
+                add["label_b"],
+                add["count"],
+                add["count_a"],
+                add["count_b"],
+                add["n_ads"],
+                add["lift"],
+                add["pmi"]
+            ) for add in adds], page_size=1000)
+        conn.commit()
+        return len(adds)
+    except Exception as e:
+        conn.rollback()
+        if log:
+            log.error(("Error inserting co-occurrences into gold layer "
+                       f"for: {ranges}. {type(e).__name__}: {e}"))
+        raise GoldQueryError from e
+
+def replace_gold_trends(conn, adds: list[dict],
+                        log: Logger | None = None) -> int:
+    '''
+    Store the entity trends of one or more dates (see 
+    `pipeline.entity_trends`) in `ads_gold_trends`, replacing the rows 
+    previously stored for those dates, in one transaction.
+
+    ### Parameters
+    conn: psycopg2 connection object.
+
+    adds: list of `dict` (keys: colnames of `ads_gold_trends`).
+
+    log: logging object.
+    '''
+    if not adds:
+        return 0
+    dates = sorted({add["scrap_date"] for add in adds})
+    query = """
+        INSERT INTO ads_lakehouse.ads_gold_trends
+        (scrap_date, entity_text, label, count_ads, mean_7d, mean_prev_7d,
+         wow_growth, zscore, spike)
+        VALUES %s;
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM ads_lakehouse.ads_gold_trends
+                WHERE scrap_date = ANY(%s);
+            """, (dates,))
+            execute_values(cur, query, [(
+                add["scrap_date"],
+                add["entity_text"],
+                add["label"],
+                add["count_ads"],
+                add["mean_7d"],
+                add["mean_prev_7d"],
+                add["wow_growth"],
+                add["zscore"],
+                add["spike"]
+            ) for add in adds], page_size=1000)
+        conn.commit()
+        return len(adds)
+    except Exception as e:
+        conn.rollback()
+        if log:
+            log.error(("Error inserting trends into gold layer for: "
+                       f"{dates[0]}..{dates[-1]}. {type(e).__name__}: {e}"))
+        raise GoldQueryError from e
+
+def replace_gold_hll(conn, adds: list[dict],
+                     log: Logger | None = None) -> int:
+    '''
+    Store the HyperLogLog sketches of one or more dates (see 
+    `pipeline.entity_distinct`) in `ads_gold_hll`, replacing the 
+    sketches previously stored for those dates, in one transaction.
+
+    ### Parameters
+    conn: psycopg2 connection object.
+
+    adds: list of `dict` (keys: colnames of `ads_gold_hll`, `sketch` 
+        as serialized by `utils.hll.HLL.to_bytes`).
+
+    log: logging object.
+    '''
+    if not adds:
+        return 0
+    dates = sorted({add["scrap_date"] for add in adds})
+    query = """
+        INSERT INTO ads_lakehouse.ads_gold_hll
+        (scrap_date, entity_text, label, sketch)
+        VALUES %s;
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM ads_lakehouse.ads_gold_hll
+                WHERE scrap_date = ANY(%s);
+            """, (dates,))
+            execute_values(cur, query, [(
+                add["scrap_date"],
+                add["entity_text"],
+                add["label"],
+                Binary(add["sketch"])
+            ) for add in adds], page_size=1000)
+        conn.commit()
+        return len(adds)
+    except Exception as e:
+        conn.rollback()
+        if log:
+            log.error(("Error inserting sketches into gold layer for: "
+                       f"{dates[0]}..{dates[-1]}. {type(e).__name__}: {e}"))
+        raise GoldQueryError from e
+
+def iter_gold_hll(conn, since: date | None = None, to: date | None = None,
+                  entities: list[str] | None = None,
+                  label: str | None = None,
+                  batch_size: int = 10_000) -> Iterator[list[tuple]]:
+    '''
+    Stream `(entity_text, label, sketch)` rows of `ads_gold_hll` in 
+    [since, to], optionally of some entities or of a label, through a 
+    server-side cursor.
+    '''
+    where_clauses, params = _range_where(since, to)
+    if entities:
+        where_clauses.append("entity_text = ANY(%s)")
+        params.append(list(entities))
+    if label:
+        where_clauses.append("label = %s")
+        params.append(label)
+    where_sql = (f"WHERE {' AND '.join(where_clauses)}"
+                 if where_clauses else "")
+    # NOTE: named cursor -> rows stay on the server until fetched.
+    cur = conn.cursor(name="iter_gold_hll")
+    cur.itersize = batch_size
+    try:
+        cur.execute(f"""
+            SELECT entity_text, label, sketch
+            FROM ads_lakehouse.ads_gold_hll {where_sql}
+            ORDER BY scrap_date, id;
+        """, tuple(params))
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    except Exception as e:
+        raise GoldQueryError from e
+    finally:
+        cur.close()
+        conn.commit()
+
+def delete_partition(conn, table: str, scrap_date: date,
+                     expected: int | None = None,
+                     schema: str = "ads_lakehouse",
+                     log: Logger | None = None) -> int:
+    '''
+    Delete the rows of one `scrap_date` of a bronze or silver table 
+    (see `pipeline.retention`; gold is never deleted).
+
+    expected: rows archived for the date; if the table holds another 
+        number, nothing is deleted and `ValueError` is raised.
+    '''
+    validate_db_identifiers(schema, table)
+    if table not in RETAINED_TABLES:
+        raise ValueError(f"Rows of '{table}' are not deleted.")
+    with conn.cursor() as cur:
+        try:
+            cur.execute(f"DELETE FROM {schema}.{table} "
+                        "WHERE scrap_date = %s;", (scrap_date,))
+            deleted = cur.rowcount
+            if expected is not None and deleted != expected:
+                raise ValueError(f"{table} has {deleted} rows for "
+                                 f"{scrap_date}, {expected} archived.")
+        except Exception:
+            conn.rollback()
+            if log:
+                log.error(f"Rows of {table} for {scrap_date} not deleted.")
+            raise
+    conn.commit()
+    return deleted
+
+def _range_where(since: date | None, to: date | None) -> tuple[list, list]:
+    where_clauses, params = [], []
+    if since:
+        where_clauses.append("scrap_date >= %s")
+        params.append(since)
+    if to:
+        where_clauses.append("scrap_date <= %s")
+        params.append(to)
+    return where_clauses, params
+
+def _like(token: str) -> str:
+    return "%" + re.sub(r"([\\%_])", r"\\\1", token) + "%"
+
+def get_checkpoint(conn, stage: str, scrap_date: date) -> int:
+    '''
+    Watermark of `stage` for a date (0 if the stage never ran).
+    '''
+    query = """
+        SELECT position FROM ads_lakehouse.ads_checkpoints
+        WHERE stage = %s AND scrap_date = %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (stage, scrap_date))
+        row = cur.fetchone()
+    return row[0] if row else 0
+
+def set_checkpoint(conn, stage: str, scrap_date: date, 
+                   position: int) -> None:
+    query = """
+        INSERT INTO ads_lakehouse.ads_checkpoints 
+            (stage, scrap_date, position)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (stage, scrap_date) DO UPDATE SET
+            position = EXCLUDED.position,
+            updated_at = now();
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (stage, scrap_date, position))
+    conn.commit()
+
+def fetch_bronze_after(conn, scrap_date: date, after_id: int = 0,
+                       limit: int = 5000, 
+                       hash_range: tuple[str, str | None] | None = None
+                       ) -> list[tuple]:
+    '''
+    `(id, scrap_date, norm_text, hash)` of the bronze ads of a date 
+    with `id > after_id`, in id order (keyset pagination).
+
+    hash_range: `(lo, hi)` to read a shard, `lo <= hash < hi` 
+        (no upper bound if `hi` is None).
+    '''
+    where_clauses = ["scrap_date = %s", "id > %s"]
+    params = [scrap_date, after_id]
+    if hash_range is not None:
+        lo, hi = hash_range
+        where_clauses.append("hash >= %s")
+        params.append(lo)
+        if hi is not None:
+            where_clauses.append("hash < %s")
+            params.append(hi)
+    query = f"""
+        SELECT id, scrap_date, norm_text, hash 
+        FROM ads_lakehouse.ads_bronze
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY id
+        LIMIT %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (*params, limit))
+        return cur.fetchall()
+
+def max_bronze_id(conn, scrap_date: date) -> int:
+    query = """
+        SELECT COALESCE(MAX(id), 0) FROM ads_lakehouse.ads_bronze
+        WHERE scrap_date = %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (scrap_date,))
+        return cur.fetchone()[0]
+
+def save_ruleset(conn, fingerprint: str, patterns: list[dict]) -> None:
+    '''
+    Store a version of the rules (no-op if already stored).
+    '''
+    query = """
+        INSERT INTO ads_lakehouse.ads_rulesets (fingerprint, patterns)
+        VALUES (%s, %s)
+        ON CONFLICT (fingerprint) DO NOTHING;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (fingerprint, Json(patterns)))
+    conn.commit()
+
+def get_ruleset(conn, fingerprint: str | None) -> list[dict] | None:
+    if fingerprint is None:
+        return None
+    query = """
+        SELECT patterns FROM ads_lakehouse.ads_rulesets
+        WHERE fingerprint = %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (fingerprint,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+def set_bronze_ruleset(conn, hashes: list[str], fingerprint: str) -> int:
+    '''
+    Tag bronze ads as processed with the ruleset `fingerprint`.
+    '''
+    if not hashes:
+        return 0
+    query = """
+        UPDATE ads_lakehouse.ads_bronze SET ruleset = %s
+        WHERE hash = ANY(%s);
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (fingerprint, list(hashes)))
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+def stale_rulesets(conn, fingerprint: str, since: date | None = None,
+                   to: date | None = None) -> list[str | None]:
+    '''
+    Distinct rulesets of bronze ads in [since, to] that differ from 
+    `fingerprint` (None: never extracted / untagged).
+    '''
+    where_clauses, params = _range_where(since, to)
+    where_clauses.append("ruleset IS DISTINCT FROM %s")
+    params.append(fingerprint)
+    query = f"""
+        SELECT DISTINCT ruleset FROM ads_lakehouse.ads_bronze
+        WHERE {" AND ".join(where_clauses)};
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, tuple(params))
+        return [r[0] for r in cur.fetchall()]
+
+def fetch_bronze_by_ruleset(conn, ruleset: str | None, 
+                            since: date | None = None, 
+                            to: date | None = None,
+                            contains: list[list[str]] | None = None,
+                            after_id: int = 0, limit: int = 5000
+                            ) -> list[tuple]:
+    '''
+    `(id, scrap_date, norm_text, hash)` of bronze ads tagged with 
+    `ruleset` and `id > after_id`, in id order (keyset pagination, 
+    like `fetch_bronze_after`).
+    
+    contains: if given, only ads whose text contains every token of 
+        at least one of the token lists.
+    '''
+    where_clauses, params = _range_where(since, to)
+    where_clauses.append("ruleset IS NOT DISTINCT FROM %s")
+    params.append(ruleset)
+    where_clauses.append("id > %s")
+    params.append(after_id)
+    if contains is not None:
+        if not contains:
+            return []
+        ors = []
+        for tokens in contains:
+            ors.append("(" + " AND ".join(
+                "norm_text LIKE %s" for _ in tokens) + ")")
+            params.extend(_like(t) for t in tokens)
+        where_clauses.append("(" + " OR ".join(ors) + ")")
+    query = f"""
+        SELECT id, scrap_date, norm_text, hash 
+        FROM ads_lakehouse.ads_bronze
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY id
+        LIMIT %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (*params, limit))
+        return cur.fetchall()
+
+def delete_silver(conn, hashes: list[str]) -> int:
+    '''
+    Remove the entities of the given ads (before re-extraction).
+    '''
+    if not hashes:
+        return 0
+    query = "DELETE FROM ads_lakehouse.ads_silver WHERE hash = ANY(%s);"
+    with conn.cursor() as cur:
+        cur.execute(query, (list(hashes),))
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+def retag_ruleset(conn, old: str | None, new: str,
+                  since: date | None = None, to: date | None = None) -> int:
+    '''
+    Move bronze ads (and their silver rows) from ruleset `old` to `new` 
+    without re-extraction. Returns the number of bronze ads retagged.
+    '''
+    where_clauses, params = _range_where(since, to)
+    where_clauses.append("ruleset IS NOT DISTINCT FROM %s")
+    params.append(old)
+    where_sql = " AND ".join(where_clauses)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            UPDATE ads_lakehouse.ads_silver SET ruleset = %s
+            WHERE hash IN (SELECT hash FROM ads_lakehouse.ads_bronze
+                           WHERE {where_sql});
+        """, (new, *params))
+        cur.execute(f"""
+            UPDATE ads_lakehouse.ads_bronze SET ruleset = %s
+            WHERE {where_sql};
+        """, (new, *params))
+        count = cur.rowcount
+    conn.commit()
+    return count
+
+def enqueue_nlp_batches(conn, scrap_date: date, batch_size: int) -> int:
+    '''
+    Add the bronze ads of a date not yet in `ads_nlp_queue` (ids above 
+    the last queued one) as batches of `batch_size` consecutive ids. 
+    Returns the number of batches added.
+    '''
+    query = """
+        INSERT INTO ads_lakehouse.ads_nlp_queue
+            (scrap_date, first_id, last_id, n_ads)
+        SELECT %s, min(id), max(id), count(*)
+        FROM (
+            SELECT id, (row_number() OVER (ORDER BY id) - 1) / %s AS batch
+            FROM ads_lakehouse.ads_bronze
+            WHERE scrap_date = %s
+              AND id > (SELECT coalesce(max(last_id), 0)
+                        FROM ads_lakehouse.ads_nlp_queue
+                        WHERE scrap_date = %s)
+        ) b
+        GROUP BY batch
+        ON CONFLICT (scrap_date, first_id) DO NOTHING;
+    """
+    try:
+        with conn.cursor() as cur:
+            # NOTE: serializes enqueuers, so two runs for the same date
+            # don't queue overlapping ranges.
+            cur.execute("SELECT pg_advisory_xact_lock("
+                        "hashtext('ads_nlp_queue'));")
+            cur.execute(query, (scrap_date, batch_size, scrap_date, 
+                                scrap_date))
+            count = cur.rowcount
+        conn.commit()
+        return count
+    except Exception as e:
+        conn.rollback()
+        raise SilverQueryError from e
+
+def claim_nlp_batch(conn, worker: str, lease_secs: int,
+                    max_attempts: int) -> tuple | None:
+    '''
+    Lease the oldest pending batch (or one whose lease expired) to 
+    `worker` for `lease_secs`. Rows locked by other claims are skipped, 
+    so concurrent workers never wait for or get the same batch. 
+    Expired batches already tried `max_attempts` times are failed.
+
+    Returns `(id, scrap_date, first_id, last_id, n_ads, attempts)`, 
+    None if there is nothing to claim.
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE ads_lakehouse.ads_nlp_queue
+                SET status = 'failed', worker = NULL, lease_until = NULL,
+                    error = coalesce(error, 'lease expired'),
+                    updated_at = now()
+                WHERE status = 'leased' AND lease_until < now()
+                  AND attempts >= %s;
+            """, (max_attempts,))
+            cur.execute("""
+                UPDATE ads_lakehouse.ads_nlp_queue
+                SET status = 'leased', worker = %s,
+                    lease_until = now() + make_interval(secs => %s),
+                    attempts = attempts + 1, updated_at = now()
+                WHERE id = (
+                    SELECT id FROM ads_lakehouse.ads_nlp_queue
+                    WHERE (status = 'pending'
+                           OR (status = 'leased' AND lease_until < now()))
+                      AND attempts < %s
+                    ORDER BY id
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED)
+                RETURNING id, scrap_date, first_id, last_id, n_ads, 
+                          attempts;
+            """, (worker, lease_secs, max_attempts))
+            row = cur.fetchone()
+        conn.commit()
+        return row
+    except Exception as e:
+        conn.rollback()
+        raise SilverQueryError from e
+
+def heartbeat_nlp_batch(conn, batch_id: int, worker: str,
+                        lease_secs: int) -> bool:
+    '''
+    Extend the lease of a batch. False if `worker` no longer holds it 
+    (it expired and was claimed by another worker).
+    '''
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE ads_lakehouse.ads_nlp_queue
+            SET lease_until = now() + make_interval(secs => %s),
+                updated_at = now()
+            WHERE id = %s AND worker = %s AND status = 'leased';
+        """, (lease_secs, batch_id, worker))
+        held = cur.rowcount == 1
+    conn.commit()
+    return held
+
+def finish_nlp_batch(conn, batch_id: int, worker: str,
+                     error: str | None = None,
+                     max_attempts: int = 3) -> bool:
+    '''
+    Mark a leased batch done or, with an `error`, pending again (failed 
+    after `max_attempts`). False if `worker` no longer holds the lease.
+    '''
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE ads_lakehouse.ads_nlp_queue
+            SET status = CASE WHEN %s IS NULL THEN 'done'
+                              WHEN attempts >= %s THEN 'failed'
+                              ELSE 'pending' END,
+                worker = CASE WHEN %s IS NULL THEN worker END,
+                lease_until = NULL, error = %s, updated_at = now()
+            WHERE id = %s AND worker = %s AND status = 'leased';
+        """, (error, max_attempts, error, error, batch_id, worker))
+        held = cur.rowcount == 1
+    conn.commit()
+    return held
+
+def nlp_queue_status(conn, since: date | None = None,
+                     to: date | None = None) -> list[tuple]:
+    '''
+    `(scrap_date, status, batches, ads)` of the queue, by date.
+    '''
+    where_clauses, params = _range_where(since, to)
+    where_sql = (f"WHERE {' AND '.join(where_clauses)}"
+                 if where_clauses else "")
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT scrap_date, status, count(*), sum(n_ads)
+            FROM ads_lakehouse.ads_nlp_queue {where_sql}
+            GROUP BY scrap_date, status
+            ORDER BY scrap_date, status;
+        """, tuple(params))
+        return cur.fetchall()
@@ -2,25 +2,12 @@ from psycopg2.errors import OperationalError
 from psycopg2 import sql
 import re
 
+from jobnlp.db.validation import validate_db_identifiers
 from jobnlp.utils.logger import get_logger
 from jobnlp.utils import read_labels
 
 log = get_logger(__name__)
 
-ALLOWED_SCHEMES = {"ads_lakehouse"}
-ALLOWED_TABLES = {"ads_bronze", "ads_silver"}
-
-def validate_db_identifiers(scheme: str, table: str) -> None:
-    """
-    NOTE: for bronze and silver layers. The gold layer 
-    is validated separately because its tables are named and 
-    generated dynamically.
-    """
-    if scheme not in ALLOWED_SCHEMES:
-        raise ValueError(f"Scheme '{scheme}' is not allowed.")
-    if table not in ALLOWED_TABLES:
-        raise ValueError(f"Table '{table}' is not allowed.")
-
 def schema_exists(conn, schema: str) -> bool:
     query = """
         SELECT EXISTS (
@@ -48,6 +35,51 @@ def table_exists(conn, schema: str, table: str) -> bool:
         cur.execute(query, (schema, table))
         return cur.fetchone()[0]
 
+def column_exists(conn, schema: str, table: str, column: str) -> bool:
+    query = """
+        SELECT EXISTS (
+            SELECT 1
+            FROM information_schema.columns
+            WHERE table_schema = %s
+              AND table_name = %s
+              AND column_name = %s
+        );
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (schema, table, column))
+        return cur.fetchone()[0]
+
+def index_exists(conn, schema: str, index: str) -> bool:
+    query = """
+        SELECT EXISTS (
+            SELECT 1
+            FROM pg_indexes
+            WHERE schemaname = %s
+              AND indexname = %s
+        );
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (schema, index))
+        return cur.fetchone()[0]
+
+def index_valid(conn, schema: str, index: str) -> bool:
+    '''
+    Whether an index exists and is usable (a `CREATE INDEX 
+    CONCURRENTLY` that failed leaves it invalid).
+    '''
+    query = """
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s
+          AND c.relname = %s;
+    """
+    with conn.cursor() as cur:
+        cur.execute(query, (schema, index))
+        row = cur.fetchone()
+        return bool(row and row[0])
+
 def create_schemas(conn) -> None:
     try:
         with conn.cursor() as cur:
@@ -69,9 +101,19 @@ def create_bronze(conn) -> None:
                 source_url TEXT, 
                 norm_text TEXT,
                 hash TEXT,
+                ruleset TEXT,
+                search_tsv tsvector GENERATED ALWAYS AS 
+                    (to_tsvector('spanish', coalesce(norm_text, ''))) 
+                    STORED,
                 CONSTRAINT unique_hash UNIQUE (hash)
             );
             """)
+            # NOTE: cheap on the new, empty table; existing ones get 
+            # it from `migrate_search`
+            cur.execute("""
+            CREATE INDEX IF NOT EXISTS ads_bronze_search
+                ON ads_lakehouse.ads_bronze USING GIN (search_tsv);
+            """)
         conn.commit()
         log.info("Table 'ads_bronze' created.")
     except Exception as e:
@@ -90,6 +132,7 @@ def create_silver(conn) -> None:
                 start_pos INT,
                 end_pos INT,
                 hash TEXT,
+                ruleset TEXT,
                 CONSTRAINT unique_entry_entity UNIQUE (hash, entity_text)
             );
             """)
@@ -99,6 +142,124 @@ def create_silver(conn) -> None:
         log.error("Unable to create 'ads_silver' table.")
         raise OperationalError from e
 
+def create_rulesets(conn) -> None:
+    '''
+    Versions of the EntityRuler patterns, by fingerprint 
+    (see `nlp.ruleset`), plus the `ruleset` tag columns of bronze 
+    and silver for tables created before they existed.
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_rulesets (
+                fingerprint TEXT PRIMARY KEY,
+                patterns JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+            """)
+            # NOTE: ALTER TABLE and CREATE INDEX lock the table even 
+            # when the column or index exists; this runs on every 
+            # stage start.
+            for table in ("ads_bronze", "ads_silver"):
+                if not column_exists(conn, "ads_lakehouse", table, 
+                                     "ruleset"):
+                    cur.execute(sql.SQL(
+                        "ALTER TABLE ads_lakehouse.{} "
+                        "ADD COLUMN IF NOT EXISTS ruleset TEXT;"
+                    ).format(sql.Identifier(table)))
+            if not index_exists(conn, "ads_lakehouse", "ads_bronze_ruleset"):
+                cur.execute("""
+                CREATE INDEX IF NOT EXISTS ads_bronze_ruleset
+                    ON ads_lakehouse.ads_bronze (scrap_date, ruleset);
+                """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_rulesets' table.")
+        raise OperationalError from e
+
+def create_checkpoints(conn) -> None:
+    '''
+    Watermarks of the stages, per scrap date: records read from the 
+    raw file (`clean`) or last bronze id extracted (`nlp`).
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_checkpoints (
+                stage TEXT NOT NULL,
+                scrap_date DATE NOT NULL,
+                position BIGINT NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (stage, scrap_date)
+            );
+            """)
+            # NOTE: checked first, see `create_rulesets`
+            if not index_exists(conn, "ads_lakehouse", "ads_bronze_date_id"):
+                cur.execute("""
+                CREATE INDEX IF NOT EXISTS ads_bronze_date_id
+                    ON ads_lakehouse.ads_bronze (scrap_date, id);
+                """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_checkpoints' table.")
+        raise OperationalError from e
+
+def search_ready(conn) -> bool:
+    '''
+    Whether bronze has the full-text search column and index (see 
+    `migrate_search`).
+    '''
+    return column_exists(conn, "ads_lakehouse", "ads_bronze", 
+                         "search_tsv") and \
+        index_valid(conn, "ads_lakehouse", "ads_bronze_search")
+
+def migrate_search(conn) -> None:
+    '''
+    Full-text search of an existing bronze (see `db.search`), run once 
+    with `jobnlp search-index`: a `tsvector` of the text with the 
+    Spanish configuration, kept up to date by PostgreSQL, and its GIN 
+    index. Adding the column computes it for every ad and rewrites 
+    `ads_bronze` under an exclusive lock, so run it while no stage 
+    is running; the index is then built without blocking writes.
+    '''
+    try:
+        if not column_exists(conn, "ads_lakehouse", "ads_bronze",
+                             "search_tsv"):
+            log.info("Adding 'search_tsv' to ads_bronze "
+                     "(rewrites the table)...")
+            with conn.cursor() as cur:
+                cur.execute("""
+                ALTER TABLE ads_lakehouse.ads_bronze
+                    ADD COLUMN IF NOT EXISTS search_tsv tsvector
+                    GENERATED ALWAYS AS 
+                        (to_tsvector('spanish', coalesce(norm_text, ''))) 
+                    STORED;
+                """)
+            conn.commit()
+        if index_valid(conn, "ads_lakehouse", "ads_bronze_search"):
+            return
+        # NOTE: CONCURRENTLY can't run inside a transaction block; 
+        # end the one opened by the checks above
+        conn.commit()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                # left invalid by an interrupted build
+                cur.execute("""
+                DROP INDEX CONCURRENTLY IF EXISTS 
+                    ads_lakehouse.ads_bronze_search;
+                """)
+                log.info("Building the ads_bronze search index...")
+                cur.execute("""
+                CREATE INDEX CONCURRENTLY ads_bronze_search
+                    ON ads_lakehouse.ads_bronze USING GIN (search_tsv);
+                """)
+        finally:
+            conn.autocommit = False
+    except Exception as e:
+        log.error("Unable to create the bronze search index.")
+        raise OperationalError from e
+
 def safe_label_to_gold_table(label: str) -> str:
     label_clean = re.sub(r'\W+', '_', label.lower())
     return f"ads_lakehouse.ads_gold_{label_clean}"
@@ -153,6 +314,122 @@ def create_gold(conn):
         log.error("Unable to create 'ads_gold' table.")
         raise OperationalError from e
 
+def create_gold_cooc(conn):
+    '''
+    Top co-occurring entity pairs per date range 
+    (`since`..`scrap_date`), see `pipeline.entity_cooc`.
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_gold_cooc (
+                id SERIAL PRIMARY KEY,
+                scrap_date DATE NOT NULL,
+                since DATE NOT NULL,
+                entity_a TEXT,
+                label_a TEXT,
+                entity_b TEXT,
+                label_b TEXT,
+                count INT,
+                count_a INT,
+                count_b INT,
+                n_ads INT,
+                lift DOUBLE PRECISION,
+                pmi DOUBLE PRECISION,
+                CONSTRAINT unique_cooc_range_pair UNIQUE 
+                        (scrap_date, since, entity_a, entity_b)
+            );
+            """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_gold_cooc' table.")
+        raise OperationalError from e
+
+def create_gold_trends(conn):
+    '''
+    Rolling means, week-over-week growth and z-score spikes of the 
+    gold counts, per entity and date, see `pipeline.entity_trends`.
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_gold_trends (
+                id SERIAL PRIMARY KEY,
+                scrap_date DATE NOT NULL,
+                entity_text TEXT,
+                label TEXT,
+                count_ads INT,
+                mean_7d DOUBLE PRECISION,
+                mean_prev_7d DOUBLE PRECISION,
+                wow_growth DOUBLE PRECISION,
+                zscore DOUBLE PRECISION,
+                spike BOOLEAN NOT NULL DEFAULT FALSE,
+                CONSTRAINT unique_trend_date_ent UNIQUE 
+                        (scrap_date, entity_text)
+            );
+            """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_gold_trends' table.")
+        raise OperationalError from e
+
+def create_gold_hll(conn):
+    '''
+    HyperLogLog sketch of the ads of each entity and date, merged over 
+    date ranges for distinct-ad estimates (see `pipeline.entity_distinct`).
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_gold_hll (
+                id SERIAL PRIMARY KEY,
+                scrap_date DATE NOT NULL,
+                entity_text TEXT,
+                label TEXT,
+                sketch BYTEA NOT NULL,
+                CONSTRAINT unique_hll_date_ent UNIQUE 
+                        (scrap_date, entity_text)
+            );
+            """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_gold_hll' table.")
+        raise OperationalError from e
+
+def create_nlp_queue(conn):
+    '''
+    Work queue of bronze id ranges for the `nlp_worker` processes, 
+    claimed with a lease (see `pipeline.nlp_worker`).
+    '''
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS ads_lakehouse.ads_nlp_queue (
+                id BIGSERIAL PRIMARY KEY,
+                scrap_date DATE NOT NULL,
+                first_id BIGINT NOT NULL,
+                last_id BIGINT NOT NULL,
+                n_ads INT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until TIMESTAMPTZ,
+                attempts INT NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                CONSTRAINT unique_queue_batch UNIQUE (scrap_date, first_id)
+            );
+            """)
+            # NOTE: checked first, see `create_rulesets`
+            if not index_exists(conn, "ads_lakehouse", "ads_nlp_queue_claim"):
+                cur.execute("""
+                CREATE INDEX IF NOT EXISTS ads_nlp_queue_claim
+                    ON ads_lakehouse.ads_nlp_queue (status, id);
+                """)
+        conn.commit()
+    except Exception as e:
+        log.error("Unable to create 'ads_nlp_queue' table.")
+        raise OperationalError from e
+
 def db_init(conn) -> None:
     '''
     Ensure the existence of schemas and tables.
@@ -177,4 +454,14 @@ def db_init(conn) -> None:
         create_gold(conn)
         log.info("Table: 'ads_gold' created.")
     else:
-        log.info("ads_gold table exist.")
\ No newline at end of file
+        log.info("ads_gold table exist.")
+
+    create_rulesets(conn)
+    create_checkpoints(conn)
+    if not search_ready(conn):
+        log.warning("No full-text search of ads_bronze: run "
+                    "`jobnlp search-index` once (see `migrate_search`).")
+    create_gold_cooc(conn)
+    create_gold_trends(conn)
+    create_gold_hll(conn)
+    create_nlp_queue(conn)
\ No newline at end of file
@@ -0,0 +1,153 @@
+'''
+Full-text search over the bronze ads (`StorageBackend.search_bronze`).
+
+Queries use the web search syntax of PostgreSQL's
+`websearch_to_tsquery`, on both backends:
+
+    chofer con registro         every word (stop words are ignored)
+    "ayudante de cocina"        phrase
+    chofer or remisero          either
+    chofer -camion              without a word
+
+    jobnlp search "chofer con registro" [--since YYYY-MM-DD] [--limit 20]
+
+PostgreSQL matches Spanish stems through a generated `tsvector` column
+with a GIN index, added to an existing bronze once with
+`jobnlp search-index` (see `db.schemas.migrate_search`). SQLite uses
+an FTS5 index kept in sync by triggers (`db.backends.sqlite`), with
+prefix matching of the words instead of stemming and accents ignored.
+'''
+import argparse
+import re
+from typing import NamedTuple
+
+SEARCH_LIMIT = 50
+SEARCH_COLS = ["id", "scrap_date", "source_url", "norm_text", "hash"]
+
+# most frequent words of the `spanish` text search dictionary
+STOP_WORDS = frozenset("""
+    a al algo algunas algunos ante antes como con contra cual cuando de
+    del desde donde durante e el ella ellas ellos en entre era es esa esas
+    ese eso esos esta estas este esto estos fue ha hay la las le les lo
+    los mas me mi mis mucho muy nada ni no nos o os otra otro para pero
+    poco por porque que quien se sea ser si sin sobre su sus tambien te
+    tiene todo tu un una uno unos y ya
+    él está más sí también tú
+""".split())
+# `-` negates at the start of a term only ("medio-tiempo" is two words)
+_TOKEN = re.compile(r'((?<!\S)-)?"([^"]*)"?|((?<!\S)-)?(\w+)')
+_WORD = re.compile(r"\w+")
+
+
+class Term(NamedTuple):
+    words: tuple[str, ...]      # more than one: phrase
+    negated: bool
+
+
+def parse_query(query: str) -> list[list[Term]]:
+    '''
+    Web search syntax -> OR groups of terms (every term of a group
+    must match). Unquoted stop words are dropped.
+    '''
+    groups: list[list[Term]] = [[]]
+    for m in _TOKEN.finditer(query.lower()):
+        neg_phrase, phrase, neg_word, word = m.groups()
+        if word == "or" and not neg_word:
+            if groups[-1]:
+                groups.append([])
+            continue
+        if phrase is not None:
+            words = tuple(_WORD.findall(phrase))
+            negated = bool(neg_phrase)
+        else:
+            if word in STOP_WORDS:
+                continue
+            words, negated = (word,), bool(neg_word)
+        if words:
+            groups[-1].append(Term(words, negated))
+    return [g for g in groups if any(not t.negated for t in g)]
+
+def fts5_query(query: str) -> str | None:
+    '''
+    SQLite FTS5 MATCH expression of a web search query: words match
+    as prefixes ("chofer" -> "choferes"), phrases exactly. None if
+    nothing is left to search for (e.g. only stop words: "de la"),
+    which matches no ad, like PostgreSQL's empty `tsquery`.
+    '''
+    def fts5_term(term: Term) -> str:
+        if len(term.words) > 1:
+            return '"' + " ".join(term.words) + '"'
+        return f'"{term.words[0]}"*'
+
+    ors = []
+    for group in parse_query(query):
+        expr = " AND ".join(fts5_term(t) for t in group if not t.negated)
+        for t in group:
+            if t.negated:
+                expr += f" NOT {fts5_term(t)}"
+        ors.append(f"({expr})")
+    if not ors:
+        return None
+    return " OR ".join(ors)
+
+
+def add_parser(subparsers) -> argparse.ArgumentParser:
+    from jobnlp.utils.date_arg import valid_date
+    parser = subparsers.add_parser(
+        "search", help="Full-text search of the bronze ads",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query", help="Words, \"phrases\", or, -word")
+    parser.add_argument("--date", type=valid_date, default=None,
+                        help="Only ads of this date (YYYY-MM-DD)")
+    parser.add_argument("--since", type=valid_date, default=None,
+                        help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="Last date (YYYY-MM-DD)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.set_defaults(func=main)
+    return parser
+
+def add_index_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "search-index", 
+        help="Add the full-text search index to an existing bronze (once)",
+        description="Add the search column and index to an existing "
+                    "PostgreSQL bronze. It rewrites ads_bronze under an "
+                    "exclusive lock: run it while no stage is running "
+                    "(see `db.schemas.migrate_search`).")
+    parser.set_defaults(func=index_main)
+    return parser
+
+def index_main(args: argparse.Namespace):
+    from jobnlp.db.backends import get_backend
+    from jobnlp.utils.logger import get_logger, setup_logging
+
+    setup_logging()
+    backend = get_backend(log=get_logger(__name__))
+    try:
+        backend.migrate_search()
+    finally:
+        backend.close()
+
+def main(args: argparse.Namespace):
+    import time
+
+    from jobnlp.db.backends import get_backend
+    from jobnlp.utils.logger import get_logger, setup_logging
+
+    setup_logging(level="WARNING")
+    backend = get_backend(log=get_logger(__name__))
+    try:
+        backend.init_schema()
+        start = time.perf_counter()
+        rows = backend.search_bronze(
+            args.query, date=args.date, since=args.since, to=args.to,
+            limit=args.limit, cols=["scrap_date", "norm_text", "hash"])
+        ms = (time.perf_counter() - start) * 1000
+    finally:
+        backend.close()
+    for scrap_date, text, hash_, rank in rows:
+        print(f"{scrap_date}  {rank:7.3f}  {hash_[:12]}  "
+              f"{text[:100]}{'...' if len(text) > 100 else ''}")
+    print(f"\n{len(rows)} ads in {ms:.1f} ms")
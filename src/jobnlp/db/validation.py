@@ -0,0 +1,49 @@
+'''
+Identifier and argument validation shared by all storage backends.
+'''
+from datetime import datetime
+from typing import Any
+
+ALLOWED_SCHEMES = {"ads_lakehouse"}
+ALLOWED_TABLES = {"ads_bronze", "ads_silver", "ads_gold", "ads_gold_cooc",
+                  "ads_gold_trends"}
+# layers whose old dates may be archived and deleted (gold is kept)
+RETAINED_TABLES = ("ads_bronze", "ads_silver")
+
+COLS_WHITE_LIST = {"id", "scrap_date", "source_url", "norm_text", "hash",
+                   "entity_text", "label", "start_pos", "end_pos",
+                   "count", "count_ads", "ruleset",
+                   # ads_gold_cooc
+                   "since", "entity_a", "label_a", "entity_b", "label_b",
+                   "count_a", "count_b", "n_ads", "lift", "pmi",
+                   # ads_gold_trends
+                   "mean_7d", "mean_prev_7d", "wow_growth", "zscore",
+                   "spike"}
+
+def validate_db_identifiers(scheme: str, table: str) -> None:
+    """
+    NOTE: for the `ads_bronze`, `ads_silver`, `ads_gold`, 
+    `ads_gold_cooc` and `ads_gold_trends` tables. 
+    The per-label `ads_gold_*` tables (discarded idea) are validated 
+    separately because they are named and generated dynamically.
+    """
+    if scheme not in ALLOWED_SCHEMES:
+        raise ValueError(f"Scheme '{scheme}' is not allowed.")
+    if table not in ALLOWED_TABLES:
+        raise ValueError(f"Table '{table}' is not allowed.")
+
+def validate_cols(cols: list[str]) -> None:
+    invalid = [c for c in cols if c not in COLS_WHITE_LIST]
+    if invalid:
+        raise ValueError(f"Invalid column(s): {', '.join(invalid)}")
+    
+def validate_filters(filters: dict[str, Any]) -> None:
+    invalid = [k for k in filters if k not in COLS_WHITE_LIST]
+    if invalid:
+        raise ValueError(f"Invalid filter column(s): {', '.join(invalid)}")
+
+def validate_date(d):
+    try:
+        return datetime.strptime(d, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except Exception:
+        raise ValueError(f"Date '{d}' must be in YYYY-MM-DD format")
@@ -6,10 +6,12 @@ from pathlib import Path
 import jobnlp
 from jobnlp.nlp.nlp_custom import NLPRules
 from jobnlp.nlp.nlp_models import SpacyModel
+from jobnlp.nlp.trie_matcher import compile_rules, save_compiled
 from jobnlp.utils.logger import setup_logging, get_logger
 
 DIR = Path(jobnlp.__file__).parent
 MOD_RUL_PATH = DIR / "nlp" / "models" / "rules_es"
+TRIE_RUL_PATH = DIR / "nlp" / "models" / "rules_es_trie.json"
 PATT_PATH = DIR / "nlp" / "patterns" / "job_ruler_patterns.jsonl"
 LOG_PATH = Path("log/es_ruler_builder.log")
 
@@ -20,10 +22,14 @@ def main():
     get_models = SpacyModel(log=log)
     nlp = get_models.get_blank_mod()
 
-    nlp_rul = NLPRules(nlp, log)
+    nlp_rul = NLPRules(log, nlp)
     nlp_rul.load_patterns(PATT_PATH)
     nlp_rul.save_model(MOD_RUL_PATH)
 
+    # spaCy-free engine: same patterns and tokenizer rules
+    save_compiled(compile_rules(nlp, nlp_rul.ruler.patterns), TRIE_RUL_PATH)
+    log.info(f"Compiled rules saved to {TRIE_RUL_PATH}")
+
 if __name__ == "__main__":
 
     main()
\ No newline at end of file
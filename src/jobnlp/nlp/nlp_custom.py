@@ -21,7 +21,7 @@ class NLPRules:
         nlp: SpaCy Language object. If provided, adds an EntityRuler.
         modelpath: Path to save the model to disk.
         '''
-        self.ruler_name = "entity_ruler",
+        self.ruler_name = "entity_ruler"
         self.ruler: EntityRuler
         self.modelpath = modelpath
         self.log = log
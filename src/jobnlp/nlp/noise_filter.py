@@ -0,0 +1,101 @@
+'''
+Cheap pre-NLP filter of bronze ads: drops the text-node fragments of
+`.avisos.normal` (section headers, prices, loose words) before they
+reach the rules engine. Checks, cheapest first:
+
+    short       fewer than `min_chars` characters
+    few_words   fewer than `min_words` words
+    non_alpha   less than `min_alpha` of the non-space characters are
+                letters (prices, phone leftovers, dates)
+    no_lexicon  no rule can match: the text does not contain every
+                literal token of any rule (see `ruleset.rule_tokens`)
+
+The lexicon check never drops an ad the rules would extract entities
+from; the first three are heuristics. Dropped ads stay in bronze and
+are tagged with the ruleset like ads without entities.
+
+Configured with `JOBNLP_NOISE_FILTER` (0 disables it),
+`JOBNLP_NOISE_MIN_CHARS`, `JOBNLP_NOISE_MIN_WORDS` and
+`JOBNLP_NOISE_MIN_ALPHA`. Evaluate a configuration against labelled
+samples with `python -m benchmarks.eval_noise_filter`.
+'''
+import os
+from collections import Counter
+from typing import NamedTuple
+
+from jobnlp.nlp.ruleset import rule_tokens
+
+NOISE_FILTER = os.getenv("JOBNLP_NOISE_FILTER", "1").lower() not in (
+    "0", "false", "no", "off")
+NOISE_MIN_CHARS = int(os.getenv("JOBNLP_NOISE_MIN_CHARS", 12))
+NOISE_MIN_WORDS = int(os.getenv("JOBNLP_NOISE_MIN_WORDS", 2))
+NOISE_MIN_ALPHA = float(os.getenv("JOBNLP_NOISE_MIN_ALPHA", 0.5))
+REASONS = ("short", "few_words", "non_alpha", "no_lexicon")
+
+
+class NoiseConfig(NamedTuple):
+    min_chars: int = NOISE_MIN_CHARS
+    min_words: int = NOISE_MIN_WORDS
+    min_alpha: float = NOISE_MIN_ALPHA
+    lexicon: bool = True        # drop ads no rule can match
+
+# None: filter disabled
+NOISE_CONFIG = NoiseConfig() if NOISE_FILTER else None
+
+
+class NoiseFilter:
+    '''
+    Called with bronze rows `(scrap_date, norm_text, hash)`, returns
+    the rows that go on to the rules engine. Drops are counted by
+    reason in `dropped`.
+    '''
+    def __init__(self, patterns: list[dict],
+                 config: NoiseConfig = NoiseConfig()):
+        self.config = config
+        rules = rule_tokens(patterns) if config.lexicon else None
+        # None: no lexicon check (disabled, or some rule has no
+        # literal text and could match anywhere)
+        self.rules = ([frozenset(r) for r in rules]
+                      if rules is not None else None)
+        self.vocab = (sorted(set().union(*self.rules))
+                      if self.rules is not None else [])
+        self.kept = 0
+        self.dropped: Counter[str] = Counter()
+
+    def reason(self, text: str) -> str | None:
+        '''
+        Why `text` is dropped, None if it is kept.
+        '''
+        cfg = self.config
+        if len(text) < cfg.min_chars:
+            return "short"
+        words = text.split()
+        if len(words) < cfg.min_words:
+            return "few_words"
+        chars = sum(map(len, words))
+        if sum(c.isalpha() for c in text) < cfg.min_alpha * chars:
+            return "non_alpha"
+        if not self.could_match(text):
+            return "no_lexicon"
+        return None
+
+    def could_match(self, text: str) -> bool:
+        '''
+        Whether `text` contains every literal token of some rule
+        (always True without the lexicon check).
+        '''
+        if self.rules is None:
+            return True
+        found = {t for t in self.vocab if t in text}
+        return any(r <= found for r in self.rules)
+
+    def __call__(self, rows: list[tuple]) -> list[tuple]:
+        kept = []
+        for row in rows:
+            why = self.reason(row[1])
+            if why is None:
+                kept.append(row)
+            else:
+                self.dropped[why] += 1
+        self.kept += len(kept)
+        return kept
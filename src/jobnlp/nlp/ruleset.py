@@ -0,0 +1,78 @@
+'''
+Ruleset fingerprints: identify which version of the EntityRuler
+patterns produced each silver row, and diff rule versions.
+'''
+import hashlib
+import json
+from pathlib import Path
+
+from jobnlp.utils.read_labels import PATT_PATH
+
+# token attributes that carry literal text
+_TEXT_ATTRS = ("LOWER", "ORTH", "TEXT")
+
+
+class StaleRulesError(RuntimeError):
+    """Raised when saved rules were not built from the patterns file."""
+    pass
+
+
+def load_patterns(path: Path = PATT_PATH) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _canon(rule: dict) -> str:
+    return json.dumps(rule, sort_keys=True, ensure_ascii=False)
+
+def fingerprint(patterns: list[dict]) -> str:
+    '''
+    Order-insensitive hash of a list of patterns.
+    '''
+    canon = "\n".join(sorted(_canon(r) for r in patterns))
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()[:16]
+
+def check_built(ruleset: str, built: Path, path: Path = PATT_PATH) -> None:
+    '''
+    Raise `StaleRulesError` unless the rules saved at `built` (with 
+    fingerprint `ruleset`) match the current patterns file, which the 
+    warm worker (`nlp_server`) extracts with.
+    '''
+    current = fingerprint(load_patterns(path))
+    if ruleset != current:
+        raise StaleRulesError(
+            f"Rules {ruleset} saved at {built} differ from rules "
+            f"{current} of {path}. Rebuild them with "
+            "`python -m jobnlp.nlp.es_ruler_builder`.")
+
+def added_rules(old: list[dict], new: list[dict]) -> list[dict] | None:
+    '''
+    Rules in `new` that are not in `old`, if the change is a pure
+    addition. Returns None if any rule of `old` was changed or removed.
+    '''
+    old_keys = {_canon(r) for r in old}
+    new_keys = {_canon(r) for r in new}
+    if not old_keys <= new_keys:
+        return None
+    return [r for r in new if _canon(r) not in old_keys]
+
+def rule_tokens(rules: list[dict]) -> list[list[str]] | None:
+    '''
+    Lowercase literal tokens of each rule. An ad can only match a rule
+    if it contains all of them. Returns None if some rule has no
+    literal text (e.g. POS or regex patterns), i.e. it could match
+    anywhere.
+    '''
+    tokens = []
+    for rule in rules:
+        pattern = rule["pattern"]
+        if isinstance(pattern, str):
+            tokens.append(pattern.lower().split())
+            continue
+        words = []
+        for tok in pattern:
+            value = next((tok[a] for a in _TEXT_ATTRS if a in tok), None)
+            if not isinstance(value, str):
+                return None
+            words.append(value.lower())
+        tokens.append(words)
+    return tokens
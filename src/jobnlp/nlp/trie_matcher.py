@@ -0,0 +1,349 @@
+'''
+spaCy-free rule engine.
+
+The EntityRuler token patterns are compiled into a token trie, together
+with the tokenizer rules of the spaCy model (special cases, prefix,
+suffix and infix expressions). At run time only `re` and `json` are
+needed: texts are tokenized with the same algorithm as spaCy's
+tokenizer and matched against the trie, and overlapping matches are
+resolved like `spacy.util.filter_spans` (longest first, then leftmost).
+Only the tokens of whitespace-delimited chunks that contain a word of
+the rules are matched (see `TrieMatcher._tokens`).
+
+Compilation needs the spaCy model (see `nlp.es_ruler_builder`);
+loading and matching do not.
+'''
+import json
+import re
+from pathlib import Path
+from typing import Any
+
+from jobnlp.nlp.ruleset import fingerprint
+
+# token attributes supported by the trie
+ATTRS = {"LOWER": "L", "ORTH": "O", "TEXT": "O"}
+_LABELS = "#"
+
+Span = tuple[str, str, int, int]
+# `(start_char, end_char, trie keys)` of a token
+_Token = tuple[int, int, tuple[tuple[str, str], ...]]
+
+
+class UnsupportedPatternError(ValueError):
+    """Raised when a pattern can not be compiled into the trie."""
+    pass
+
+
+def _regex_pattern(fn) -> str | None:
+    '''
+    Source expression of a bound `re.Pattern` method used by the
+    spaCy tokenizer (`prefix_search`, `infix_finditer`...).
+    '''
+    if fn is None:
+        return None
+    owner = getattr(fn, "__self__", None)
+    return getattr(owner, "pattern", None)
+
+def compile_tokenizer(tokenizer) -> dict[str, Any]:
+    '''
+    Export the rules of a `spacy.tokenizer.Tokenizer` as plain data.
+    '''
+    special_cases = {}
+    for orth, case in tokenizer.rules.items():
+        pieces = []
+        for tok in case:
+            # NOTE: keys are the ORTH symbol (65) or the "ORTH" string
+            pieces.append(tok.get(65, tok.get("ORTH")))
+        special_cases[orth] = pieces
+    return {
+        "special_cases": special_cases,
+        "prefix": _regex_pattern(tokenizer.prefix_search),
+        "suffix": _regex_pattern(tokenizer.suffix_search),
+        "infix": _regex_pattern(tokenizer.infix_finditer),
+        "token_match": _regex_pattern(tokenizer.token_match),
+        "url_match": _regex_pattern(tokenizer.url_match),
+    }
+
+def compile_rules(nlp, patterns: list[dict]) -> dict[str, Any]:
+    '''
+    Compile EntityRuler patterns and the tokenizer of `nlp` into a
+    JSON-serializable ruleset for `TrieMatcher`.
+
+    Supported patterns: token patterns whose tokens only use `LOWER`,
+    `ORTH` or `TEXT`, and phrase patterns (plain strings, matched on
+    `ORTH` like the EntityRuler default).
+    '''
+    tokenizer_rules = compile_tokenizer(nlp.tokenizer)
+    phrase_tokenizer = Tokenizer(tokenizer_rules)
+
+    compiled = []
+    for rule in patterns:
+        pattern = rule["pattern"]
+        if isinstance(pattern, str):
+            keys = [["O", t] for t, _, _ in phrase_tokenizer(pattern)]
+        else:
+            keys = []
+            for tok in pattern:
+                if len(tok) != 1 or next(iter(tok)) not in ATTRS:
+                    raise UnsupportedPatternError(
+                        f"Unsupported token pattern {tok} in rule: {rule}")
+                attr, value = next(iter(tok.items()))
+                keys.append([ATTRS[attr], value])
+        if keys:
+            compiled.append({"label": rule["label"], "keys": keys})
+
+    return {"tokenizer": tokenizer_rules, "patterns": compiled,
+            "ruleset": fingerprint(patterns), "rules": patterns}
+
+def _delimited(text: str, start: int, end: int) -> bool:
+    '''
+    Whether `text[start:end]` is a whole whitespace-delimited chunk.
+    '''
+    return (start == 0 or text[start - 1].isspace()) and \
+        (end == len(text) or text[end].isspace())
+
+def save_compiled(rules: dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rules, f, ensure_ascii=False)
+
+
+class Tokenizer:
+    '''
+    Pure-Python port of spaCy's tokenization algorithm
+    (`Tokenizer._split_affixes` / `_attach_tokens`), returning
+    `(orth, start_char, end_char)` tuples.
+
+    NOTE: the final pass that merges special cases spanning
+    whitespace (e.g. "EE. UU.") is not reproduced; none of the
+    rule tokens can match inside them.
+    '''
+    CACHE_SIZE = 100_000
+
+    def __init__(self, rules: dict[str, Any]):
+        self.special_cases: dict[str, list[str]] = rules["special_cases"]
+        # NOTE: like spaCy, whitespace-delimited chunks are cached
+        self._cache: dict[str, list[tuple[str, int, int]]] = {}
+        self.prefix_search = self._compile(rules["prefix"], "search")
+        self.suffix_search = self._compile(rules["suffix"], "search")
+        self.infix_finditer = self._compile(rules["infix"], "finditer")
+        self.token_match = self._compile(rules["token_match"], "match")
+        self.url_match = self._compile(rules["url_match"], "match")
+
+    @staticmethod
+    def _compile(pattern: str | None, method: str):
+        if not pattern:
+            return lambda s: None if method != "finditer" else iter(())
+        return getattr(re.compile(pattern), method)
+
+    def _special(self, substring: str, start: int,
+                 out: list[tuple[str, int, int]]) -> None:
+        for piece in self.special_cases[substring]:
+            out.append((piece, start, start + len(piece)))
+            start += len(piece)
+
+    def _split(self, substring: str, start: int,
+               out: list[tuple[str, int, int]]) -> None:
+        suffixes: list[tuple[str, int, int]] = []
+        end = start + len(substring)
+        special = self.special_cases
+        while substring:
+            if substring in special:
+                self._special(substring, start, out)
+                substring = ""
+                continue
+            while self.prefix_search(substring) or \
+                    self.suffix_search(substring):
+                if self.token_match(substring):
+                    out.append((substring, start, end))
+                    substring = ""
+                    break
+                if substring in special:
+                    self._special(substring, start, out)
+                    substring = ""
+                    break
+                pre = self.prefix_search(substring)
+                if pre:
+                    split = pre.end()
+                    out.append((substring[:split], start, start + split))
+                    substring = substring[split:]
+                    start += split
+                    if substring in special:
+                        continue
+                suf = self.suffix_search(substring)
+                if suf:
+                    split = suf.start()
+                    suffixes.append((substring[split:], start + split, end))
+                    substring = substring[:split]
+                    end = start + split
+            if not substring:
+                break
+            # NOTE: same order as `Tokenizer._attach_tokens`
+            if substring in special:
+                self._special(substring, start, out)
+            elif self.token_match(substring) or self.url_match(substring):
+                out.append((substring, start, end))
+            else:
+                infixes = list(self.infix_finditer(substring))
+                offset = 0
+                for m in infixes:
+                    if offset == 0 and m.start() == 0:
+                        continue
+                    if m.start() > offset:
+                        out.append((substring[offset:m.start()],
+                                    start + offset, start + m.start()))
+                    if m.end() > m.start():
+                        out.append((substring[m.start():m.end()],
+                                    start + m.start(), start + m.end()))
+                    offset = m.end()
+                if substring[offset:]:
+                    out.append((substring[offset:], start + offset, end))
+            substring = ""
+        out.extend(reversed(suffixes))
+
+    def chunk(self, chunk: str) -> list[tuple[str, int, int]]:
+        '''
+        Tokens of one whitespace-delimited chunk (not cached).
+        '''
+        pieces: list[tuple[str, int, int]] = []
+        self._split(chunk, 0, pieces)
+        return pieces
+
+    def __call__(self, text: str) -> list[tuple[str, int, int]]:
+        tokens: list[tuple[str, int, int]] = []
+        cache = self._cache
+        for m in re.finditer(r"\S+", text):
+            chunk, offset = m.group(), m.start()
+            pieces = cache.get(chunk)
+            if pieces is None:
+                pieces = self.chunk(chunk)
+                if len(cache) >= self.CACHE_SIZE:
+                    cache.clear()
+                cache[chunk] = pieces
+            tokens.extend((t, offset + s, offset + e) for t, s, e in pieces)
+        return tokens
+
+
+class TrieMatcher:
+    '''
+    Token-trie matcher for compiled EntityRuler rules.
+
+    `find(text)` returns `(entity_text, label, start_char, end_char)`
+    spans, the same as `doc.ents` of the spaCy rules model.
+    '''
+    def __init__(self, rules: dict[str, Any]):
+        self.tokenizer = Tokenizer(rules["tokenizer"])
+        # source patterns and their fingerprint (see `nlp.ruleset`)
+        self.rules: list[dict] = rules.get("rules", [])
+        self.ruleset: str | None = rules.get("ruleset")
+        self.trie: dict = {}
+        for pattern in rules["patterns"]:
+            node = self.trie
+            for attr, value in pattern["keys"]:
+                node = node.setdefault((attr, value), {})
+            # NOTE: first rule wins for duplicated patterns
+            node.setdefault(_LABELS, pattern["label"])
+        # keys at any depth of the trie (see `_tokens`)
+        self._keys = {(attr, value) for pattern in rules["patterns"]
+                      for attr, value in pattern["keys"]}
+        self._cache: dict[str, list[_Token]] = {}
+
+    @classmethod
+    def from_file(cls, path: Path) -> "TrieMatcher":
+        if not Path(path).is_file():
+            raise FileNotFoundError(
+                f"{path} does not exist. Build it with "
+                "`python -m jobnlp.nlp.es_ruler_builder`.")
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _chunk(self, chunk: str) -> list[_Token]:
+        '''
+        Tokens of a chunk, or `[]` if none of them is a key of the 
+        trie (cached like `Tokenizer`).
+        '''
+        pieces = [(start, end, (("L", orth.lower()), ("O", orth)))
+                  for orth, start, end in self.tokenizer.chunk(chunk)]
+        if self._keys.isdisjoint(k for _, _, keys in pieces for k in keys):
+            pieces = []
+        if len(self._cache) >= Tokenizer.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[chunk] = pieces
+        return pieces
+
+    def _tokens(self, text: str) -> list[_Token | None]:
+        '''
+        Tokens of the chunks of `text` that have a token in the trie, 
+        with one `None` gap for each run of the other chunks: no match 
+        can include or cross their tokens, so they are not kept.
+        '''
+        chunks = text.split()
+        found = list(map(self._cache.get, chunks))
+        if None in found:
+            found = [self._chunk(c) if p is None else p
+                     for c, p in zip(chunks, found)]
+        tokens: list[_Token | None] = []
+        offset, last = 0, -1
+        for i, pieces in enumerate(found):
+            if not pieces:
+                continue
+            if tokens and i != last + 1:
+                tokens.append(None)
+            # NOTE: skipped chunks differ from this one, so its first 
+            # whitespace-delimited occurrence after the last kept 
+            # chunk is the right one
+            chunk = chunks[i]
+            offset = text.find(chunk, offset)
+            while not _delimited(text, offset, offset + len(chunk)):
+                offset = text.find(chunk, offset + 1)
+            tokens.extend([(offset + s, offset + e, keys)
+                           for s, e, keys in pieces])
+            offset += len(chunk)
+            last = i
+        return tokens
+
+    def _matches(self, tokens: list[_Token | None]):
+        trie = self.trie
+        for i, tok in enumerate(tokens):
+            if tok is None or trie.keys().isdisjoint(tok[2]):
+                continue
+            frontier = [trie]
+            j = i
+            while frontier and j < len(tokens) and tokens[j] is not None:
+                keys = tokens[j][2]
+                frontier = [node[k] for node in frontier for k in keys
+                            if k in node]
+                j += 1
+                for node in frontier:
+                    if _LABELS in node:
+                        yield i, j, node[_LABELS]
+
+    def find(self, text: str) -> list[Span]:
+        tokens = self._tokens(text)
+        matches = list(self._matches(tokens))
+        if not matches:
+            return []
+
+        # NOTE: same resolution as `spacy.util.filter_spans`; matches 
+        # come sorted by start, and usually none overlap
+        if all(a[1] <= b[0] for a, b in zip(matches, matches[1:])):
+            kept = matches
+        else:
+            matches.sort(key=lambda m: (m[1] - m[0], -m[0]), reverse=True)
+            taken: set[int] = set()
+            kept = []
+            for start, end, label in matches:
+                if taken.isdisjoint(range(start, end)):
+                    kept.append((start, end, label))
+                    taken.update(range(start, end))
+            kept.sort()
+
+        spans = []
+        for start, end, label in kept:
+            start_char = tokens[start][0]
+            end_char = tokens[end - 1][1]
+            spans.append((text[start_char:end_char], label,
+                          start_char, end_char))
+        return spans
+
+    __call__ = find
@@ -0,0 +1,267 @@
+'''
+Long-lived local NLP worker.
+
+Keeps the rules model warm and serves batched extraction over a Unix
+socket (or local TCP), so `nlp_extract` runs don't pay the spaCy import
+and model load each time. The model is built from
+`job_ruler_patterns.jsonl` and rebuilt when the file changes. Without
+the worker, `nlp_extract` loads the saved model (`models/rules_es`,
+written by `es_ruler_builder`) instead, and refuses to run if it was
+built from other patterns (`ruleset.check_built`): after editing the
+patterns, rebuild it.
+
+Protocol: one JSON object per line.
+    request:  {"texts": ["...", ...]}
+    response: {"spans": [[[entity_text, label, start, end], ...], ...],
+               "ruleset": fingerprint}
+              or {"error": "..."}
+    request:  {"op": "info"}
+    response: {"ruleset": fingerprint, "patterns": [...]}
+'''
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+from jobnlp.nlp.ruleset import fingerprint
+from jobnlp.records import SilverRecord
+from jobnlp.utils.logger import Logger, get_logger, setup_logging
+from jobnlp.utils.profiling import add_profile_arg, profiling
+from jobnlp.utils.read_labels import PATT_PATH
+
+log = get_logger(__name__)
+
+# "/path/to.sock" or "host:port"
+SERVICE_ADDR = os.getenv("JOBNLP_NLP_SERVICE", "/tmp/jobnlp_nlp.sock")
+LOG_PATH = Path("log/nlp_server.log")
+REQUEST_SIZE = 1000
+RELOAD_CHECK_SECS = 2.0
+
+
+def parse_addr(addr: str) -> str | tuple[str, int]:
+    if ":" in addr and not addr.startswith("/"):
+        host, port = addr.rsplit(":", 1)
+        return host, int(port)
+    return addr
+
+
+class RuleModel:
+    '''
+    Rules model built from the patterns file, rebuilt when the file
+    changes. If a rebuild fails (e.g. file being edited), the previous
+    model keeps serving.
+    '''
+    def __init__(self, log: Logger, patt_path: Path = PATT_PATH,
+                 batch_size: int = 256):
+        self.log = log
+        self.patt_path = patt_path
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.mtime = 0.0
+        self.checked = 0.0
+        self.nlp = None
+        self.patterns: list[dict] = []
+        self.ruleset: str | None = None
+        self.reload(force=True)
+
+    def _build(self):
+        from jobnlp.nlp.nlp_custom import NLPRules
+        from jobnlp.nlp.nlp_models import SpacyModel
+
+        nlp = SpacyModel(log=self.log).get_blank_mod()
+        nlp_rul = NLPRules(self.log, nlp)
+        nlp_rul.load_patterns(self.patt_path)
+        return nlp
+
+    def reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self.checked < RELOAD_CHECK_SECS:
+            return
+        self.checked = now
+        mtime = self.patt_path.stat().st_mtime
+        if not force and mtime == self.mtime:
+            return
+        try:
+            nlp = self._build()
+        except Exception as e:
+            if self.nlp is None:
+                raise
+            self.log.error(f"Rules reload failed, keeping previous "
+                           f"model. {type(e).__name__}: {e}")
+            return
+        patterns = nlp.get_pipe("entity_ruler").patterns
+        with self.lock:
+            self.nlp, self.mtime = nlp, mtime
+            self.patterns, self.ruleset = patterns, fingerprint(patterns)
+        self.log.info(f"Rules {self.ruleset} loaded from: {self.patt_path}")
+
+    def info(self) -> dict:
+        self.reload()
+        with self.lock:
+            return {"ruleset": self.ruleset, "patterns": self.patterns}
+
+    def extract(self, texts: list[str]) -> dict:
+        self.reload()
+        with self.lock:
+            nlp, ruleset = self.nlp, self.ruleset
+        spans = [[(e.text, e.label_, e.start_char, e.end_char)
+                  for e in doc.ents]
+                 for doc in nlp.pipe(texts, batch_size=self.batch_size)]
+        return {"spans": spans, "ruleset": ruleset}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        model: RuleModel = self.server.model
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+                if req.get("op") == "info":
+                    resp = model.info()
+                else:
+                    resp = model.extract(req["texts"])
+            except Exception as e:
+                model.log.error(f"Bad request. {type(e).__name__}: {e}")
+                resp = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(resp, ensure_ascii=False)
+                             .encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(addr: str, model: RuleModel):
+    target = parse_addr(addr)
+    if isinstance(target, tuple):
+        server = _TCPServer(target, _Handler)
+    else:
+        Path(target).unlink(missing_ok=True)
+        server = _UnixServer(target, _Handler)
+    server.model = model
+    model.log.info(f"NLP worker listening on {addr}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if not isinstance(target, tuple):
+            Path(target).unlink(missing_ok=True)
+
+
+class NLPWorkerClient:
+    '''
+    Client of the NLP worker. `extract` has the same signature and
+    output as `nlp_extract.extract_ents`.
+    '''
+    def __init__(self, addr: str = SERVICE_ADDR, timeout: float = 300.0,
+                 request_size: int = REQUEST_SIZE):
+        self.addr = addr
+        self.request_size = request_size
+        target = parse_addr(addr)
+        if isinstance(target, tuple):
+            self.sock = socket.create_connection(target, timeout=timeout)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(target)
+        self.rfile = self.sock.makefile("rb")
+        try:
+            info = self._request({"op": "info"})
+            self.ruleset: str = info["ruleset"]
+            self.patterns: list[dict] = info["patterns"]
+        except BaseException:
+            self.close()
+            raise
+
+    @classmethod
+    def connect(cls, addr: str = SERVICE_ADDR) -> "NLPWorkerClient | None":
+        '''
+        Returns a client, or None if the worker is not running or its 
+        info reply is an error or malformed (the caller then loads the 
+        model in-process).
+        '''
+        target = parse_addr(addr)
+        if isinstance(target, str) and not Path(target).exists():
+            return None
+        try:
+            return cls(addr)
+        except (OSError, ValueError, RuntimeError, KeyError, TypeError) as e:
+            log.warning(f"NLP worker at {addr} unusable "
+                        f"({type(e).__name__}: {e}).")
+            return None
+
+    def _request(self, req: dict) -> dict:
+        payload = json.dumps(req, ensure_ascii=False)
+        self.sock.sendall(payload.encode("utf-8") + b"\n")
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError(f"NLP worker at {self.addr} closed "
+                                  "the connection.")
+        resp = json.loads(line)
+        if "error" in resp:
+            raise RuntimeError(f"NLP worker error: {resp['error']}")
+        return resp
+
+    def find(self, texts: list[str]) -> list[list[tuple]]:
+        resp = self._request({"texts": texts})
+        if resp["ruleset"] != self.ruleset:
+            # NOTE: rows keep the fingerprint read at connection time,
+            # so a later `nlp_extract --reextract` redoes them.
+            log.warning(f"Rules changed on the NLP worker during the run "
+                        f"({self.ruleset} -> {resp['ruleset']}).")
+        return resp["spans"]
+
+    def extract(self, data: list[tuple]) -> Iterator[SilverRecord]:
+        for i in range(0, len(data), self.request_size):
+            chunk = data[i:i + self.request_size]
+            spans = self.find([row[1] for row in chunk])
+            for (scrap_date, _, hash_), ents in zip(chunk, spans):
+                for ent_text, label, start, end in ents:
+                    yield SilverRecord(
+                        scrap_date=scrap_date,
+                        entity_text=ent_text,
+                        label=label,
+                        start_pos=start,
+                        end_pos=end,
+                        hash=hash_
+                    )
+
+    __call__ = extract
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    parser = argparse.ArgumentParser(description="Warm NLP rules worker.")
+    parser.add_argument("--addr", default=SERVICE_ADDR,
+                        help="Unix socket path or host:port "
+                             "(default: $JOBNLP_NLP_SERVICE)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = add_profile_arg(parser).parse_args()
+
+    setup_logging(logfile=LOG_PATH)
+    # NOTE: reports are written when the server is stopped (Ctrl-C).
+    with profiling("nlp_server", args.profile):
+        serve(args.addr, RuleModel(log, batch_size=args.batch_size))
+
+if __name__ == "__main__":
+
+    main()
@@ -1,11 +1,30 @@
-from . import fetch_raw
-from . import clean_text
-from . import nlp_extract
-from . import entity_count
+'''
+Pipeline stages. Submodules are imported on first attribute access
+(`jobnlp.pipeline.clean_text`), so importing the package (e.g. from the
+Airflow DAG) does not load every stage and its dependencies.
+'''
+import importlib
 
 __all__ = [
     "fetch_raw",
     "clean_text",
     "nlp_extract",
+    "nlp_worker",
     "entity_count",
-]
\ No newline at end of file
+    "entity_cooc",
+    "entity_distinct",
+    "entity_trends",
+    "export_layer",
+    "retention",
+    "run",
+    "backfill",
+    "sharded",
+]
+
+def __getattr__(name: str):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted([*globals(), *__all__])
@@ -0,0 +1,248 @@
+'''
+Parallel date-range backfill (`jobnlp backfill --since --to`).
+
+Dates are spread over a pool of worker processes. Each worker loads the
+rules model and opens its database connection once, then runs the
+stages of every date it receives in dependency order:
+
+    clean (raw archive -> bronze) -> nlp (bronze -> silver) -> gold
+
+A stage only runs if the previous one did not fail. `clean` is skipped
+(not failed) when the date has no raw archive, so dates already in
+bronze can be reprocessed. Scraping is not part of a backfill: past
+pages can not be fetched again.
+'''
+import argparse
+import json
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from jobnlp.db.backends import get_backend
+from jobnlp.pipeline import entity_count
+from jobnlp.pipeline.clean_text import clean_stage, load_to_bronze, raw_file
+from jobnlp.pipeline.fetch_raw import list_sites
+from jobnlp.pipeline.nlp_extract import (ENGINES, NLP_BATCH_SIZE,
+                                         NLP_ENGINE, extract_date,
+                                         load_extractor)
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.logger import Logger, get_logger, setup_logging
+from jobnlp.utils.metrics import StageMetrics
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+LOG_PATH = pathlib.Path("log/backfill.log")
+STAGES = ("clean", "nlp", "gold")
+N_WORKERS = 4
+
+
+class _Worker:
+    '''
+    Per-process state: warm extractor and open connection, reused for
+    every date of the process. Has the `log`/`backend` attributes the
+    stage functions expect from `PipeInit`.
+    '''
+    def __init__(self, engine: str, batch_size: int, full: bool):
+        setup_logging(logfile=LOG_PATH)
+        self.log: Logger = get_logger(__name__)
+        self.backend = get_backend(log=self.log)
+        self.conn = self.backend.conn
+        self.extract = None
+        self.engine = engine
+        self.batch_size = batch_size
+        self.full = full
+
+    def extractor(self):
+        # NOTE: loaded on first use, workers running only `clean` or
+        # `gold` never load the model.
+        if self.extract is None:
+            self.extract = load_extractor(self.log, self.engine,
+                                          batch_size=self.batch_size,
+                                          n_process=1)
+            self.backend.save_ruleset(self.extract.ruleset,
+                                      self.extract.patterns)
+        return self.extract
+
+_worker: _Worker | None = None
+
+def _init_worker(engine: str, batch_size: int, full: bool):
+    global _worker
+    _worker = _Worker(engine, batch_size, full)
+
+
+def stage_clean(w: _Worker, day: date) -> tuple[int, int] | None:
+    counts = None
+    for site in list_sites():
+        raw_path = raw_file(day, site)
+        if not raw_path.exists():
+            continue
+        read, inserted = load_to_bronze(w.backend, raw_path, day, w.log,
+                                        full=w.full, stage=clean_stage(site))
+        counts = (read + (counts or (0, 0))[0],
+                  inserted + (counts or (0, 0))[1])
+    return counts
+
+def stage_nlp(w: _Worker, day: date) -> tuple[int, int]:
+    return extract_date(w, w.extractor(), day, full=w.full)
+
+def stage_gold(w: _Worker, day: date) -> tuple[int, int]:
+    count = entity_count.tasks(w, day)
+    return count, count
+
+STAGE_FUNCS = {"clean": stage_clean, "nlp": stage_nlp, "gold": stage_gold}
+
+def process_date(day: date, stages: tuple[str, ...]) -> dict:
+    '''
+    Run `stages` for one date in the current worker. Never raises:
+    failures are reported in the result.
+
+    Result: `{"date", "status", "secs", "error", "stages": {stage:
+    {"status", "in", "out", "secs"}}}`, status in ok/skipped/failed.
+    '''
+    result = {"date": day.isoformat(), "status": "ok", "error": None,
+              "stages": {}}
+    start = time.perf_counter()
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        stage_start = time.perf_counter()
+        try:
+            counts = STAGE_FUNCS[stage](_worker, day)
+        except Exception as e:
+            _worker.log.error(f"{day} {stage} failed. "
+                              f"{type(e).__name__}: {e}")
+            result["stages"][stage] = {"status": "failed"}
+            result["status"] = "failed"
+            result["error"] = f"{stage}: {type(e).__name__}: {e}"
+            break
+        secs = time.perf_counter() - stage_start
+        if counts is None:
+            result["stages"][stage] = {"status": "skipped"}
+            continue
+        result["stages"][stage] = {"status": "ok", "in": counts[0],
+                                   "out": counts[1], "secs": secs}
+    result["secs"] = time.perf_counter() - start
+    return result
+
+def format_result(res: dict) -> str:
+    parts = [f"{res['date']} {res['status']:<7} {res['secs']:7.1f}s"]
+    for stage, st in res["stages"].items():
+        if st["status"] != "ok":
+            parts.append(f"{stage}: {st['status']}")
+            continue
+        rate = st["in"] / st["secs"] if st["secs"] > 0 else 0.0
+        parts.append(f"{stage}: {st['in']} -> {st['out']} "
+                     f"({rate:.0f} rec/s)")
+    if res["error"]:
+        parts.append(res["error"])
+    return " | ".join(parts)
+
+def date_range(since: date, to: date) -> list[date]:
+    return [since + timedelta(days=i) for i in range((to - since).days + 1)]
+
+def backfill(log: Logger, since: date, to: date,
+             stages: tuple[str, ...] = STAGES, workers: int = N_WORKERS,
+             engine: str = NLP_ENGINE,
+             batch_size: int = NLP_BATCH_SIZE,
+             full: bool = False) -> list[dict]:
+    '''
+    Process every date in [since, to] and return the per-date results,
+    sorted by date. Stages resume from their checkpoints (only new raw
+    records / bronze ads are processed) unless `full`.
+    '''
+    dates = date_range(since, to)
+    if not dates:
+        log.warning(f"Empty date range: {since} -> {to}")
+        return []
+
+    # NOTE: schema is created once, before the workers connect.
+    backend = get_backend(log=log)
+    backend.init_schema()
+    backend.close()
+
+    workers = max(1, min(workers, len(dates)))
+    log.info(f"Backfill {since} -> {to}: {len(dates)} dates, "
+             f"stages: {', '.join(stages)}, {workers} workers")
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=_init_worker,
+                             initargs=(engine, batch_size, full)) as pool:
+        futures = {pool.submit(process_date, day, stages): day
+                   for day in dates}
+        for fut in as_completed(futures):
+            day = futures[fut]
+            try:
+                res = fut.result()
+            except Exception as e:
+                # e.g. a worker process died
+                res = {"date": day.isoformat(), "status": "failed",
+                       "secs": 0.0, "stages": {},
+                       "error": f"{type(e).__name__}: {e}"}
+            results.append(res)
+            log_fn = log.error if res["status"] == "failed" else log.info
+            log_fn(f"[{len(results)}/{len(dates)}] {format_result(res)}")
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda r: r["date"])
+    failed = [r["date"] for r in results if r["status"] == "failed"]
+    ads = sum(r["stages"].get("nlp", {}).get("in", 0) for r in results)
+    log.info(f"Backfill done in {elapsed:.1f}s: "
+             f"{len(results) - len(failed)} ok, {len(failed)} failed, "
+             f"{ads} ads through NLP ({ads / elapsed:.0f} ads/s)")
+    if failed:
+        log.error(f"Failed dates: {', '.join(failed)}")
+    return results
+
+def add_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "backfill", help="Reprocess a date range in parallel",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=valid_date, required=True,
+                        help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="Last date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES,
+                        default=list(STAGES),
+                        help="Stages to run (always in pipeline order)")
+    parser.add_argument("--workers", type=int, default=N_WORKERS,
+                        help="Worker processes")
+    parser.add_argument("--engine", choices=ENGINES, default=NLP_ENGINE,
+                        help="Rule engine (default: $JOBNLP_NLP_ENGINE "
+                             "or 'spacy')")
+    parser.add_argument("--batch-size", type=int, default=NLP_BATCH_SIZE,
+                        help="Texts per `nlp.pipe` batch")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the stage checkpoints")
+    parser.add_argument("--report", type=pathlib.Path, default=None,
+                        help="Write the per-date results as JSON")
+    add_profile_arg(parser)
+    parser.set_defaults(func=main)
+    return parser
+
+def main(args: argparse.Namespace):
+    setup_logging(logfile=LOG_PATH)
+    log = get_logger(__name__)
+    # NOTE: workers have their own connections and are not profiled; 
+    # their DB round trips and inserted rows are not counted here, see 
+    # the per-date results.
+    with (profiling("backfill", args.profile), 
+          StageMetrics("backfill", log) as metrics):
+        results = backfill(log, args.since, args.to or today(),
+                           stages=tuple(args.stages), 
+                           workers=args.workers, engine=args.engine,
+                           batch_size=args.batch_size, full=args.full)
+        metrics.add_records(
+            sum(r["stages"].get("nlp", {}).get("in", 0) for r in results),
+            sum(r["stages"].get("nlp", {}).get("out", 0) for r in results))
+        metrics.extra["dates"] = len(results)
+        metrics.extra["failed_dates"] = [r["date"] for r in results
+                                         if r["status"] == "failed"]
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        log.info(f"Report written to: {args.report}")
+    if any(r["status"] == "failed" for r in results):
+        raise SystemExit(1)
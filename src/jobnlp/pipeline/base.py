@@ -1,16 +1,20 @@
 import pathlib
 
 from jobnlp.utils import logger
-from jobnlp.db.connection import get_connection
-from jobnlp.db.schemas import db_init
+from jobnlp.utils.metrics import StageMetrics
+from jobnlp.db.backends import get_backend
 
 class PipeInit:
 
-    def __init__(self):
+    def __init__(self, stage: str = "pipeline"):
         
         LOG_PATH = pathlib.Path("log/clean_text.log")
         logger.setup_logging(logfile=LOG_PATH)
         self.log = logger.get_logger(__name__)
-        
-        self.conn = get_connection()
-        db_init(self.conn)
\ No newline at end of file
+
+        # NOTE: backend calls and inserted/skipped rows are counted
+        # by `metrics`; reports are written on `with init.metrics:` exit.
+        self.metrics = StageMetrics(stage, self.log)
+        self.backend = self.metrics.instrument(get_backend(log=self.log))
+        self.conn = self.backend.conn
+        self.backend.init_schema()
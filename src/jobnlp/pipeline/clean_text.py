@@ -1,44 +1,76 @@
-import jsonlines, gzip
+import os
 import pathlib
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import repeat
+from typing import Iterator
 import re, hashlib
-from bs4 import BeautifulSoup
 import json
 
 import jobnlp
 from jobnlp.utils import logger, date_arg
-from jobnlp.db.models import insert_bronze, BronzeQueryError
+from jobnlp.utils.profiling import add_profile_arg, profiling
+from jobnlp.db.backends import StorageBackend
+from jobnlp.db.errors import BronzeQueryError
 from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.writer import batched
+from jobnlp.records import BronzeRecord, RawRecord
+from jobnlp.scraper.archive import iter_records, read_range, split_ranges
+from jobnlp.scraper.sites.classif_ads import DEFAULT_SITE, raw_name
 
 RAW_DIR = pathlib.Path("data/raw")
 BRONZE_DIR = pathlib.Path("data/processed/bronze")
-BRONZE_DIR.mkdir(parents=True, exist_ok=True)
+# raw records per bronze insert (and per checkpoint)
+BRONZE_BATCH_SIZE = 500
+# processes cleaning byte ranges of the raw archive (1: in-process)
+CLEAN_WORKERS = int(os.getenv("JOBNLP_CLEAN_WORKERS", 1))
+RANGES_PER_WORKER = 4
+# NOTE: regexes are checked with `benchmarks/regex_worst_case.py`; 
+# records whose cleaning goes over the budget, or longer than the 
+# limit, are quarantined.
+CLEAN_BUDGET_MS = float(os.getenv("JOBNLP_CLEAN_BUDGET_MS", 500))
+CLEAN_MAX_CHARS = int(os.getenv("JOBNLP_CLEAN_MAX_CHARS", 50_000))
+QUARANTINE_DIR = pathlib.Path("data/quarantine")
+
+log = logger.get_logger(__name__)
+# records quarantined by this process
+_quarantined = 0
 PATTERNS_PATH = pathlib.Path(jobnlp.__file__).parent / "utils" / "clean_patterns.json"
 
-try:
-    with open(PATTERNS_PATH, "r", encoding="utf-8") as f:
-        PATTERNS: dict = json.load(f)
-except FileNotFoundError as e:
-    print(f"Missing {PATTERNS_PATH.name} file.")
-    raise e
+@lru_cache(maxsize=1)
+def load_clean_patterns() -> dict:
+    """
+    Patterns of `clean_patterns.json`, read on first use (not at import).
+    """
+    try:
+        with open(PATTERNS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError as e:
+        print(f"Missing {PATTERNS_PATH.name} file.")
+        raise e
 
 def remove_pattern(pattern_key: str, pattern_file: dict, text: str):
     combined = "|".join(pattern_file[pattern_key])
     return re.sub(combined, "", text, flags=re.IGNORECASE)
 
 def remove_addresses(text: str) -> str:
-    return remove_pattern("address_patterns", PATTERNS, text)
+    return remove_pattern("address_patterns", load_clean_patterns(), text)
 
 def remove_phone_numbers(text: str) -> str:
-    return remove_pattern("phone_patterns", PATTERNS, text)
+    return remove_pattern("phone_patterns", load_clean_patterns(), text)
 
 def remove_emails(text: str) -> str:
-    return remove_pattern("email_patterns", PATTERNS, text)
+    return remove_pattern("email_patterns", load_clean_patterns(), text)
 
 def remove_urls(text: str) -> str:
-    return remove_pattern("url_patterns", PATTERNS, text)
+    return remove_pattern("url_patterns", load_clean_patterns(), text)
 
 def remove_residual_phrases(text: str) -> str:
-    return remove_pattern("residual_phrases", PATTERNS, text)
+    return remove_pattern("residual_phrases", load_clean_patterns(), text)
 
 def gen_hash(text: str) -> str:
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -54,56 +86,222 @@ def normalize_text(text: str) -> str:
     return text.strip()
 
 def clean_html(raw_html: str) -> str:
+    # NOTE: imported on first use, `jobnlp.pipeline` imports stay light 
+    # (Airflow DAG parsing).
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(raw_html, "html.parser")
     return soup.get_text(separator=" ", strip=True)
 
-def process_file(file_path: pathlib.Path) -> list[dict]:
+def raw_file(run_date, site: str = DEFAULT_SITE) -> pathlib.Path:
+    """
+    Raw archive written by `fetch_raw` for a date and site.
+    """
+    return RAW_DIR / raw_name(run_date.strftime("%Y%m%d"), site)
+
+def clean_stage(site: str = DEFAULT_SITE) -> str:
+    """
+    Checkpoint key of the `clean` stage: one per raw archive.
+    """
+    return "clean" if site == DEFAULT_SITE else f"clean:{site}"
+
+class CleanTimeout(Exception):
+    """
+    Cleaning of a record went over `CLEAN_BUDGET_MS`.
+    """
+
+def _raise_timeout(signum, frame):
+    raise CleanTimeout
+
+def _can_interrupt() -> bool:
+    # NOTE: SIGALRM is only delivered to the main thread, and a timer 
+    # already armed (e.g. an Airflow task timeout) is left alone.
+    return (hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+            and signal.getitimer(signal.ITIMER_REAL)[0] == 0)
+
+@contextmanager
+def time_budget(ms: float):
+    """
+    Raise `CleanTimeout` in the block after `ms` milliseconds. The 
+    regex engine checks for signals while it backtracks through groups, 
+    but not inside a single repeated character class (`[\\w.-]+`): 
+    such a `re.sub` is only interrupted when it returns, so the 
+    remaining steps are skipped. Where the timer can't be used the 
+    block runs to the end; callers check the elapsed time.
+    """
+    if ms <= 0 or not _can_interrupt():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, ms / 1000)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-    adds_list = []
+def quarantine(obj: RawRecord | dict, reason: str, ms: float,
+               qdir: pathlib.Path | None = None) -> pathlib.Path:
+    """
+    Append a raw record that could not be cleaned to 
+    `<qdir>/clean_<scrape date>.jsonl`, with the reason and time spent.
+    """
+    qdir = qdir or QUARANTINE_DIR
+    qdir.mkdir(parents=True, exist_ok=True)
+    stamp = (obj.get("scraped_at") or "")[:10].replace("-", "")
+    path = qdir / f"clean_{stamp or 'undated'}.jsonl"
+    entry = {
+        "reason": reason,
+        "ms": round(ms, 1),
+        "quarantined_at": datetime.now(timezone.utc).isoformat(
+            timespec="seconds"),
+        "record": obj if isinstance(obj, dict) else obj.as_dict(),
+    }
+    # NOTE: one append per line, safe from concurrent clean workers
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    global _quarantined
+    _quarantined += 1
+    return path
 
-    with gzip.open(file_path, "rt", encoding="utf-8") as f:
-        reader = jsonlines.Reader(f)
-        for obj in reader:
-            
-            raw_html = obj["raw"]
-            
-            clean = clean_html(raw_html)
+def clean_record(obj: RawRecord | dict,
+                 budget_ms: float | None = None) -> BronzeRecord | None:
+    """
+    Raw scraper record (or its archived dict) -> `ads_bronze` row. 
+    None if no text is left, or if the record is longer than 
+    `CLEAN_MAX_CHARS` or cleaning took over `budget_ms` (default: 
+    `CLEAN_BUDGET_MS`, 0: no limit): the record is then logged and 
+    quarantined (see `quarantine`) instead of stalling the run.
+    """
+    if len(obj["raw"]) > CLEAN_MAX_CHARS:
+        path = quarantine(obj, "too_long", 0.0)
+        log.warning(f"Record of {len(obj['raw'])} chars (limit "
+                    f"{CLEAN_MAX_CHARS}) quarantined in {path}")
+        return None
+    budget_ms = CLEAN_BUDGET_MS if budget_ms is None else budget_ms
+    start = time.perf_counter()
+    try:
+        with time_budget(budget_ms):
+            clean = clean_html(obj["raw"])
             clean = normalize_text(clean)
+    except CleanTimeout:
+        clean = None
+    ms = (time.perf_counter() - start) * 1000
+    if budget_ms > 0 and ms > budget_ms:
+        path = quarantine(obj, "timeout" if clean is None else "slow", ms)
+        log.warning(f"Cleaning took {ms:.0f} ms (budget {budget_ms:.0f}), "
+                    f"record quarantined in {path}")
+        return None
 
-            if clean:
-               adds_list.append({
-                    "norm_text": clean,
-                    "scrap_date": obj.get("scraped_at"),
-                    "source_url": obj.get("source_url"),
-                    "hash": gen_hash(clean)
-                })
-
-        reader.close()
-    return adds_list
-
-def load_to_bronze(conn, add_list: list[dict], 
-                   log: logger.Logger, raw_path: pathlib.Path):
-    inserted_count = 0
-    for add in add_list:
-        res = insert_bronze(conn, add)
-        inserted_count += res
+    if not clean:
+        return None
+    return BronzeRecord(
+        norm_text=clean,
+        scrap_date=obj.get("scraped_at"),
+        source_url=obj.get("source_url"),
+        hash=gen_hash(clean)
+    )
+
+def iter_raw(file_path: pathlib.Path, skip: int = 0) -> Iterator[dict]:
+    """
+    Records of a raw archive, from record number `skip` on (only the 
+    blocks from there are read, see `scraper.archive`).
+    """
+    yield from iter_records(file_path, start=skip)
+
+def process_file(file_path: pathlib.Path) -> list[BronzeRecord]:
+    return [add for add in map(clean_record, iter_raw(file_path)) if add]
+
+def clean_chunk(records: list[dict]
+                ) -> tuple[int, list[BronzeRecord], int]:
+    """
+    `(raw records, bronze rows, records quarantined)` of a chunk.
+    """
+    before = _quarantined
+    adds = [add for add in map(clean_record, records) if add]
+    return len(records), adds, _quarantined - before
+
+def _clean_range(raw_path: pathlib.Path, start: int, end: int,
+                 skip: int) -> tuple[int, list[BronzeRecord], int]:
+    """
+    Worker task: clean the records in bytes `[start, end)` of the 
+    archive, after the first `skip`.
+    """
+    return clean_chunk(read_range(raw_path, start, end)[skip:])
+
+def iter_clean_chunks(raw_path: pathlib.Path, offset: int = 0,
+                      workers: int = CLEAN_WORKERS
+                      ) -> Iterator[tuple[int, list[BronzeRecord], int]]:
+    """
+    `(raw records read, bronze rows, records quarantined)` per chunk 
+    of the archive, from record `offset` on, in archive order. With 
+    `workers` > 1 the archive is split into byte ranges cleaned by a 
+    process pool.
+    """
+    if workers <= 1:
+        for chunk in batched(iter_raw(raw_path, skip=offset), 
+                             BRONZE_BATCH_SIZE):
+            yield clean_chunk(chunk)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    ranges = split_ranges(raw_path, workers * RANGES_PER_WORKER, 
+                          start=offset)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(_clean_range, repeat(raw_path),
+                            [r.start for r in ranges],
+                            [r.end for r in ranges],
+                            [max(offset - r.first, 0) for r in ranges])
+
+def load_to_bronze(backend: StorageBackend, raw_path: pathlib.Path,
+                   run_date, log: logger.Logger, full: bool = False,
+                   stage: str = "clean", 
+                   workers: int = CLEAN_WORKERS) -> tuple[int, int]:
+    """
+    Clean the records of `raw_path` above the `stage` checkpoint of 
+    `run_date` (over `workers` processes) and insert them to bronze 
+    in batches, moving the checkpoint after each chunk. `full` starts 
+    from record zero.
+
+    Returns `(raw records read, ads inserted)`.
+    """
+    offset = 0 if full else backend.get_checkpoint(stage, run_date)
+    if offset:
+        log.info(f"Resuming {raw_path.name} from record {offset}")
+
+    n_read, inserted_count, quarantined = 0, 0, 0
+    for n, adds, n_quarantined in iter_clean_chunks(raw_path, offset, 
+                                                    workers):
+        for batch in batched(adds, BRONZE_BATCH_SIZE):
+            inserted_count += len(backend.insert_bronze_many(batch, log))
+        n_read += n
+        quarantined += n_quarantined
+        backend.set_checkpoint(stage, run_date, offset + n_read)
+
+    if quarantined:
+        log.warning(f"{quarantined} records of {raw_path.name} were over "
+                    f"the cleaning time or size limit, quarantined in "
+                    f"{QUARANTINE_DIR}")
     if inserted_count < 1:
         log.warning(f"No new ads were inserted from: {raw_path.name}")
     else:
         log.info((f"{inserted_count} new ads were inserted from:"
                   f"{raw_path.name}"))
+    return n_read, inserted_count
 
 
-def tranf_load(init: PipeInit, raw_path: pathlib.Path):
+def tranf_load(init: PipeInit, raw_path: pathlib.Path, run_date,
+               full: bool = False, workers: int = CLEAN_WORKERS):
     """
     Preliminary cleaning transformations and loading to bronze layer.
     """
     if raw_path.exists():
         init.log.info(f"Processing file: {raw_path}")
-        add_list = process_file(raw_path)
         
         try: 
-            load_to_bronze(init.conn, add_list, init.log, raw_path)
+            n_read, inserted = load_to_bronze(init.backend, raw_path, 
+                                              run_date, init.log, full=full,
+                                              workers=workers)
+            init.metrics.add_records(n_read, inserted)
             init.log.info((f"Processed: {raw_path.name} -> "
                       "DB: bronze layer"))
         except Exception as e:
@@ -111,7 +309,7 @@ def tranf_load(init: PipeInit, raw_path: pathlib.Path):
                         "bronze layer"))
             raise BronzeQueryError from e
         finally:
-            init.conn.close()
+            init.backend.close()
     else:
         init.log.error(f"{raw_path} not found.")
 
@@ -120,26 +318,37 @@ def air_schedule():
     Entry point for Airflow's DAG.
     The pipeline must be fully executed by each execution date.
     """
-    init = PipeInit()
-    run_date = date_arg.today()
-    run_date_f = run_date.strftime("%Y%m%d")
-    raw_path = pathlib.Path(f"data/raw/NewsPapAds_{run_date_f}.jsonl.gz")
+    with profiling("clean_text"):
+        init = PipeInit("clean_text")
+        run_date = date_arg.today()
 
-    tranf_load(init, raw_path)
+        with init.metrics:
+            tranf_load(init, raw_file(run_date), run_date)
 
 def main():
     """
     Entry point for `console_scripts` in `setup.py`. 
     Allows you to enter the date of the file in `/raw` to be read.
+    Records already loaded (see the `clean` checkpoint) are skipped 
+    unless `--full` is given.
     """
-    init = PipeInit()
+    parser = date_arg.date_parser()
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the checkpoint, reload every record")
+    parser.add_argument("--workers", type=int, default=CLEAN_WORKERS,
+                        help="Processes cleaning ranges of the raw archive "
+                             "(default: $JOBNLP_CLEAN_WORKERS or 1)")
+    args = add_profile_arg(parser).parse_args()
+
+    with profiling("clean_text", args.profile):
+        init = PipeInit("clean_text")
 
-    # date parameter
-    run_date = date_arg.get_exec_date(init.log)
-    run_date_f = run_date.strftime("%Y%m%d")
-    raw_path = pathlib.Path(f"data/raw/NewsPapAds_{run_date_f}.jsonl.gz")
+        # date parameter
+        run_date = date_arg.get_exec_date(init.log, args=args)
 
-    tranf_load(init, raw_path)
+        with init.metrics:
+            tranf_load(init, raw_file(run_date), run_date, full=args.full,
+                       workers=args.workers)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,202 @@
+'''
+Entity co-occurrence analytics: which PUESTO, NEGOCIO and REQUIS
+entities appear in the same ads, for a date range.
+
+The silver rows of the range are loaded as a sparse binary matrix X,
+ads (`hash`) x entities (`entity_text`), and every pair statistic
+comes from one sparse product:
+
+    C = X.T @ X     C[i, j]: ads with i and j; C[i, i]: ads with i
+    lift(i, j) = C[i, j] * N / (C[i, i] * C[j, j])
+    pmi(i, j)  = log2(lift(i, j))
+
+N is the number of ads of the range with at least one entity of the
+selected labels (`--labels`), not every ad of the range: lift and PMI
+are relative to those ads. Pairs found in fewer than
+`--min-count` ads are dropped (the lift of rare pairs is noise) and
+the `--top` pairs by lift are stored in `ads_gold_cooc`, replacing
+the pairs of a previous run over the same range.
+
+    entity_cooc --since 2025-08-01 --to 2025-08-31 [--top 500]
+'''
+import argparse
+from array import array
+from datetime import date
+from typing import TYPE_CHECKING, NamedTuple
+
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.db.backends import StorageBackend
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.logger import Logger
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+# NOTE: numpy and scipy are imported when the stage runs, not by the
+# modules (e.g. the Airflow DAG) that import it.
+if TYPE_CHECKING:
+    import numpy as np
+    from scipy import sparse
+
+TOP_PAIRS = 500
+MIN_COUNT = 5
+LABELS = ("PUESTO", "NEGOCIO", "REQUIS")
+# silver rows per round trip
+READ_BATCH_SIZE = 50_000
+
+
+class AdEntityMatrix(NamedTuple):
+    x: "sparse.csr_matrix"      # ads x entities, 1 if present
+    entities: list[str]
+    labels: list[str]
+
+
+class PairStats(NamedTuple):
+    a: "np.ndarray"             # entity indexes, a < b
+    b: "np.ndarray"
+    count: "np.ndarray"         # ads with both
+    count_a: "np.ndarray"       # ads with a
+    count_b: "np.ndarray"
+    lift: "np.ndarray"
+    pmi: "np.ndarray"
+    n_ads: int
+
+
+def load_matrix(backend: StorageBackend, dates: list[date],
+                labels: tuple[str, ...] = LABELS,
+                log: Logger | None = None) -> AdEntityMatrix:
+    '''
+    Stream the silver rows of `dates` into a CSR ads x entities matrix.
+    An entity keeps the label of its first row.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    ads: dict[str, int] = {}
+    ents: dict[str, int] = {}
+    ent_labels: list[str] = []
+    # NOTE: compact C arrays, not lists of ints (one pair per row)
+    rows, cols = array("i"), array("i")
+    for batch in backend.iter_layer("ads_silver", dates,
+                                    cols=["hash", "entity_text", "label"],
+                                    batch_size=READ_BATCH_SIZE, log=log):
+        for hash_, text, label in batch:
+            if label not in labels:
+                continue
+            col = ents.get(text)
+            if col is None:
+                col = ents[text] = len(ents)
+                ent_labels.append(label)
+            rows.append(ads.setdefault(hash_, len(ads)))
+            cols.append(col)
+
+    data = np.ones(len(rows), dtype=np.int32)
+    x = sparse.csr_matrix((data, (np.frombuffer(rows, dtype=np.int32),
+                                  np.frombuffer(cols, dtype=np.int32))),
+                          shape=(len(ads), len(ents)))
+    x.data[:] = 1       # duplicates were summed
+    return AdEntityMatrix(x, list(ents), ent_labels)
+
+def cooccurrence(x: "sparse.csr_matrix", min_count: int = MIN_COUNT
+                 ) -> PairStats:
+    '''
+    Counts, lift and PMI of the entity pairs found together in at
+    least `min_count` ads. N is the number of rows of `x` (ads with an
+    entity of the loaded labels).
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    n_ads = x.shape[0]
+    c = (x.T @ x).tocsr()
+    df = c.diagonal().astype(np.float64)
+    pairs = sparse.triu(c, k=1, format="coo")
+    keep = pairs.data >= max(min_count, 1)
+    a, b = pairs.row[keep], pairs.col[keep]
+    count = pairs.data[keep]
+    lift = count * (n_ads / (df[a] * df[b]))
+    return PairStats(a, b, count, df[a].astype(np.int64),
+                     df[b].astype(np.int64), lift, np.log2(lift), n_ads)
+
+def top_pairs(m: AdEntityMatrix, stats: PairStats, since: date, to: date,
+              top: int = TOP_PAIRS) -> list[dict]:
+    '''
+    `ads_gold_cooc` rows of the `top` pairs by lift (ties: by count).
+    '''
+    import numpy as np
+    order = np.lexsort((-stats.count, -stats.lift))[:top]
+    return [{
+        "scrap_date": to,
+        "since": since,
+        "entity_a": m.entities[stats.a[i]],
+        "label_a": m.labels[stats.a[i]],
+        "entity_b": m.entities[stats.b[i]],
+        "label_b": m.labels[stats.b[i]],
+        "count": int(stats.count[i]),
+        "count_a": int(stats.count_a[i]),
+        "count_b": int(stats.count_b[i]),
+        "n_ads": stats.n_ads,
+        "lift": float(stats.lift[i]),
+        "pmi": float(stats.pmi[i]),
+    } for i in order]
+
+def tasks(init: PipeInit, since: date, to: date, top: int = TOP_PAIRS,
+          min_count: int = MIN_COUNT,
+          labels: tuple[str, ...] = LABELS) -> int:
+    dates = init.backend.layer_dates("ads_silver",
+                                     since=since.strftime("%Y-%m-%d"),
+                                     to=to.strftime("%Y-%m-%d"))
+    if not dates:
+        init.log.warning(f"No silver rows for {since}..{to}")
+        return 0
+
+    m = load_matrix(init.backend, dates, labels, log=init.log)
+    n_ads, n_ents = m.x.shape
+    init.log.info(f"Ad x entity matrix for {since}..{to}: {n_ads} ads, "
+                  f"{n_ents} entities, {m.x.nnz} entries")
+    stats = cooccurrence(m.x, min_count)
+    rows = top_pairs(m, stats, since, to, top)
+    init.metrics.add_records(m.x.nnz, len(rows))
+    init.metrics.extra.update({"ads": n_ads, "entities": n_ents,
+                               "pairs": len(stats.count)})
+    if not rows:
+        init.log.warning(f"No entity pairs in {min_count}+ ads for "
+                         f"{since}..{to}")
+        return 0
+    count = init.backend.replace_gold_cooc(rows, init.log)
+    init.log.info(f"Stored top {count} of {len(stats.count)} entity pairs "
+                  f"for {since}..{to}")
+    return count
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=valid_date, required=True,
+                        help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="Last date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--top", type=int, default=TOP_PAIRS,
+                        help="Pairs stored, by lift")
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT,
+                        help="Minimum ads with both entities")
+    parser.add_argument("--labels", nargs="+", default=list(LABELS),
+                        help="Entity labels included; only ads with one "
+                             "of them count for lift and PMI")
+    add_profile_arg(parser)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    with profiling("entity_cooc", args.profile):
+        init = PipeInit("entity_cooc")
+        with init.metrics:
+            try:
+                tasks(init, args.since, args.to or today(), top=args.top,
+                      min_count=args.min_count, labels=tuple(args.labels))
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -1,11 +1,12 @@
 import pathlib
 
 import jobnlp
-from jobnlp.db.models import (SilverQueryError,
-                              agreg_from_silver, insert_gold)
+from jobnlp.db.errors import SilverQueryError
 from jobnlp.utils import date_arg
 from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.entity_distinct import build_sketches
 from jobnlp.utils.date_arg import today
+from jobnlp.utils.profiling import add_profile_arg, profiling
 
 DIR = pathlib.Path(jobnlp.__file__).parent
 LOG_PATH = pathlib.Path("log/entity_count.log")
@@ -16,9 +17,8 @@ def tasks(init: PipeInit, run_date):
              run_date.strftime("%d/%m/%Y"))
     
     try:
-        silver_ents = agreg_from_silver(init.conn,
-                                        date_eq=run_date,
-                                        log=init.log)
+        silver_ents = init.backend.agreg_from_silver(date_eq=run_date,
+                                                     log=init.log)
     except Exception as e:
         init.log.error(("It was not possible to read and group data"
                   f"from the silver layer. For date: {run_date}"))
@@ -26,21 +26,35 @@ def tasks(init: PipeInit, run_date):
     
     count = 0
     for r in silver_ents:
-        insert_gold(init.conn, r, init.log)
+        init.backend.insert_gold(r, init.log)
         count += 1
     if count > 0:
         init.log.info("Inserted counts in gold layer for %i entities:", count)
     else:
         init.log.warning("No new entity counts were saved.")
+        return count
+
+    # NOTE: sketches of the distinct ads, merged over date ranges by 
+    # `entity_distinct` (daily `count_ads` can't be summed)
+    sketches = build_sketches(init.backend, run_date, log=init.log)
+    init.backend.replace_gold_hll(sketches, init.log)
+    return count
 
 def air_schedule():
-    init = PipeInit()
-    tasks(init, today())
+    with profiling("entity_count"):
+        init = PipeInit("entity_count")
+        with init.metrics:
+            count = tasks(init, today())
+            init.metrics.add_records(count, count)
 
 def main():
-    init = PipeInit()
-    run_date = date_arg.get_exec_date(init.log)
-    tasks(init, run_date)
+    args = add_profile_arg(date_arg.date_parser()).parse_args()
+    with profiling("entity_count", args.profile):
+        init = PipeInit("entity_count")
+        run_date = date_arg.get_exec_date(init.log, args=args)
+        with init.metrics:
+            count = tasks(init, run_date)
+            init.metrics.add_records(count, count)
 
 if __name__ == "__main__":
 
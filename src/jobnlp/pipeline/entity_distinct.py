@@ -0,0 +1,204 @@
+'''
+Distinct ads per entity over any date range, from the gold layer.
+
+`entity_count` stores, next to the daily gold counts, a HyperLogLog
+sketch of the ad hashes of every entity and date (`ads_gold_hll`,
+see `jobnlp.utils.hll`). The sketches of the days of a range are
+merged into one per entity, which estimates the distinct ads of the
+whole range (an ad scraped on several days is counted once) without
+reading silver. Estimates have a relative standard error of 1.6%
+(`low`..`high`: 2 standard errors) whatever the length of the range.
+
+    entity_distinct --since 2025-07-01 [--to 2025-08-31] [--top 20]
+        [--label PUESTO] [--entity "chofer" "repartidor"] [--union]
+
+`--union` merges all the selected sketches: ads with any of the
+entities (or any entity of `--label`). `--exact` also counts the
+distinct ads in silver, to check the estimates.
+'''
+import argparse
+from datetime import date
+from typing import NamedTuple
+
+from jobnlp.db.backends import StorageBackend
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.hll import ERROR_SIGMAS, HLL
+from jobnlp.utils.logger import Logger
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+TOP = 20
+# silver rows per round trip
+READ_BATCH_SIZE = 50_000
+
+
+class DistinctAds(NamedTuple):
+    entity_text: str | None     # None: union of the entities
+    label: str | None
+    ads: int                    # estimated distinct ads
+    low: int
+    high: int
+    days: int                   # sketches merged
+
+
+def build_sketches(backend: StorageBackend, run_date: date,
+                   log: Logger | None = None) -> list[dict]:
+    '''
+    `ads_gold_hll` rows of a date, from its silver rows. Keyed by
+    entity like `ads_gold` (an entity keeps its last label).
+    '''
+    sketches: dict[str, HLL] = {}
+    labels: dict[str, str] = {}
+    for batch in backend.iter_layer("ads_silver", [run_date],
+                                    cols=["entity_text", "label", "hash"],
+                                    batch_size=READ_BATCH_SIZE, log=log):
+        for text, label, hash_ in batch:
+            sketch = sketches.get(text)
+            if sketch is None:
+                sketch = sketches[text] = HLL()
+            sketch.add(hash_)
+            labels[text] = label
+    return [{
+        "scrap_date": run_date,
+        "entity_text": text,
+        "label": labels[text],
+        "sketch": sketch.to_bytes(),
+    } for text, sketch in sketches.items()]
+
+def merge_range(backend: StorageBackend, since: date, to: date,
+                entities: list[str] | None = None,
+                label: str | None = None
+                ) -> dict[str, tuple[str, HLL, int]]:
+    '''
+    `entity -> (label, merged sketch, days)` over [since, to].
+    '''
+    merged: dict[str, tuple[str, HLL, int]] = {}
+    for batch in backend.iter_gold_hll(since, to, entities, label):
+        for text, ent_label, blob in batch:
+            sketch = HLL.from_bytes(blob)
+            if text in merged:
+                _, acc, days = merged[text]
+                acc |= sketch
+                merged[text] = (ent_label, acc, days + 1)
+            else:
+                merged[text] = (ent_label, sketch, 1)
+    return merged
+
+def _distinct(text: str | None, label: str | None, sketch: HLL,
+              days: int) -> DistinctAds:
+    low, high = sketch.bounds(ERROR_SIGMAS)
+    return DistinctAds(text, label, round(sketch.estimate()),
+                       int(low), round(high + 0.5), days)
+
+def distinct_ads(backend: StorageBackend, since: date, to: date,
+                 entities: list[str] | None = None,
+                 label: str | None = None,
+                 union: bool = False) -> list[DistinctAds]:
+    '''
+    Estimated distinct ads of each entity (of `entities`, or of
+    `label`, or all) over [since, to], most frequent first. With
+    `union`, one row for the ads with any of them.
+    '''
+    merged = merge_range(backend, since, to, entities, label)
+    if union:
+        if not merged:
+            return []
+        total = HLL()
+        days = 0
+        for _, sketch, n in merged.values():
+            total |= sketch
+            days += n
+        return [_distinct(None, label, total, days)]
+    rows = [_distinct(text, ent_label, sketch, days)
+            for text, (ent_label, sketch, days) in merged.items()]
+    rows.sort(key=lambda r: (-r.ads, r.entity_text))
+    return rows
+
+def exact_distinct(backend: StorageBackend, since: date, to: date,
+                   entities: list[str] | None = None,
+                   label: str | None = None,
+                   log: Logger | None = None) -> dict[str | None, int]:
+    '''
+    `entity -> distinct ads` counted in silver (`None`: any of them).
+    '''
+    dates = backend.layer_dates("ads_silver",
+                                since=since.strftime("%Y-%m-%d"),
+                                to=to.strftime("%Y-%m-%d"))
+    wanted = set(entities) if entities else None
+    ads: dict[str | None, set[str]] = {None: set()}
+    for batch in backend.iter_layer("ads_silver", dates,
+                                    cols=["entity_text", "label", "hash"],
+                                    batch_size=READ_BATCH_SIZE, log=log):
+        for text, ent_label, hash_ in batch:
+            if wanted is not None and text not in wanted:
+                continue
+            if label and ent_label != label:
+                continue
+            ads.setdefault(text, set()).add(hash_)
+            ads[None].add(hash_)
+    return {text: len(hashes) for text, hashes in ads.items()}
+
+def tasks(init: PipeInit, since: date, to: date,
+          entities: list[str] | None = None, label: str | None = None,
+          top: int = TOP, union: bool = False,
+          exact: bool = False) -> list[DistinctAds]:
+    rows = distinct_ads(init.backend, since, to, entities, label, union)
+    if not rows:
+        init.log.warning(f"No gold sketches for {since}..{to}; run "
+                         "`entity_count` for those dates first")
+        return []
+    rows = rows if union else rows[:top]
+    counts = (exact_distinct(init.backend, since, to, entities, label,
+                             log=init.log) if exact else {})
+    init.metrics.add_records(len(rows), len(rows))
+
+    print(f"Distinct ads {since}..{to} (+/- {ERROR_SIGMAS:g} std. errors)")
+    print(f"{'entity':<32} {'label':<8} {'ads':>8} {'low':>8} "
+          f"{'high':>8} {'days':>5}" + (f" {'exact':>8}" if exact else ""))
+    for r in rows:
+        name = r.entity_text if r.entity_text is not None else "(union)"
+        line = (f"{name[:32]:<32} {r.label or '':<8} {r.ads:>8} "
+                f"{r.low:>8} {r.high:>8} {r.days:>5}")
+        if exact:
+            line += f" {counts.get(r.entity_text, 0):>8}"
+        print(line)
+    return rows
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--since", type=valid_date, required=True,
+                        help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="Last date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--entity", nargs="+", default=None,
+                        help="Entities to estimate (default: all)")
+    parser.add_argument("--label", default=None,
+                        help="Only entities of this label")
+    parser.add_argument("--top", type=int, default=TOP,
+                        help="Entities shown, by estimated ads")
+    parser.add_argument("--union", action="store_true",
+                        help="Ads with any of the selected entities")
+    parser.add_argument("--exact", action="store_true",
+                        help="Also count the distinct ads in silver")
+    add_profile_arg(parser)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    with profiling("entity_distinct", args.profile):
+        init = PipeInit("entity_distinct")
+        with init.metrics:
+            try:
+                tasks(init, args.since, args.to or today(),
+                      entities=args.entity, label=args.label, top=args.top,
+                      union=args.union, exact=args.exact)
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,246 @@
+'''
+Entity trends over the gold layer: rolling means, week-over-week
+growth and z-score spikes of the daily `count_ads` of every entity.
+
+The gold rows of the dates to compute plus `--history` previous days
+are loaded as a dense entities x days array (days without gold rows,
+e.g. a failed scrape, are NaN and left out of every statistic) and
+all the series are computed at once with cumulative sums:
+
+    mean_7d       mean of the 7 days ending on the date
+    mean_prev_7d  mean of the 7 days before those
+    wow_growth    mean_7d / mean_prev_7d - 1 (NULL if mean_prev_7d = 0)
+    zscore        (count_ads - mean) / std of the `--history` days
+                  before the date (std floored at 1 ad)
+    spike         zscore >= `--z` and count_ads >= `--min-ads`
+
+Rows of the entities seen in the last 14 days are stored in
+`ads_gold_trends`, replacing those of the same dates.
+
+    entity_trends [--date YYYY-MM-DD | --since YYYY-MM-DD [--to ...]]
+'''
+import argparse
+from array import array
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, NamedTuple
+
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.db.backends import StorageBackend
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.logger import Logger
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+# NOTE: numpy is imported when the stage runs, not by the modules
+# (e.g. the Airflow DAG) that import it.
+if TYPE_CHECKING:
+    import numpy as np
+
+WEEK = 7
+HISTORY_DAYS = 28
+Z_SPIKE = 3.0
+MIN_SPIKE_ADS = 5
+# baseline days with gold rows needed for a z-score
+MIN_HISTORY_DAYS = 7
+# gold rows per round trip
+READ_BATCH_SIZE = 50_000
+
+
+class GoldSeries(NamedTuple):
+    counts: "np.ndarray"        # entities x days, NaN: day without gold
+    days: list[date]
+    entities: list[str]
+    labels: list[str]
+
+
+class Trends(NamedTuple):
+    mean_7d: "np.ndarray"       # entities x days, like the series
+    mean_prev_7d: "np.ndarray"
+    wow_growth: "np.ndarray"
+    zscore: "np.ndarray"
+    spike: "np.ndarray"
+
+
+def load_series(backend: StorageBackend, since: date, to: date,
+                log: Logger | None = None) -> GoldSeries:
+    '''
+    `count_ads` of every entity of the gold layer for each day of
+    [since, to]. An entity keeps the label of its first row.
+    '''
+    import numpy as np
+
+    days = [since + timedelta(days=i)
+            for i in range((to - since).days + 1)]
+    dates = backend.layer_dates("ads_gold",
+                                since=since.strftime("%Y-%m-%d"),
+                                to=to.strftime("%Y-%m-%d"))
+    ents: dict[str, int] = {}
+    ent_labels: list[str] = []
+    rows, cols, vals = array("i"), array("i"), array("d")
+    for batch in backend.iter_layer("ads_gold", dates,
+                                    cols=["scrap_date", "entity_text",
+                                          "label", "count_ads"],
+                                    batch_size=READ_BATCH_SIZE, log=log):
+        for scrap_date, text, label, count_ads in batch:
+            row = ents.get(text)
+            if row is None:
+                row = ents[text] = len(ents)
+                ent_labels.append(label)
+            rows.append(row)
+            cols.append((scrap_date - since).days)
+            vals.append(count_ads or 0)
+
+    counts = np.zeros((len(ents), len(days)))
+    counts[np.frombuffer(rows, dtype=np.int32),
+           np.frombuffer(cols, dtype=np.int32)] = np.frombuffer(vals)
+    missing = np.ones(len(days), dtype=bool)
+    missing[[(d - since).days for d in dates]] = False
+    counts[:, missing] = np.nan
+    return GoldSeries(counts, days, list(ents), ent_labels)
+
+def _trailing_sum(a: "np.ndarray", window: int) -> "np.ndarray":
+    '''
+    Sum of the `window` columns ending on each column (fewer at the
+    start).
+    '''
+    import numpy as np
+    cs = np.cumsum(a, axis=-1)
+    out = cs.copy()
+    out[..., window:] -= cs[..., :-window]
+    return out
+
+def _shift(a: "np.ndarray", n: int) -> "np.ndarray":
+    '''
+    Columns moved `n` days later, NaN before the first.
+    '''
+    import numpy as np
+    out = np.full_like(a, np.nan)
+    out[..., n:] = a[..., :-n]
+    return out
+
+def compute_trends(counts: "np.ndarray", history: int = HISTORY_DAYS,
+                   z_spike: float = Z_SPIKE,
+                   min_ads: int = MIN_SPIKE_ADS) -> Trends:
+    '''
+    Trend statistics of every entity and day of an entities x days
+    array, see the module docstring.
+    '''
+    import numpy as np
+
+    valid = ~np.isnan(counts).any(axis=0, keepdims=True)
+    x = np.nan_to_num(counts)
+    v = valid.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_7d = _trailing_sum(x, WEEK) / _trailing_sum(v, WEEK)
+        mean_prev_7d = _shift(mean_7d, WEEK)
+        wow_growth = np.where(mean_prev_7d > 0,
+                              mean_7d / mean_prev_7d - 1, np.nan)
+
+        # baseline: the `history` days before each day
+        n = _shift(_trailing_sum(v, history), 1)
+        mean = _shift(_trailing_sum(x, history), 1) / n
+        sq_mean = _shift(_trailing_sum(x * x, history), 1) / n
+        std = np.sqrt(np.maximum(sq_mean - mean * mean, 0.0))
+        zscore = (x - mean) / np.maximum(std, 1.0)
+    zscore = np.where((n >= MIN_HISTORY_DAYS) & valid, zscore, np.nan)
+    for a in (mean_7d, mean_prev_7d, wow_growth):
+        a[:, ~valid[0]] = np.nan
+    spike = (zscore >= z_spike) & (x >= min_ads)
+    return Trends(mean_7d, mean_prev_7d, wow_growth, zscore, spike)
+
+def trend_rows(series: GoldSeries, trends: Trends,
+               since: date) -> list[dict]:
+    '''
+    `ads_gold_trends` rows of the days from `since`, for the entities
+    seen in the last two weeks of each day.
+    '''
+    import numpy as np
+
+    first = (since - series.days[0]).days
+    x = np.nan_to_num(series.counts)
+    recent = _trailing_sum(x, 2 * WEEK) > 0
+    keep = recent & ~np.isnan(series.counts)
+    keep[:, :first] = False
+
+    def opt(a, e, d):
+        value = a[e, d]
+        return None if np.isnan(value) else float(value)
+
+    return [{
+        "scrap_date": series.days[d],
+        "entity_text": series.entities[e],
+        "label": series.labels[e],
+        "count_ads": int(x[e, d]),
+        "mean_7d": opt(trends.mean_7d, e, d),
+        "mean_prev_7d": opt(trends.mean_prev_7d, e, d),
+        "wow_growth": opt(trends.wow_growth, e, d),
+        "zscore": opt(trends.zscore, e, d),
+        "spike": bool(trends.spike[e, d]),
+    } for e, d in zip(*np.nonzero(keep))]
+
+def tasks(init: PipeInit, since: date, to: date,
+          history: int = HISTORY_DAYS, z_spike: float = Z_SPIKE,
+          min_ads: int = MIN_SPIKE_ADS) -> int:
+    start = since - timedelta(days=max(history, 2 * WEEK))
+    series = load_series(init.backend, start, to, log=init.log)
+    if not series.entities:
+        init.log.warning(f"No gold rows for {start}..{to}")
+        return 0
+    init.log.info(f"Gold series {start}..{to}: {len(series.entities)} "
+                  f"entities x {len(series.days)} days")
+
+    trends = compute_trends(series.counts, history, z_spike, min_ads)
+    rows = trend_rows(series, trends, since)
+    spikes = [r for r in rows if r["spike"]]
+    init.metrics.add_records(series.counts.size, len(rows))
+    init.metrics.extra["spikes"] = len(spikes)
+    if not rows:
+        init.log.warning(f"No gold rows for {since}..{to}")
+        return 0
+    count = init.backend.replace_gold_trends(rows, init.log)
+    init.log.info(f"Stored {count} trend rows for {since}..{to}, "
+                  f"{len(spikes)} spikes")
+    for r in sorted(spikes, key=lambda r: -r["zscore"])[:10]:
+        init.log.info(f"Spike {r['scrap_date']}: {r['entity_text']} "
+                      f"({r['label']}) {r['count_ads']} ads, "
+                      f"z={r['zscore']:.1f}")
+    return count
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=valid_date, default=None,
+                        help="Date to compute (YYYY-MM-DD, default: today)")
+    parser.add_argument("--since", type=valid_date, default=None,
+                        help="First date of a range (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="Last date of a range (default: today)")
+    parser.add_argument("--history", type=int, default=HISTORY_DAYS,
+                        help="Baseline days of the z-score")
+    parser.add_argument("--z", type=float, default=Z_SPIKE,
+                        help="z-score of a spike")
+    parser.add_argument("--min-ads", type=int, default=MIN_SPIKE_ADS,
+                        help="Minimum ads of a spike")
+    add_profile_arg(parser)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    if args.since:
+        since, to = args.since, args.to or today()
+    else:
+        since = to = args.date or today()
+    with profiling("entity_trends", args.profile):
+        init = PipeInit("entity_trends")
+        with init.metrics:
+            try:
+                tasks(init, since, to, history=args.history,
+                      z_spike=args.z, min_ads=args.min_ads)
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
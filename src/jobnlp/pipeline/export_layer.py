@@ -0,0 +1,200 @@
+import argparse
+import pathlib
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from jobnlp.db.backends import StorageBackend
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.utils import logger
+from jobnlp.utils.date_arg import valid_date
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+EXPORT_DIR = pathlib.Path("data/export")
+ROW_GROUP_SIZE = 50_000
+
+# NOTE: `scrap_date` is not stored inside the files, it is the
+# hive-style partition key (`scrap_date=YYYY-MM-DD/`).
+LAYER_SCHEMAS = {
+    "ads_bronze": pa.schema([
+        ("id", pa.int32()),
+        ("source_url", pa.string()),
+        ("norm_text", pa.string()),
+        ("hash", pa.string()),
+    ]),
+    "ads_silver": pa.schema([
+        ("id", pa.int32()),
+        ("entity_text", pa.string()),
+        ("label", pa.string()),
+        ("start_pos", pa.int32()),
+        ("end_pos", pa.int32()),
+        ("hash", pa.string()),
+    ]),
+    "ads_gold": pa.schema([
+        ("id", pa.int32()),
+        ("entity_text", pa.string()),
+        ("label", pa.string()),
+        ("count", pa.int32()),
+        ("count_ads", pa.int32()),
+    ]),
+}
+
+def partition_dir(out_dir: pathlib.Path, table: str, d: date) -> pathlib.Path:
+    return out_dir / table / f"scrap_date={d.strftime('%Y-%m-%d')}"
+
+def exported_dates(out_dir: pathlib.Path, table: str) -> set[date]:
+    '''
+    Dates already present as complete partitions in `out_dir`.
+    '''
+    dates = set()
+    table_dir = out_dir / table
+    if not table_dir.is_dir():
+        return dates
+    for p in table_dir.glob("scrap_date=*/part-0.parquet"):
+        dates.add(valid_date(p.parent.name.split("=", 1)[1]))
+    return dates
+
+
+class PartitionWriter:
+    '''
+    Writes the rows of one `scrap_date` partition to Parquet,
+    buffering at most one row group in memory.
+    The file is written under a temporary name and renamed when
+    closed, so an interrupted export never leaves a partition that
+    looks complete.
+    '''
+    def __init__(self, path: pathlib.Path, schema: pa.Schema,
+                 row_group_size: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.tmp_path = path.with_suffix(".parquet.tmp")
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.buffer = [[] for _ in schema.names]
+        self.rows = 0
+        self.writer = pq.ParquetWriter(self.tmp_path, schema,
+                                       compression="zstd")
+
+    def write_row(self, row: tuple) -> None:
+        for col, value in zip(self.buffer, row):
+            col.append(value)
+        if len(self.buffer[0]) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer[0]:
+            return
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type)
+             for col, field in zip(self.buffer, self.schema)],
+            schema=self.schema)
+        self.writer.write_batch(batch, row_group_size=self.row_group_size)
+        self.rows += batch.num_rows
+        self.buffer = [[] for _ in self.schema.names]
+
+    def close(self) -> int:
+        self.flush()
+        self.writer.close()
+        self.tmp_path.replace(self.path)
+        return self.rows
+
+
+def export_layer(backend: StorageBackend, table: str, since: date, to: date,
+                 out_dir: pathlib.Path, log: logger.Logger,
+                 incremental: bool = False,
+                 row_group_size: int = ROW_GROUP_SIZE,
+                 arrow_schema: pa.Schema | None = None) -> dict[date, int]:
+    '''
+    Stream a date range of a lakehouse layer into Parquet files
+    partitioned by `scrap_date`.
+
+    ### Parameters
+    backend: storage backend of the lakehouse.
+    table: `ads_bronze`, `ads_silver` or `ads_gold`.
+    since/to: date range (inclusive).
+    out_dir: root directory of the export.
+    incremental: skip dates already exported to `out_dir`.
+    row_group_size: rows per Parquet row group (and per DB round trip).
+    arrow_schema: columns written (default: `LAYER_SCHEMAS[table]`).
+
+    Returns the number of rows written per date.
+    '''
+    if table not in LAYER_SCHEMAS:
+        raise ValueError(f"Table '{table}' can not be exported.")
+    schema = arrow_schema or LAYER_SCHEMAS[table]
+
+    dates = backend.layer_dates(table,
+                                since=since.strftime("%Y-%m-%d"),
+                                to=to.strftime("%Y-%m-%d"))
+    if incremental:
+        done = exported_dates(out_dir, table)
+        dates = [d for d in dates if d not in done]
+    if not dates:
+        log.warning(f"Nothing to export from {table} for {since}..{to}")
+        return {}
+
+    written = {}
+    current: date | None = None
+    writer: PartitionWriter | None = None
+    try:
+        for rows in backend.iter_layer(table, dates,
+                                       cols=["scrap_date", *schema.names],
+                                       batch_size=row_group_size, log=log):
+            for row in rows:
+                if row[0] != current:
+                    if writer:
+                        written[current] = writer.close()
+                    current = row[0]
+                    path = partition_dir(out_dir, table, current) / "part-0.parquet"
+                    writer = PartitionWriter(path, schema, row_group_size)
+                writer.write_row(row[1:])
+        if writer:
+            written[current] = writer.close()
+            writer = None
+    finally:
+        if writer:
+            writer.writer.close()
+            writer.tmp_path.unlink(missing_ok=True)
+
+    for d, n in written.items():
+        log.info(f"Exported {n} rows of {table} for {d} -> {out_dir}")
+    return written
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export a lakehouse layer to Parquet.")
+    parser.add_argument("--table", required=True,
+                        choices=sorted(LAYER_SCHEMAS))
+    parser.add_argument("--since", type=valid_date, required=True,
+                        help="First date (YYYY-MM-DD)")
+    parser.add_argument("--to", type=valid_date, default=date.today(),
+                        help="Last date (YYYY-MM-DD, default: today)")
+    parser.add_argument("--out", type=pathlib.Path, default=EXPORT_DIR,
+                        help=f"Output directory (default: {EXPORT_DIR})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only export dates not yet present in --out")
+    parser.add_argument("--row-group-size", type=int,
+                        default=ROW_GROUP_SIZE)
+    add_profile_arg(parser)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    with profiling("export_layer", args.profile):
+        init = PipeInit("export_layer")
+        with init.metrics:
+            try:
+                export_layer(init.backend, args.table, args.since, args.to,
+                             args.out, init.log, 
+                             incremental=args.incremental,
+                             row_group_size=args.row_group_size)
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -1,11 +1,15 @@
-import yaml, pathlib
+import argparse
+import pathlib
 
 import jobnlp
-from jobnlp.scraper.sites.classif_ads import NewsPapAds
+from jobnlp.scraper.sites.classif_ads import DEFAULT_SITE, NewsPapAds
 from jobnlp.utils import logger 
+from jobnlp.utils.metrics import StageMetrics
+from jobnlp.utils.profiling import add_profile_arg, profiling
 
 
 def load_config():
+    import yaml
     CFG_PATH = (
         pathlib.Path(jobnlp.__file__)
         .resolve()
@@ -16,13 +20,31 @@ def load_config():
 
     return cfg
 
+def list_sites(cfg: dict | None = None) -> list[str]:
+    """
+    Keys of the configured sites (`scraping_url.newsp`).
+    """
+    cfg = cfg or load_config()
+    return list(cfg["scraping_url"]["newsp"])
+
+def fetch_site(site: str = DEFAULT_SITE) -> pathlib.Path | None:
+    """
+    Scrape one site and append its records to the day's raw archive.
+    """
+    return NewsPapAds(config=load_config(), site=site).run_and_store()
+
 def main():
     LOG_PATH = pathlib.Path("log/fetch_raw.log")
+    parser = argparse.ArgumentParser(description="Scrape today's ads "
+                                     "to the raw layer.")
+    args = add_profile_arg(parser).parse_args()
     
     logger.setup_logging(logfile=LOG_PATH)
 
-    classif = NewsPapAds(config=load_config())
-    classif.run_and_store()
+    with (profiling("fetch_raw", args.profile), 
+          StageMetrics("fetch_raw", logger.get_logger(__name__))):
+        classif = NewsPapAds(config=load_config())
+        classif.run_and_store()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
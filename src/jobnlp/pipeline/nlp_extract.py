@@ -1,28 +1,54 @@
+import os
 from datetime import date
+from functools import partial
 from pathlib import Path
-from spacy.language import Language
-from typing import Iterator
+from typing import TYPE_CHECKING, Callable, Iterator
 
 import jobnlp
-from jobnlp.db.schemas import validate_db_identifiers
-from jobnlp.db.models import (fetchall_layer, insert_silver, 
-                              BronzeQueryError, SilverQueryError)
-from jobnlp.nlp.nlp_custom import NLPRules
-from jobnlp.utils.date_arg import get_exec_date, today
+from jobnlp.db.backends import StorageBackend
+from jobnlp.db.validation import validate_db_identifiers
+from jobnlp.db.errors import SilverQueryError
+from jobnlp.nlp.noise_filter import NOISE_CONFIG, NoiseConfig, NoiseFilter
+from jobnlp.nlp.ruleset import (StaleRulesError, added_rules, check_built,
+                                fingerprint, rule_tokens)
+from jobnlp.nlp.trie_matcher import TrieMatcher
+from jobnlp.nlp.worker_service import NLPWorkerClient
+from jobnlp.utils.date_arg import date_parser, get_exec_date, today, valid_date
+from jobnlp.utils.metrics import StageMetrics
+from jobnlp.utils.profiling import add_profile_arg, profiling
 from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.writer import BatchWriter
+from jobnlp.records import SilverRecord
+
+if TYPE_CHECKING:
+    from spacy.language import Language
 
 DIR = Path(jobnlp.__file__).parent
 MOD_RUL_PATH = DIR / "nlp" / "models" / "rules_es"
+TRIE_RUL_PATH = DIR / "nlp" / "models" / "rules_es_trie.json"
+# "spacy": EntityRuler model; "trie": spaCy-free compiled rules
+ENGINES = ("spacy", "trie")
+NLP_ENGINE = os.getenv("JOBNLP_NLP_ENGINE", "spacy")
+SILVER_BATCH_SIZE = 500
+SILVER_MAX_PENDING = 8
+# bronze ads re-extracted per round (delete, extract, tag)
+REEXTRACT_CHUNK = 5000
+# bronze ads per checkpoint of the `nlp` stage
+NLP_CHUNK = 5000
+# NOTE: tune with `benchmarks/bench_extract_ents.py`.
+NLP_BATCH_SIZE = int(os.getenv("JOBNLP_NLP_BATCH_SIZE", 256))
+NLP_N_PROCESS = int(os.getenv("JOBNLP_NLP_N_PROCESS", 1))
+# Only the rules are needed; any other component is disabled.
+RULER_PIPES = ("entity_ruler",)
 
-def load_bronze_adds(conn, date: date, log,
+def load_bronze_adds(backend: StorageBackend, date: date, log,
             table="ads_bronze", schema="ads_lakehouse"):
 
     validate_db_identifiers(schema, table)
     date_f = date.strftime("%Y-%m-%d")
     try:
         log.info(f"Querying ads scraped on: {date_f}")
-        return fetchall_layer(
-            conn,
+        return backend.fetchall_layer(
             table, 
             date=date_f, schema=schema,
             cols=["scrap_date", "norm_text", "hash"],
@@ -31,71 +57,348 @@ def load_bronze_adds(conn, date: date, log,
         log.error("Error querying data from the bronze layer")
         raise
 
-def extract_ents(nlp: Language, data:list[tuple]) -> Iterator:
+
+class Extractor:
     '''
-    Iterates returning a list of dict representing 
-    the rows corresponding to each entity found per ad.
+    Loaded rules engine. Called with rows of `load_bronze_adds`, yields 
+    the entity rows for `ads_silver`, tagged with the fingerprint of 
+    the rules that produced them (see `jobnlp.nlp.ruleset`). With a 
+    `noise` config, `keep` drops non-ad fragments before the engine 
+    (see `jobnlp.nlp.noise_filter`).
     '''
-    for row in data:
+    def __init__(self, fn: Callable[[list[tuple]], Iterator[SilverRecord]],
+                 patterns: list[dict], engine: str,
+                 noise: NoiseConfig | None = NOISE_CONFIG):
+        self.fn = fn
+        self.patterns = patterns
+        self.ruleset = fingerprint(patterns)
+        self.engine = engine
+        self.noise = NoiseFilter(patterns, noise) if noise else None
+
+    def keep(self, data: list[tuple]) -> list[tuple]:
+        return self.noise(data) if self.noise else data
+
+    def __call__(self, data: list[tuple]) -> Iterator[SilverRecord]:
+        for row in self.fn(data):
+            row["ruleset"] = self.ruleset
+            yield row
 
-        ents = nlp(row[1]).ents
 
-        if not ents:
+def extract_ents(nlp: "Language", data: list[tuple],
+                 batch_size: int = NLP_BATCH_SIZE,
+                 n_process: int = NLP_N_PROCESS) -> Iterator[SilverRecord]:
+    '''
+    Iterates returning the `ads_silver` rows corresponding to each 
+    entity found per ad.
+
+    `data` rows are `(scrap_date, norm_text, hash)`. Texts go through 
+    `Language.pipe` in batches of `batch_size` (over `n_process` 
+    processes), with `(scrap_date, hash)` as context.
+    '''
+    disable = [p for p in nlp.pipe_names if p not in RULER_PIPES]
+    texts = ((row[1], (row[0], row[2])) for row in data)
+    docs = nlp.pipe(texts, as_tuples=True, batch_size=batch_size,
+                    n_process=n_process, disable=disable)
+
+    for doc, (scrap_date, hash_) in docs:
+
+        if not doc.ents:
             continue
 
-        for ent in ents:
-            yield {
-                "scrap_date": row[0],
-                "entity_text": ent.text,
-                "label": ent.label_, 
-                "start_pos": ent.start_char, 
-                "end_pos": ent.end_char,
-                "hash": row[2]
-            }
+        for ent in doc.ents:
+            yield SilverRecord(
+                scrap_date=scrap_date,
+                entity_text=ent.text,
+                label=ent.label_, 
+                start_pos=ent.start_char, 
+                end_pos=ent.end_char,
+                hash=hash_
+            )
 
-def tasks(init: PipeInit, nlp_rul: NLPRules, run_date):
+def extract_ents_trie(matcher: TrieMatcher, data: list[tuple]
+                      ) -> Iterator[SilverRecord]:
+    '''
+    Same output as `extract_ents`, using the compiled trie engine.
+    '''
+    for scrap_date, text, hash_ in data:
+        for ent_text, label, start, end in matcher.find(text):
+            yield SilverRecord(
+                scrap_date=scrap_date,
+                entity_text=ent_text,
+                label=label, 
+                start_pos=start, 
+                end_pos=end,
+                hash=hash_
+            )
 
-    try:
-        adds_brz = load_bronze_adds(init.conn, run_date,
-                                    init.log)
-    except Exception as e:
-        init.log.critical("Missing data. Aborting.")
-        raise BronzeQueryError from e
-        
-    extr_gen = extract_ents(nlp_rul.nlp, adds_brz)
+def load_extractor(log, engine: str = NLP_ENGINE,
+                   batch_size: int = NLP_BATCH_SIZE,
+                   n_process: int = NLP_N_PROCESS,
+                   noise: NoiseConfig | None = NOISE_CONFIG) -> Extractor:
+    '''
+    Load the rules with the selected engine. spaCy is only imported 
+    for the "spacy" engine, and only if the warm NLP worker 
+    (`nlp_server`) is not running or not usable. `noise` configures 
+    the pre-NLP filter (None: disabled).
+
+    The worker builds its model from the patterns file (`PATT_PATH`), 
+    the other paths load rules saved by `es_ruler_builder` 
+    (`MOD_RUL_PATH`, `TRIE_RUL_PATH`): they raise `StaleRulesError` if 
+    those were built from other patterns, so silver is not tagged 
+    with two rulesets depending on whether the worker is up.
+    '''
+    built = None
+    if engine == "trie":
+        log.info(f"Load compiled rules from: {TRIE_RUL_PATH}")
+        matcher = TrieMatcher.from_file(TRIE_RUL_PATH)
+        extract = Extractor(partial(extract_ents_trie, matcher),
+                            matcher.rules, engine, noise)
+        built = TRIE_RUL_PATH
+    elif engine == "spacy":
+        client = NLPWorkerClient.connect()
+        if client:
+            log.info(f"Using warm NLP worker at: {client.addr}")
+            extract = Extractor(client.extract, client.patterns, engine,
+                                noise)
+        else:
+            log.info("NLP worker not running, loading model in-process.")
+
+            from jobnlp.nlp.nlp_custom import NLPRules
+            nlp_rul = NLPRules(log)
+            nlp_rul.load_model(MOD_RUL_PATH)
+            extract = Extractor(
+                partial(extract_ents, nlp_rul.nlp, 
+                        batch_size=batch_size, n_process=n_process),
+                nlp_rul.nlp.get_pipe(nlp_rul.ruler_name).patterns, engine,
+                noise)
+            built = MOD_RUL_PATH
+    else:
+        raise ValueError(f"Unknown NLP engine '{engine}'. "
+                         f"Choose one of: {', '.join(ENGINES)}")
+    if built is not None:
+        try:
+            check_built(extract.ruleset, built)
+        except StaleRulesError as e:
+            log.critical(str(e))
+            raise
+    log.info(f"Rules fingerprint: {extract.ruleset}")
+    if extract.noise is None:
+        log.info("Noise filter disabled.")
+    elif extract.noise.rules is None and extract.noise.config.lexicon:
+        log.warning("Noise filter: some rule has no literal text, "
+                    "lexicon check disabled.")
+    return extract
+
+def write_silver(init: PipeInit, extract: Extractor, 
+                 adds_brz: list[tuple]) -> int:
+    '''
+    Extract entities of bronze rows into silver and tag the ads with 
+    the ruleset (also those dropped by the noise filter, counted in 
+    `extract.noise.dropped`, see `record_noise`). Returns the number 
+    of silver rows inserted.
+    '''
+    # NOTE: NLP runs here while a writer thread persists batches, 
+    # so spaCy work and DB round trips overlap.
+    writer = BatchWriter(init.backend.insert_silver_many,
+                         batch_size=SILVER_BATCH_SIZE,
+                         max_pending=SILVER_MAX_PENDING,
+                         log=init.log, name="silver-writer")
+    kept = extract.keep(adds_brz)
+    with writer:
+        for rs in extract(kept):
+            writer.put(rs)
+    init.backend.set_bronze_ruleset([row[2] for row in adds_brz],
+                                    extract.ruleset)
+    return writer.inserted
+
+def record_noise(metrics: StageMetrics, extract: Extractor) -> None:
+    '''
+    Ads dropped by the noise filter so far, by reason, as the 
+    `noise_dropped` metric of the run.
+    '''
+    if extract.noise is not None and extract.noise.dropped:
+        metrics.extra["noise_dropped"] = dict(extract.noise.dropped)
+
+def nlp_stage(hash_range: tuple[str, str | None] | None = None) -> str:
+    '''
+    Checkpoint key of the `nlp` stage, one per hash-range shard.
+    '''
+    if hash_range is None:
+        return "nlp"
+    lo, hi = hash_range
+    return f"nlp:{lo}-{hi or ''}"
+
+def extract_date(init: PipeInit, extract: Extractor, run_date,
+                 full: bool = False,
+                 hash_range: tuple[str, str | None] | None = None
+                 ) -> tuple[int, int]:
+    '''
+    Extract the bronze ads of `run_date` above the `nlp` checkpoint 
+    (last bronze id processed), `NLP_CHUNK` ads at a time, moving the 
+    checkpoint once each chunk is in silver. `full` starts over.
+    `hash_range` limits the run to a shard (see `pipeline.sharded`).
+
+    Returns `(bronze ads read, silver rows inserted)`.
+    '''
+    stage = nlp_stage(hash_range)
+    last_id = 0 if full else init.backend.get_checkpoint(stage, run_date)
+    if last_id:
+        init.log.info(f"Resuming {run_date} after bronze id {last_id}")
+
+    n_ads, inserted = 0, 0
+    while True:
+        rows = init.backend.fetch_bronze_after(run_date, last_id, 
+                                               limit=NLP_CHUNK,
+                                               hash_range=hash_range)
+        if not rows:
+            break
+        inserted += write_silver(init, extract, [row[1:] for row in rows])
+        last_id = rows[-1][0]
+        init.backend.set_checkpoint(stage, run_date, last_id)
+        n_ads += len(rows)
+    return n_ads, inserted
 
-    inserted_count = 0
+def tasks(init: PipeInit, extract: Extractor, run_date, full: bool = False):
+
+    init.log.info(f"Querying ads scraped on: {run_date}")
     try:
-        for rs in extr_gen:
-            res = insert_silver(init.conn, rs, init.log)
-            inserted_count += res
+        init.backend.save_ruleset(extract.ruleset, extract.patterns)
+        n_ads, inserted_count = extract_date(init, extract, run_date, 
+                                             full=full)
     except Exception as e:
         init.log.critical("Abort insertion to silver layer.")
         raise SilverQueryError from e
     finally:
-        init.conn.close()
-    
+        init.backend.close()
+
+    init.metrics.add_records(n_ads, inserted_count)
+    record_noise(init.metrics, extract)
+    if n_ads < 1:
+        init.log.warning("No new bronze ads since the last run")
     if inserted_count < 1:
         init.log.warning(f"No new ads were inserted to silver")
     else:
         init.log.info(f"{inserted_count} new ads were inserted to silver")
 
-def air_schedule():
-    init = PipeInit()
-    nlp_rul = NLPRules(init.log)
-    nlp_rul.load_model(MOD_RUL_PATH)
+def reextract(init: PipeInit, extract: Extractor, 
+              since: date | None = None, to: date | None = None):
+    '''
+    Bring silver up to date with the current rules, touching only the 
+    ads processed with other rulesets (None = whole history).
 
-    tasks(init, nlp_rul, today())
+    - Rules only added: just ads containing the literal tokens of a 
+      new rule are re-extracted; the rest are retagged in place.
+    - Rules changed or removed (or unknown previous version): every 
+      ad of that ruleset is re-extracted.
+
+    Ads are deleted from silver, re-extracted and tagged in chunks, 
+    so an interrupted run is resumed by running it again.
+    '''
+    backend = init.backend
+    total_ads, inserted, retagged = 0, 0, 0
+    dates: set[date] = set()
+    try:
+        backend.save_ruleset(extract.ruleset, extract.patterns)
+        stale = backend.stale_rulesets(extract.ruleset, since, to)
+        if not stale:
+            init.log.info(f"Silver is up to date with rules "
+                          f"{extract.ruleset}.")
+            return
+
+        for old in stale:
+            old_patterns = backend.get_ruleset(old)
+            added = (added_rules(old_patterns, extract.patterns)
+                     if old_patterns is not None else None)
+            contains = rule_tokens(added) if added is not None else None
+            init.log.info(
+                f"Ruleset {old} -> {extract.ruleset}: "
+                + ("full re-extraction" if contains is None else 
+                   f"{len(added)} rules added"))
+
+            # NOTE: one page of bronze in memory at a time (keyset 
+            # pagination by id, like `extract_date`).
+            last_id, n_old = 0, 0
+            while True:
+                rows = backend.fetch_bronze_by_ruleset(
+                    old, since, to, contains=contains, 
+                    after_id=last_id, limit=REEXTRACT_CHUNK)
+                if not rows:
+                    break
+                chunk = [row[1:] for row in rows]
+                backend.delete_silver([row[2] for row in chunk])
+                inserted += write_silver(init, extract, chunk)
+                dates.update(row[0] for row in chunk)
+                last_id = rows[-1][0]
+                n_old += len(rows)
+            init.log.info(f"Ruleset {old}: {n_old} ads re-extracted.")
+            total_ads += n_old
+
+            if contains is not None:
+                retagged += backend.retag_ruleset(
+                    old, extract.ruleset, since, to)
+    except Exception as e:
+        init.log.critical("Abort re-extraction to silver layer.")
+        raise SilverQueryError from e
+    finally:
+        backend.close()
+
+    init.metrics.add_records(total_ads, inserted)
+    record_noise(init.metrics, extract)
+    init.log.info(f"Re-extracted {total_ads} ads ({inserted} silver rows), "
+                  f"retagged {retagged} ads without re-extraction.")
+    if dates:
+        days = ", ".join(sorted(str(d) for d in dates))
+        init.log.info(f"Run `entity_count` again for: {days}")
+
+def air_schedule():
+    with profiling("nlp_extract"):
+        init = PipeInit("nlp_extract")
+        with init.metrics:
+            extract = load_extractor(init.log)
+            tasks(init, extract, today())
 
 def main():
-    init = PipeInit()
-    nlp_rul = NLPRules(init.log)
-    nlp_rul.load_model(MOD_RUL_PATH)
+    parser = date_parser()
+    parser.add_argument("--batch-size", type=int, default=NLP_BATCH_SIZE,
+                        help="Texts per `nlp.pipe` batch")
+    parser.add_argument("--n-process", type=int, default=NLP_N_PROCESS,
+                        help="Processes used by `nlp.pipe`")
+    parser.add_argument("--engine", choices=ENGINES, default=NLP_ENGINE,
+                        help="Rule engine (default: $JOBNLP_NLP_ENGINE "
+                             "or 'spacy')")
+    parser.add_argument("--full", action="store_true",
+                        help="Ignore the checkpoint, process every ad "
+                             "of the date")
+    parser.add_argument("--reextract", action="store_true",
+                        help="Re-extract only ads processed with other "
+                             "rules (ignores --date)")
+    parser.add_argument("--since", type=valid_date, default=None,
+                        help="With --reextract: first scrap date")
+    parser.add_argument("--to", type=valid_date, default=None,
+                        help="With --reextract: last scrap date")
+    parser.add_argument("--no-noise-filter", action="store_true",
+                        help="Send every bronze ad to the rules engine "
+                             "(see `jobnlp.nlp.noise_filter`)")
+    args = add_profile_arg(parser).parse_args()
+
+    stage = "nlp_reextract" if args.reextract else "nlp_extract"
+    with profiling(stage, args.profile):
+        init = PipeInit(stage)
+        with init.metrics:
+            extract = load_extractor(init.log, args.engine,
+                                     batch_size=args.batch_size, 
+                                     n_process=args.n_process,
+                                     noise=(None if args.no_noise_filter
+                                            else NOISE_CONFIG))
+
+            if args.reextract:
+                reextract(init, extract, args.since, args.to)
+                return
 
-    # date parameter
-    run_date = get_exec_date(init.log)
+            # date parameter
+            run_date = get_exec_date(init.log, args=args)
 
-    tasks(init, nlp_rul, run_date)
+            tasks(init, extract, run_date, full=args.full)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,268 @@
+'''
+Multi-node silver extraction through a work queue (`ads_nlp_queue`).
+
+The bronze ads of a date are queued as batches of consecutive ids.
+Any number of `nlp_worker run` processes, on any node with access to
+the database, claim one batch at a time with a lease (PostgreSQL
+`FOR UPDATE SKIP LOCKED`: concurrent claims never block each other or
+get the same batch), extract it to silver and mark it done. While a
+batch is processed a heartbeat thread extends its lease, so a worker
+that crashes or loses the network stops renewing it and, once the
+lease expires, the batch is claimed again by another worker. Silver
+inserts are conflict-safe, so a batch extracted twice writes no
+duplicates. A batch that fails (or expires) `--max-attempts` times is
+marked `failed`.
+
+    nlp_worker enqueue [--date YYYY-MM-DD | --since ... [--to ...]]
+    nlp_worker run [--exit-when-empty] [--lease 300] [--poll 10]
+    nlp_worker status [--since ...] [--to ...]
+
+Workers can be added or stopped at any time (SIGTERM/SIGINT: finish
+the current batch, then exit). With the SQLite backend claims are
+serialized by the database lock, i.e. workers of one host only.
+'''
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from jobnlp.db.backends import get_backend
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.nlp_extract import (ENGINES, NLP_ENGINE, Extractor,
+                                         load_extractor, record_noise,
+                                         write_silver)
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.logger import Logger
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+# bronze ads per queued batch
+QUEUE_BATCH_SIZE = int(os.getenv("JOBNLP_QUEUE_BATCH_SIZE", 2000))
+# seconds a claim is valid without a heartbeat
+LEASE_SECS = int(os.getenv("JOBNLP_QUEUE_LEASE", 300))
+# seconds between claims while the queue is empty
+POLL_SECS = 10
+MAX_ATTEMPTS = 3
+
+
+class QueueBatch(NamedTuple):
+    id: int
+    scrap_date: date
+    first_id: int
+    last_id: int
+    n_ads: int
+    attempts: int
+
+
+class Heartbeat(threading.Thread):
+    '''
+    Extends the lease of a batch every third of `lease_secs`, on its
+    own connection, until stopped. `lost` is set if the lease was
+    taken over (it expired before a beat).
+    '''
+    def __init__(self, batch: QueueBatch, worker: str, lease_secs: int,
+                 log: Logger):
+        super().__init__(name=f"heartbeat-{batch.id}", daemon=True)
+        self.batch = batch
+        self.worker = worker
+        self.lease_secs = lease_secs
+        self.log = log
+        self.lost = threading.Event()
+        self._stop_beats = threading.Event()
+
+    def run(self):
+        backend = get_backend(log=self.log)
+        try:
+            while not self._stop_beats.wait(self.lease_secs / 3):
+                try:
+                    held = backend.heartbeat_nlp_batch(
+                        self.batch.id, self.worker, self.lease_secs)
+                except Exception as e:
+                    # NOTE: retried on the next beat, the lease is
+                    # still valid for two more
+                    self.log.warning(f"Heartbeat of batch {self.batch.id} "
+                                     f"failed: {e}")
+                    continue
+                if not held:
+                    self.lost.set()
+                    return
+        finally:
+            backend.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop_beats.set()
+        self.join()
+        return False
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue(init: PipeInit, since: date, to: date,
+            batch_size: int = QUEUE_BATCH_SIZE) -> int:
+    '''
+    Queue the bronze ads of [since, to] not queued yet.
+    '''
+    total = 0
+    for i in range((to - since).days + 1):
+        d = since + timedelta(days=i)
+        added = init.backend.enqueue_nlp_batches(d, batch_size)
+        if added:
+            init.log.info(f"Queued {added} batches of {d}")
+        total += added
+    if not total:
+        init.log.warning(f"No new bronze ads to queue for {since}..{to}")
+    return total
+
+def process_batch(init: PipeInit, extract: Extractor, batch: QueueBatch,
+                  worker: str, lease_secs: int = LEASE_SECS,
+                  max_attempts: int = MAX_ATTEMPTS) -> tuple[int, int]:
+    '''
+    Extract a claimed batch to silver under a heartbeat and release
+    it (done, or pending again on error).
+
+    Returns `(bronze ads read, silver rows inserted)`.
+    '''
+    rows = init.backend.fetch_bronze_after(batch.scrap_date,
+                                           batch.first_id - 1,
+                                           limit=batch.n_ads)
+    rows = [row[1:] for row in rows if row[0] <= batch.last_id]
+    with Heartbeat(batch, worker, lease_secs, init.log) as beat:
+        try:
+            inserted = write_silver(init, extract, rows)
+        except Exception as e:
+            init.log.exception(f"Batch {batch.id} failed "
+                               f"(attempt {batch.attempts})")
+            init.backend.finish_nlp_batch(batch.id, worker,
+                                          error=f"{type(e).__name__}: {e}",
+                                          max_attempts=max_attempts)
+            return len(rows), 0
+    if beat.lost.is_set() or not init.backend.finish_nlp_batch(
+            batch.id, worker, max_attempts=max_attempts):
+        init.log.warning(f"Lease of batch {batch.id} expired during the "
+                         f"run; it is left to the worker that claimed it.")
+    return len(rows), inserted
+
+def run_worker(init: PipeInit, extract: Extractor, worker: str,
+               lease_secs: int = LEASE_SECS, poll_secs: float = POLL_SECS,
+               max_attempts: int = MAX_ATTEMPTS,
+               exit_when_empty: bool = False,
+               stop: threading.Event | None = None) -> int:
+    '''
+    Claim and process batches until `stop` is set or, with
+    `exit_when_empty`, until no batch is left to claim.
+    Returns the number of batches processed.
+    '''
+    stop = stop or threading.Event()
+    init.backend.save_ruleset(extract.ruleset, extract.patterns)
+    batches = 0
+    while not stop.is_set():
+        row = init.backend.claim_nlp_batch(worker, lease_secs, max_attempts)
+        if row is None:
+            if exit_when_empty:
+                break
+            stop.wait(poll_secs)
+            continue
+        batch = QueueBatch(*row)
+        init.log.info(f"Claimed batch {batch.id}: {batch.scrap_date}, "
+                      f"ids {batch.first_id}..{batch.last_id} "
+                      f"({batch.n_ads} ads, attempt {batch.attempts})")
+        start = time.perf_counter()
+        n_ads, inserted = process_batch(init, extract, batch, worker,
+                                        lease_secs, max_attempts)
+        init.metrics.add_records(n_ads, inserted)
+        batches += 1
+        init.log.info(f"Batch {batch.id}: {inserted} silver rows in "
+                      f"{time.perf_counter() - start:.1f} s")
+    init.metrics.extra["batches"] = batches
+    record_noise(init.metrics, extract)
+    return batches
+
+def print_status(init: PipeInit, since: date | None, to: date | None):
+    rows = init.backend.nlp_queue_status(since, to)
+    if not rows:
+        print("Queue is empty.")
+    for scrap_date, status, n_batches, n_ads in rows:
+        print(f"{scrap_date}  {status:<8} {n_batches:>6} batches "
+              f"{n_ads or 0:>9} ads")
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enq = commands.add_parser("enqueue", help="Queue bronze ads in batches")
+    enq.add_argument("--date", type=valid_date, default=None,
+                     help="Date to queue (YYYY-MM-DD, default: today)")
+    enq.add_argument("--since", type=valid_date, default=None,
+                     help="First date of a range (YYYY-MM-DD)")
+    enq.add_argument("--to", type=valid_date, default=None,
+                     help="Last date of a range (default: today)")
+    enq.add_argument("--batch-size", type=int, default=QUEUE_BATCH_SIZE,
+                     help="Bronze ads per batch "
+                          "(default: $JOBNLP_QUEUE_BATCH_SIZE or 2000)")
+
+    run = commands.add_parser("run", help="Claim and extract batches")
+    run.add_argument("--engine", choices=ENGINES, default=NLP_ENGINE,
+                     help="Rule engine (default: $JOBNLP_NLP_ENGINE "
+                          "or 'spacy')")
+    run.add_argument("--lease", type=int, default=LEASE_SECS,
+                     help="Lease seconds (default: $JOBNLP_QUEUE_LEASE "
+                          "or 300)")
+    run.add_argument("--poll", type=float, default=POLL_SECS,
+                     help="Seconds between claims on an empty queue")
+    run.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    run.add_argument("--exit-when-empty", action="store_true",
+                     help="Exit when no batch is left to claim")
+
+    status = commands.add_parser("status", help="Batches by date and status")
+    status.add_argument("--since", type=valid_date, default=None)
+    status.add_argument("--to", type=valid_date, default=None)
+    for command in (enq, run, status):
+        add_profile_arg(command)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    stage = f"nlp_worker_{args.command}"
+    with profiling(stage, args.profile):
+        init = PipeInit(stage)
+        with init.metrics:
+            try:
+                if args.command == "enqueue":
+                    if args.since:
+                        since, to = args.since, args.to or today()
+                    else:
+                        since = to = args.date or today()
+                    init.metrics.extra["batches"] = enqueue(
+                        init, since, to, args.batch_size)
+                elif args.command == "status":
+                    print_status(init, args.since, args.to)
+                else:
+                    stop = threading.Event()
+                    for sig in (signal.SIGTERM, signal.SIGINT):
+                        signal.signal(sig, lambda *_: stop.set())
+                    worker = worker_id()
+                    init.log.info(f"Worker {worker} started")
+                    extract = load_extractor(init.log, args.engine)
+                    run_worker(init, extract, worker, lease_secs=args.lease,
+                               poll_secs=args.poll,
+                               max_attempts=args.max_attempts,
+                               exit_when_empty=args.exit_when_empty,
+                               stop=stop)
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,340 @@
+'''
+Retention and cold-archive tiering of the lakehouse layers.
+
+Dates older than the retention of their layer leave the hot storage
+for the archive directory (`--archive-dir`, default `data/archive`):
+
+    raw         `data/raw/*.jsonl.gz` (and index) moved to `raw/`
+    ads_bronze  exported to Parquet (zstd), `scrap_date` partitions,
+    ads_silver  then deleted from the database
+    ads_gold    kept forever
+
+A partition is deleted only once its file is written, read back with
+the exported row count and recorded in the manifest (`manifest.jsonl`:
+one JSON line per partition archived or restored, with rows, size
+and sha256). `restore` loads archived partitions back into the
+database (bronze and silver rows get new ids) or moves raw files
+back; a later `archive` run archives them again.
+
+    retention archive [--dry-run] [--raw-days 90] [--bronze-days 365]
+    retention restore --layer ads_bronze --since 2024-01-01 [--to ...]
+
+Default retentions (days): `JOBNLP_RETENTION_RAW_DAYS`,
+`JOBNLP_RETENTION_BRONZE_DAYS`, `JOBNLP_RETENTION_SILVER_DAYS`.
+'''
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+from datetime import date, datetime, timedelta, timezone
+from itertools import groupby
+from typing import TYPE_CHECKING
+
+from jobnlp.db.backends import StorageBackend
+from jobnlp.db.validation import RETAINED_TABLES
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.clean_text import RAW_DIR
+from jobnlp.scraper.archive import index_path
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.logger import Logger
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+# NOTE: pyarrow (and `export_layer`, which imports it) is imported when 
+# partitions are archived or restored, not by `--dry-run`, raw-only 
+# runs or the modules that only need the dates.
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+ARCHIVE_DIR = pathlib.Path(os.getenv("JOBNLP_ARCHIVE_DIR", "data/archive"))
+MANIFEST = "manifest.jsonl"
+# layer -> days kept in hot storage
+RETENTION_DAYS = {
+    "raw": int(os.getenv("JOBNLP_RETENTION_RAW_DAYS", 90)),
+    "ads_bronze": int(os.getenv("JOBNLP_RETENTION_BRONZE_DAYS", 365)),
+    "ads_silver": int(os.getenv("JOBNLP_RETENTION_SILVER_DAYS", 730)),
+}
+LAYERS = ("raw", *RETAINED_TABLES)
+RESTORE_BATCH_SIZE = 5000
+_RAW_DATE = re.compile(r"_(\d{8})\.jsonl\.gz$")
+
+
+def archive_schema(table: str) -> "pa.Schema":
+    '''
+    Columns archived for a table: unlike `export_layer`, the archive 
+    keeps the ruleset tags.
+    '''
+    import pyarrow as pa
+    from jobnlp.pipeline.export_layer import LAYER_SCHEMAS
+    return LAYER_SCHEMAS[table].append(pa.field("ruleset", pa.string()))
+
+def cutoff(days: int, ref: date | None = None) -> date:
+    '''
+    Last date archived with a retention of `days` (the last `days`
+    days are kept).
+    '''
+    return (ref or today()) - timedelta(days=days)
+
+def sha256_file(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def write_manifest(archive_dir: pathlib.Path, entry: dict) -> None:
+    '''
+    Append an entry to the manifest, on disk before returning.
+    '''
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    entry = {**entry, "at": datetime.now(timezone.utc).isoformat(
+        timespec="seconds")}
+    with open(archive_dir / MANIFEST, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_manifest(archive_dir: pathlib.Path) -> list[dict]:
+    '''
+    Last manifest entry of each archive file (raw: one per site and
+    date), by date.
+    '''
+    entries: dict[str, dict] = {}
+    path = archive_dir / MANIFEST
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["file"]] = entry
+    return sorted(entries.values(), key=lambda e: (e["scrap_date"],
+                                                   e["file"]))
+
+def _file_entry(event: str, layer: str, d: date, path: pathlib.Path,
+                archive_dir: pathlib.Path, **extra) -> dict:
+    return {"event": event, "layer": layer, "scrap_date": d.isoformat(),
+            "file": path.relative_to(archive_dir).as_posix(),
+            "bytes": path.stat().st_size, "sha256": sha256_file(path),
+            **extra}
+
+# -- archive --
+
+def archive_table(backend: StorageBackend, table: str, to: date,
+                  archive_dir: pathlib.Path, log: Logger,
+                  dry_run: bool = False) -> dict[date, int]:
+    '''
+    Archive and delete the partitions of `table` up to `to`. Returns
+    the rows deleted per date.
+    '''
+    dates = backend.layer_dates(table, to=to.strftime("%Y-%m-%d"))
+    if not dates:
+        log.info(f"{table}: nothing older than {to}")
+        return {}
+    if dry_run:
+        log.info(f"{table}: would archive {len(dates)} dates, "
+                 f"{dates[0]}..{dates[-1]}")
+        return {}
+
+    import pyarrow.parquet as pq
+    from jobnlp.pipeline.export_layer import export_layer, partition_dir
+    written = export_layer(backend, table, dates[0], to, archive_dir, log,
+                           arrow_schema=archive_schema(table))
+    deleted = {}
+    for d, rows in written.items():
+        path = partition_dir(archive_dir, table, d) / "part-0.parquet"
+        if pq.ParquetFile(path).metadata.num_rows != rows:
+            log.error(f"{table} {d}: archive file incomplete, kept in DB")
+            continue
+        write_manifest(archive_dir, _file_entry("archived", table, d, path,
+                                                archive_dir, rows=rows))
+        try:
+            deleted[d] = backend.delete_partition(table, d, expected=rows,
+                                                  log=log)
+        except ValueError as e:
+            # NOTE: rows added since the export; next run archives again
+            log.error(f"{e} Kept in DB.")
+    log.info(f"{table}: archived {sum(deleted.values())} rows of "
+             f"{len(deleted)} dates up to {to} -> {archive_dir / table}")
+    return deleted
+
+def raw_files(raw_dir: pathlib.Path, to: date | None = None,
+              since: date | None = None
+              ) -> list[tuple[date, pathlib.Path]]:
+    '''
+    Raw archives of `raw_dir` by date (from their name), in [since, to].
+    '''
+    files = []
+    for path in sorted(raw_dir.glob("*.jsonl.gz")):
+        m = _RAW_DATE.search(path.name)
+        if not m:
+            continue
+        d = datetime.strptime(m.group(1), "%Y%m%d").date()
+        if (to is None or d <= to) and (since is None or d >= since):
+            files.append((d, path))
+    return files
+
+def _move_raw(src: pathlib.Path, dest_dir: pathlib.Path) -> pathlib.Path:
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / src.name
+    if index_path(src).exists():
+        shutil.move(index_path(src), index_path(dest))
+    shutil.move(src, dest)
+    return dest
+
+def archive_raw(raw_dir: pathlib.Path, to: date, archive_dir: pathlib.Path,
+                log: Logger, dry_run: bool = False) -> list[pathlib.Path]:
+    '''
+    Move the raw archives up to `to` into `archive_dir/raw`.
+    '''
+    files = raw_files(raw_dir, to=to)
+    if dry_run:
+        log.info(f"raw: would move {len(files)} files up to {to}")
+        return []
+    moved = []
+    for d, path in files:
+        dest = _move_raw(path, archive_dir / "raw")
+        write_manifest(archive_dir, _file_entry("archived", "raw", d, dest,
+                                                archive_dir))
+        moved.append(dest)
+    log.info(f"raw: moved {len(moved)} files up to {to} -> "
+             f"{archive_dir / 'raw'}")
+    return moved
+
+# -- restore --
+
+def _verified(entry: dict, archive_dir: pathlib.Path,
+              log: Logger) -> pathlib.Path | None:
+    path = archive_dir / entry["file"]
+    if not path.exists() or sha256_file(path) != entry["sha256"]:
+        log.error(f"{entry['layer']} {entry['scrap_date']}: archive file "
+                  f"{path} missing or modified, not restored")
+        return None
+    return path
+
+def restore_table(backend: StorageBackend, table: str, path: pathlib.Path,
+                  d: date, log: Logger) -> int:
+    '''
+    Insert the rows of an archived partition (existing rows skipped).
+    '''
+    import pyarrow.parquet as pq
+    inserted = 0
+    for batch in pq.ParquetFile(path).iter_batches(RESTORE_BATCH_SIZE):
+        adds = [{**row, "scrap_date": d} for row in batch.to_pylist()]
+        if table == "ads_bronze":
+            inserted += len(backend.insert_bronze_many(adds, log))
+            # NOTE: bronze inserts do not take the ruleset tag
+            tagged = sorted((a for a in adds if a["ruleset"]),
+                            key=lambda a: a["ruleset"])
+            for ruleset, group in groupby(tagged, key=lambda a: a["ruleset"]):
+                backend.set_bronze_ruleset([a["hash"] for a in group],
+                                           ruleset)
+        else:
+            inserted += backend.insert_silver_many(adds, log)
+    return inserted
+
+def restore(backend: StorageBackend, layer: str, since: date,
+            to: date, archive_dir: pathlib.Path, log: Logger,
+            raw_dir: pathlib.Path = RAW_DIR) -> dict[date, int]:
+    '''
+    Restore the archived partitions of `layer` in [since, to]. Returns
+    rows inserted (raw: files moved back) per date.
+    '''
+    entries = [e for e in read_manifest(archive_dir)
+               if e["layer"] == layer and e["event"] == "archived"
+               and since <= date.fromisoformat(e["scrap_date"]) <= to]
+    if not entries:
+        log.warning(f"No archived {layer} partitions for {since}..{to}")
+        return {}
+    restored = {}
+    for entry in entries:
+        d = date.fromisoformat(entry["scrap_date"])
+        path = _verified(entry, archive_dir, log)
+        if path is None:
+            continue
+        if layer == "raw":
+            dest = _move_raw(path, raw_dir)
+            restored[d] = restored.get(d, 0) + 1
+            write_manifest(archive_dir, {**entry, "event": "restored",
+                                         "restored_to": str(dest)})
+            continue
+        restored[d] = restore_table(backend, layer, path, d, log)
+        write_manifest(archive_dir, {**entry, "event": "restored",
+                                     "inserted": restored[d]})
+        log.info(f"{layer} {d}: restored {restored[d]} of "
+                 f"{entry['rows']} rows")
+    return restored
+
+# -- CLI --
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive-dir", type=pathlib.Path,
+                        default=ARCHIVE_DIR,
+                        help=f"Archive directory (default: {ARCHIVE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="Apply the retention")
+    for layer, flag in (("raw", "--raw-days"),
+                        ("ads_bronze", "--bronze-days"),
+                        ("ads_silver", "--silver-days")):
+        archive.add_argument(flag, type=int, default=RETENTION_DAYS[layer],
+                             help=f"Days of {layer} kept "
+                                  f"(default: {RETENTION_DAYS[layer]})")
+    archive.add_argument("--layers", nargs="+", choices=LAYERS,
+                         default=list(LAYERS))
+    archive.add_argument("--dry-run", action="store_true",
+                         help="Only log what would be archived")
+
+    rest = commands.add_parser("restore", help="Restore archived dates")
+    rest.add_argument("--layer", choices=LAYERS, required=True)
+    rest.add_argument("--since", type=valid_date, required=True,
+                      help="First date (YYYY-MM-DD)")
+    rest.add_argument("--to", type=valid_date, default=None,
+                      help="Last date (YYYY-MM-DD, default: --since)")
+    for command in (archive, rest):
+        add_profile_arg(command)
+    return parser.parse_args(argv)
+
+def main():
+    """
+    Entry point for `console_scripts` in `setup.py`.
+    """
+    args = parse_args()
+    stage = f"retention_{args.command}"
+    with profiling(stage, args.profile):
+        init = PipeInit(stage)
+        with init.metrics:
+            try:
+                if args.command == "archive":
+                    days = {"raw": args.raw_days,
+                            "ads_bronze": args.bronze_days,
+                            "ads_silver": args.silver_days}
+                    for layer in args.layers:
+                        to = cutoff(days[layer])
+                        if layer == "raw":
+                            moved = archive_raw(RAW_DIR, to, args.archive_dir,
+                                                init.log, args.dry_run)
+                            init.metrics.extra["raw_files"] = len(moved)
+                            continue
+                        deleted = archive_table(init.backend, layer, to,
+                                                args.archive_dir, init.log,
+                                                args.dry_run)
+                        init.metrics.add_records(sum(deleted.values()),
+                                                 sum(deleted.values()))
+                        init.metrics.extra[f"{layer}_dates"] = len(deleted)
+                else:
+                    restored = restore(init.backend, args.layer, args.since,
+                                       args.to or args.since,
+                                       args.archive_dir, init.log)
+                    init.metrics.add_records(sum(restored.values()),
+                                             sum(restored.values()))
+            finally:
+                init.backend.close()
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,219 @@
+'''
+Fused pipeline mode: scrape -> clean -> NLP -> gold for one date in a
+single process (`jobnlp run --date YYYY-MM-DD`).
+
+Records stream through the stages and are written to each layer in
+batches. The persisted outputs are the same as running `fetch_raw`,
+`clean_text`, `nlp_extract` and `entity_count` one after another
+(raw archive, bronze, silver tagged with the ruleset, gold), but the
+raw archive and bronze are never read back: the rows inserted into
+bronze go straight to NLP, and silver is written by a background
+thread while NLP runs. The staged entry points remain for debugging
+a single stage.
+'''
+import argparse
+import pathlib
+from datetime import date
+from itertools import chain
+from typing import Iterable, Iterator
+
+from jobnlp.db.backends import get_backend
+from jobnlp.db.errors import BronzeQueryError, SilverQueryError
+from jobnlp.pipeline import entity_count
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.clean_text import (BRONZE_BATCH_SIZE, clean_record,
+                                        iter_raw, raw_file)
+from jobnlp.pipeline.fetch_raw import load_config
+from jobnlp.pipeline.nlp_extract import (ENGINES, NLP_BATCH_SIZE,
+                                         NLP_ENGINE, NLP_N_PROCESS,
+                                         SILVER_BATCH_SIZE,
+                                         SILVER_MAX_PENDING, Extractor,
+                                         extract_date, load_extractor,
+                                         record_noise)
+from jobnlp.pipeline.writer import BatchWriter, batched
+from jobnlp.scraper.archive import ArchiveWriter
+from jobnlp.scraper.sites.classif_ads import NewsPapAds
+from jobnlp.utils.date_arg import today, valid_date
+from jobnlp.utils.profiling import add_profile_arg, profiling
+
+
+class RawArchive:
+    '''
+    Writes records to the raw archive while they stream by (`tee`), 
+    in indexed blocks (see `scraper.archive`). Like 
+    `NewsPapAds.run_and_store`, nothing is written if there are no 
+    records; the last partial block is written on `close`.
+    '''
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self.count = 0
+        self.closed = False
+        self._writer: ArchiveWriter | None = None
+
+    def tee(self, records: Iterable[dict]) -> Iterator[dict]:
+        for obj in records:
+            if self._writer is None:
+                self._writer = ArchiveWriter(self.path)
+            self._writer.write(obj)
+            self.count += 1
+            yield obj
+
+    def close(self) -> pathlib.Path | None:
+        self.closed = True
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        return self.path
+
+
+def iter_bronze(records: Iterable[dict], stats: dict) -> Iterator[dict]:
+    '''
+    Clean raw records into bronze rows, skipping duplicated ads.
+    '''
+    seen: set[str] = set()
+    for obj in records:
+        stats["raw"] += 1
+        add = clean_record(obj)
+        if add is None or add["hash"] in seen:
+            continue
+        seen.add(add["hash"])
+        yield add
+
+def stream(init: PipeInit, extract: Extractor,
+           records: Iterable[dict]) -> dict:
+    '''
+    Clean, load to bronze and extract to silver in one pass.
+    Returns counts per stage.
+    '''
+    stats = {"raw": 0, "bronze": 0, "silver": 0}
+    hashes: list[str] = []
+
+    # NOTE: silver is written from the writer thread, which gets its
+    # own connection; bronze batches are inserted from this thread.
+    silver_backend = init.metrics.instrument(get_backend(log=init.log))
+    writer = BatchWriter(silver_backend.insert_silver_many,
+                         batch_size=SILVER_BATCH_SIZE,
+                         max_pending=SILVER_MAX_PENDING,
+                         log=init.log, name="silver-writer")
+    try:
+        with writer:
+            for batch in batched(iter_bronze(records, stats),
+                                 BRONZE_BATCH_SIZE):
+                # only new ads, as `nlp_extract` would read them back
+                new_rows = init.backend.insert_bronze_many(batch,
+                                                           init.log)
+                hashes.extend(row[2] for row in new_rows)
+                for rs in extract(extract.keep(new_rows)):
+                    writer.put(rs)
+        init.backend.set_bronze_ruleset(hashes, extract.ruleset)
+    finally:
+        silver_backend.close()
+
+    stats["bronze"] = len(hashes)
+    stats["silver"] = writer.inserted
+    return stats
+
+def archive_close(init: PipeInit, archive: RawArchive,
+                  records: Iterator[dict]):
+    # NOTE: if a later stage failed, the rest of the scraped page is 
+    # still archived so the date can be replayed with `--from-raw`.
+    try:
+        for _ in records:
+            pass
+    except Exception:
+        pass
+    if archive.close():
+        init.log.info(f"Stored {archive.count} records in {archive.path}")
+    else:
+        init.log.warning("0 records scraped, nothing stored.")
+
+def tasks(init: PipeInit, extract: Extractor, run_date: date,
+          from_raw: bool = False):
+    '''
+    Run every stage for `run_date`. Today's ads are scraped (and
+    appended to the day's raw archive) unless `from_raw`; records 
+    already archived but not loaded (above the `clean` checkpoint) 
+    are streamed first. Other dates are replayed from their archive.
+
+    On success the `clean` and `nlp` checkpoints are moved past 
+    everything processed, so staged runs continue from there.
+    '''
+    backend = init.backend
+    raw_path = raw_file(run_date)
+    offset = backend.get_checkpoint("clean", run_date)
+    sources = []
+    if raw_path.exists():
+        sources.append(iter_raw(raw_path, skip=offset))
+        init.log.info(f"Streaming ads from: {raw_path} "
+                      f"(from record {offset})")
+    archive = None
+    if run_date == today() and not from_raw:
+        scraper = NewsPapAds(config=load_config())
+        archive = RawArchive(raw_path)
+        sources.append(archive.tee(scraper.stream()))
+        init.log.info(f"Streaming ads from: {scraper.url}")
+    elif not sources:
+        init.log.error(f"{raw_path} not found. Only today's ads can be "
+                       "scraped.")
+        raise FileNotFoundError(raw_path)
+    records = chain(*sources)
+
+    try:
+        backend.save_ruleset(extract.ruleset, extract.patterns)
+        # bronze rows loaded by a staged `clean_text` but not extracted
+        extract_date(init, extract, run_date)
+        stats = stream(init, extract, records)
+        if archive is not None:
+            archive_close(init, archive, records)
+        backend.set_checkpoint("clean", run_date, offset + stats["raw"])
+        backend.set_checkpoint("nlp", run_date, 
+                               backend.max_bronze_id(run_date))
+        stats["gold"] = entity_count.tasks(init, run_date)
+    except (BronzeQueryError, SilverQueryError):
+        init.log.critical(f"Aborting fused run for: {run_date}")
+        raise
+    finally:
+        backend.close()
+        if archive is not None and not archive.closed:
+            archive_close(init, archive, records)
+
+    init.metrics.add_records(stats["raw"], stats["silver"])
+    init.metrics.extra["stages"] = stats
+    record_noise(init.metrics, extract)
+    init.log.info(f"Run {run_date}: {stats['raw']} raw records, "
+                  f"{stats['bronze']} new ads to bronze, "
+                  f"{stats['silver']} entities to silver.")
+
+def add_parser(subparsers) -> argparse.ArgumentParser:
+    parser = subparsers.add_parser(
+        "run", help="Run every stage for a date in one process",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=valid_date, default=None,
+                        help="Execution date in format: YYYY-MM-DD "
+                             "(default: today)")
+    parser.add_argument("--from-raw", action="store_true",
+                        help="Replay today's raw archive instead of "
+                             "scraping")
+    parser.add_argument("--engine", choices=ENGINES, default=NLP_ENGINE,
+                        help="Rule engine (default: $JOBNLP_NLP_ENGINE "
+                             "or 'spacy')")
+    parser.add_argument("--batch-size", type=int, default=NLP_BATCH_SIZE,
+                        help="Texts per `nlp.pipe` batch")
+    parser.add_argument("--n-process", type=int, default=NLP_N_PROCESS,
+                        help="Processes used by `nlp.pipe`")
+    add_profile_arg(parser)
+    parser.set_defaults(func=main)
+    return parser
+
+def main(args: argparse.Namespace):
+    with profiling("run", args.profile):
+        init = PipeInit("run")
+        run_date = args.date or today()
+        init.log.info(f"Running fused pipeline for date: {run_date}")
+        with init.metrics:
+            extract = load_extractor(init.log, args.engine,
+                                     batch_size=args.batch_size,
+                                     n_process=args.n_process)
+            tasks(init, extract, run_date, from_raw=args.from_raw)
@@ -0,0 +1,132 @@
+'''
+Sharded daily run, for the Airflow DAG with dynamic task mapping:
+
+    sites -> fetch_site[site] -> clean_file[site] -> plan_shards
+          -> nlp_shard[shard] -> aggregate -> trends
+
+Sites are the keys of `scraping_url.newsp` in `scraper.yml`. Bronze
+ads of the day are split into hash ranges (the hash is a sha256 hex
+digest, so ranges of its prefix are evenly filled). Every callable
+takes and returns JSON-serializable values, passed between tasks
+through XCom; each keeps its own checkpoint (per raw archive or per
+shard), so retried tasks resume.
+'''
+import os
+import pathlib
+from datetime import date
+
+from jobnlp.pipeline import entity_count, entity_trends
+from jobnlp.pipeline.base import PipeInit
+from jobnlp.pipeline.clean_text import clean_stage, load_to_bronze
+from jobnlp.pipeline.fetch_raw import fetch_site as _fetch_site
+from jobnlp.pipeline.fetch_raw import list_sites
+from jobnlp.pipeline.nlp_extract import (extract_date, load_extractor,
+                                         record_noise)
+from jobnlp.utils.date_arg import today
+from jobnlp.utils.profiling import profiling
+
+N_SHARDS = int(os.getenv("JOBNLP_NLP_SHARDS", os.cpu_count() or 1))
+HASH_PREFIX_LEN = 8
+
+
+def _run_date(run_date: str | None) -> date:
+    return date.fromisoformat(run_date) if run_date else today()
+
+def hash_shards(n: int = N_SHARDS) -> list[dict]:
+    '''
+    `n` contiguous ranges of the hash space: `lo <= hash < hi`
+    (`hi` is None for the last one).
+    '''
+    space = 16 ** HASH_PREFIX_LEN
+    bounds = [format(i * space // n, f"0{HASH_PREFIX_LEN}x")
+              for i in range(n)]
+    return [{"shard": i, "lo": bounds[i],
+             "hi": bounds[i + 1] if i + 1 < n else None}
+            for i in range(n)]
+
+def sites() -> list[str]:
+    return list_sites()
+
+def fetch_site(site: str) -> dict:
+    out = _fetch_site(site)
+    return {"site": site, "raw_path": str(out) if out else None}
+
+def clean_file(fetched: dict, run_date: str | None = None) -> dict:
+    '''
+    Load one site's raw archive (output of `fetch_site`) to bronze.
+    '''
+    site, raw_path = fetched["site"], fetched["raw_path"]
+    result = {"site": site, "read": 0, "inserted": 0}
+    if not raw_path or not pathlib.Path(raw_path).exists():
+        return result
+    stage = f"clean_text_{site}"
+    with profiling(stage):
+        init = PipeInit(stage)
+        with init.metrics:
+            try:
+                result["read"], result["inserted"] = load_to_bronze(
+                    init.backend, pathlib.Path(raw_path),
+                    _run_date(run_date), init.log, stage=clean_stage(site))
+            finally:
+                init.backend.close()
+            init.metrics.add_records(result["read"], result["inserted"])
+    return result
+
+def plan_shards(n: int = N_SHARDS) -> list[dict]:
+    return hash_shards(n)
+
+def nlp_shard(shard: dict, run_date: str | None = None) -> dict:
+    '''
+    Extract the bronze ads of one hash range to silver.
+    '''
+    stage = f"nlp_extract_shard{shard['shard']}"
+    with profiling(stage):
+        init = PipeInit(stage)
+        with init.metrics:
+            try:
+                extract = load_extractor(init.log)
+                init.backend.save_ruleset(extract.ruleset, extract.patterns)
+                ads, silver = extract_date(
+                    init, extract, _run_date(run_date),
+                    hash_range=(shard["lo"], shard["hi"]))
+            finally:
+                init.backend.close()
+            init.metrics.add_records(ads, silver)
+            record_noise(init.metrics, extract)
+    return {"shard": shard["shard"], "ads": ads, "silver": silver}
+
+def aggregate(shard_results: list[dict], run_date: str | None = None
+              ) -> dict:
+    '''
+    Gold counts for the day, once every shard is in silver.
+    '''
+    with profiling("entity_count"):
+        init = PipeInit("entity_count")
+        with init.metrics:
+            try:
+                gold = entity_count.tasks(init, _run_date(run_date))
+            finally:
+                init.backend.close()
+            init.metrics.add_records(gold, gold)
+    totals = {"ads": sum(r["ads"] for r in shard_results),
+              "silver": sum(r["silver"] for r in shard_results),
+              "gold": gold}
+    init.log.info(f"Sharded run: {len(shard_results)} shards, "
+                  f"{totals['ads']} ads, {totals['silver']} silver rows, "
+                  f"{totals['gold']} gold rows.")
+    return totals
+
+def trends(totals: dict, run_date: str | None = None) -> dict:
+    '''
+    Trends and spikes of the day, once its gold counts are stored.
+    '''
+    run_date = _run_date(run_date)
+    with profiling("entity_trends"):
+        init = PipeInit("entity_trends")
+        with init.metrics:
+            try:
+                rows = entity_trends.tasks(init, run_date, run_date)
+            finally:
+                init.backend.close()
+    return {**totals, "trends": rows,
+            "spikes": init.metrics.extra.get("spikes", 0)}
@@ -0,0 +1,111 @@
+'''
+Bounded producer/consumer writer: CPU-bound work (NLP) runs in the
+caller's thread while a writer thread drains a bounded queue of
+batches into the storage backend.
+'''
+import queue
+import threading
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator
+
+from jobnlp.utils.logger import Logger
+
+_STOP = object()
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+class BatchWriter:
+    '''
+    Writes items in batches from a background thread.
+
+    - Backpressure: at most `max_pending` batches wait in the queue;
+      `put` blocks while it is full.
+    - Error propagation: if a write fails, the writer keeps draining
+      (discarding) the queue so the producer never blocks, and the
+      error is re-raised in the producer by the next `put` or `close`.
+    - Clean shutdown: `close` flushes the last partial batch, stops the
+      thread and waits for it. Used as a context manager, batches
+      already queued are still written if the producer fails.
+
+    ### Parameters
+    write_batch: callable that persists a list of items and returns
+        the number of rows inserted (e.g. `backend.insert_silver_many`).
+    batch_size: items per write.
+    max_pending: maximum queued batches.
+    log: logging object.
+    '''
+    def __init__(self, write_batch: Callable[[list], int],
+                 batch_size: int = 500, max_pending: int = 8,
+                 log: Logger | None = None, name: str = "batch-writer"):
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.log = log
+        self.queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self.error: BaseException | None = None
+        self.written = 0
+        self.inserted = 0
+        self.batches = 0
+        self._batch: list = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self.queue.get()
+            if batch is _STOP:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.inserted += self.write_batch(batch)
+                self.written += len(batch)
+                self.batches += 1
+            except BaseException as e:
+                self.error = e
+                if self.log:
+                    self.log.error(f"Writer thread failed: "
+                                   f"{type(e).__name__}: {e}")
+
+    def _raise_if_failed(self):
+        if self.error is not None:
+            raise self.error
+
+    def put(self, item: Any) -> None:
+        self._raise_if_failed()
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_size:
+            self.queue.put(self._batch)
+            self._batch = []
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._batch and self.error is None:
+            self.queue.put(self._batch)
+        self._batch = []
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._raise_if_failed()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return False
+        # NOTE: the producer failed; stop the writer without masking
+        # the original exception.
+        try:
+            self.close()
+        except Exception:
+            pass
+        return False
@@ -0,0 +1,122 @@
+'''
+Record types of each layer, with `__slots__` instead of a per-row
+`dict` (no key table repeated per record, see
+`benchmarks/bench_records.py`):
+
+    RawRecord      scraper output (`NewsPapAds.extract`)
+    BronzeRecord   cleaned ad (`clean_text.clean_record`)
+    SilverRecord   entity of an ad (`nlp_extract.extract_ents`)
+    GoldRecord     entity counts of a date (`agreg_from_silver`)
+
+Fields are attributes, and the records are also read and written like
+the dicts they replace (`rec["hash"]`, `rec.get("ruleset")`,
+`rec["ruleset"] = ...`, `dict(rec)`), so the `db.models` writers take
+either.
+'''
+from datetime import date
+from typing import Any, Iterator
+
+
+class Record:
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.__slots__
+
+    def keys(self) -> tuple[str, ...]:
+        return self.__slots__
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__slots__)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, obj: dict):
+        '''
+        Record of the fields of `obj` (other keys are ignored).
+        '''
+        return cls(**{k: obj[k] for k in cls.__slots__ if k in obj})
+
+    def __eq__(self, other: object) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, k) == getattr(other, k)
+                   for k in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={getattr(self, k)!r}"
+                           for k in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class RawRecord(Record):
+    __slots__ = ("raw", "type", "selector", "scraped_at", "source_url")
+
+    def __init__(self, raw: str, type: str, selector: str,
+                 scraped_at: str | None = None,
+                 source_url: str | None = None):
+        self.raw = raw
+        self.type = type
+        self.selector = selector
+        self.scraped_at = scraped_at
+        self.source_url = source_url
+
+
+class BronzeRecord(Record):
+    __slots__ = ("norm_text", "scrap_date", "source_url", "hash")
+
+    def __init__(self, norm_text: str, scrap_date: date | str | None,
+                 source_url: str | None, hash: str):
+        self.norm_text = norm_text
+        self.scrap_date = scrap_date
+        self.source_url = source_url
+        self.hash = hash
+
+
+class SilverRecord(Record):
+    __slots__ = ("scrap_date", "entity_text", "label", "start_pos",
+                 "end_pos", "hash", "ruleset")
+
+    def __init__(self, scrap_date: date, entity_text: str, label: str,
+                 start_pos: int, end_pos: int, hash: str,
+                 ruleset: str | None = None):
+        self.scrap_date = scrap_date
+        self.entity_text = entity_text
+        self.label = label
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+        self.hash = hash
+        self.ruleset = ruleset
+
+
+class GoldRecord(Record):
+    # NOTE: same order as the columns of `agreg_from_silver`
+    __slots__ = ("entity_text", "label", "count", "count_ads",
+                 "scrap_date")
+
+    def __init__(self, entity_text: str, label: str, count: int,
+                 count_ads: int, scrap_date: date):
+        self.entity_text = entity_text
+        self.label = label
+        self.count = count
+        self.count_ads = count_ads
+        self.scrap_date = scrap_date
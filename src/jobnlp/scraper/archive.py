@@ -0,0 +1,242 @@
+'''
+Seekable raw archive: `.jsonl.gz` made of independent gzip members
+(blocks of `BLOCK_RECORDS` records) and a sidecar index,
+`<archive>.idx`, with one JSON line per block:
+
+    {"offset": <byte>, "size": <bytes>, "first": <record>, "count": <n>}
+
+A multi-member gzip is still a plain `.jsonl.gz` (`gzip.open`, `zcat`
+read it whole), and archives written before the index existed are
+indexed on first read, by their gzip member boundaries (one block for
+a single-stream file). Blocks can be read on their own, so readers
+seek to a record (`iter_records`) or split the archive into byte
+ranges for parallel workers (`split_ranges`, `read_range`).
+'''
+import gzip
+import json
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from jobnlp.records import Record
+
+# records per gzip member
+BLOCK_RECORDS = 1000
+_READ_SIZE = 1 << 20
+
+
+class Block(NamedTuple):
+    offset: int
+    size: int
+    first: int
+    count: int
+
+    @property
+    def end(self) -> int:
+        return self.offset + self.size
+
+
+class ByteRange(NamedTuple):
+    '''
+    Contiguous blocks `[start, end)` holding records
+    `[first, first + count)`.
+    '''
+    start: int
+    end: int
+    first: int
+    count: int
+
+
+def index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+def scan_blocks(path: Path) -> list[Block]:
+    '''
+    Index an archive by decompressing it once, one block per gzip
+    member (archives written without an index).
+    '''
+    blocks: list[Block] = []
+    start = pos = first = lines = 0     # member start, bytes consumed
+    last = b"\n"
+    d = zlib.decompressobj(wbits=31)
+    pending = b""
+    with open(path, "rb") as f:
+        while True:
+            data = pending or f.read(_READ_SIZE)
+            if not data:
+                break
+            out = d.decompress(data)
+            if out:
+                lines += out.count(b"\n")
+                last = out[-1:]
+            if not d.eof:
+                pos += len(data)
+                pending = b""
+                continue
+            pending = d.unused_data
+            pos += len(data) - len(pending)
+            count = lines + (last != b"\n")
+            blocks.append(Block(start, pos - start, first, count))
+            start, first = pos, first + count
+            d = zlib.decompressobj(wbits=31)
+            lines, last = 0, b"\n"
+    return blocks
+
+def _write_index(path: Path, blocks: list[Block]) -> None:
+    try:
+        with open(index_path(path), "w", encoding="utf-8") as f:
+            for block in blocks:
+                f.write(json.dumps(block._asdict()) + "\n")
+    except OSError:
+        pass    # read-only directory: index kept in memory
+
+def load_index(path: Path) -> list[Block]:
+    '''
+    Blocks of an archive. The sidecar index is (re)built when missing
+    or out of date with the archive (e.g. a write interrupted between
+    the block and its index line).
+    '''
+    if not path.exists():
+        return []
+    idx = index_path(path)
+    size = path.stat().st_size
+    if idx.exists():
+        try:
+            with open(idx, "r", encoding="utf-8") as f:
+                blocks = [Block(**json.loads(line)) for line in f
+                          if line.strip()]
+        except (ValueError, TypeError):     # partially written line
+            blocks = None
+        if blocks is not None and (blocks[-1].end if blocks else 0) == size:
+            return blocks
+    blocks = scan_blocks(path)
+    _write_index(path, blocks)
+    return blocks
+
+def count_records(path: Path) -> int:
+    blocks = load_index(path)
+    return blocks[-1].first + blocks[-1].count if blocks else 0
+
+def _decode(data: bytes) -> list[dict]:
+    return [json.loads(line) for line in
+            gzip.decompress(data).decode("utf-8").splitlines() if line]
+
+def read_block(path: Path, block: Block) -> list[dict]:
+    with open(path, "rb") as f:
+        f.seek(block.offset)
+        return _decode(f.read(block.size))
+
+def iter_records(path: Path, start: int = 0,
+                 stop: int | None = None) -> Iterator[dict]:
+    '''
+    Records `[start, stop)`, reading only the blocks that hold them.
+    '''
+    with open(path, "rb") as f:
+        for block in load_index(path):
+            if block.first + block.count <= start:
+                continue
+            if stop is not None and block.first >= stop:
+                break
+            f.seek(block.offset)
+            records = _decode(f.read(block.size))
+            lo = max(start - block.first, 0)
+            hi = None if stop is None else stop - block.first
+            yield from records[lo:hi]
+
+def split_ranges(path: Path, n: int, start: int = 0) -> list[ByteRange]:
+    '''
+    Split the blocks holding records `start` onward into at most `n`
+    byte ranges of about the same number of records. The first range
+    may begin before `start` (mid-block).
+    '''
+    blocks = [b for b in load_index(path) if b.first + b.count > start]
+    if not blocks:
+        return []
+    total = blocks[-1].first + blocks[-1].count - blocks[0].first
+    per_range = -(-total // max(n, 1))
+    ranges: list[list[Block]] = [[]]
+    for block in blocks:
+        if ranges[-1] and sum(b.count for b in ranges[-1]) >= per_range:
+            ranges.append([])
+        ranges[-1].append(block)
+    return [ByteRange(r[0].offset, r[-1].end, r[0].first,
+                      sum(b.count for b in r)) for r in ranges]
+
+def read_range(path: Path, start: int, end: int) -> list[dict]:
+    '''
+    Records of the blocks in bytes `[start, end)` (block boundaries,
+    see `split_ranges`).
+    '''
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # NOTE: `gzip.decompress` reads every member of the range
+    return _decode(data)
+
+
+class ArchiveWriter:
+    '''
+    Appends records to an archive, one gzip member and index line per
+    `block_records` records. Existing archives (indexed or not) are
+    extended; record numbers continue after theirs.
+    '''
+    def __init__(self, path: Path, block_records: int = BLOCK_RECORDS):
+        self.path = path
+        self.block_records = block_records
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.blocks = load_index(path)
+        self.count = 0
+        self._next = (self.blocks[-1].first + self.blocks[-1].count
+                      if self.blocks else 0)
+        self._buffer: list[dict | Record] = []
+        self._f = open(path, "ab")
+        # NOTE: a new archive drops any index left by a deleted one
+        self._idx = open(index_path(path), "a" if self.blocks else "w",
+                         encoding="utf-8")
+
+    def write(self, obj: dict | Record) -> None:
+        self._buffer.append(obj)
+        self.count += 1
+        if len(self._buffer) >= self.block_records:
+            self.flush()
+
+    def write_all(self, records: Iterable[dict | Record]) -> int:
+        for obj in records:
+            self.write(obj)
+        return self.count
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        data = "".join(json.dumps(obj.as_dict() if isinstance(obj, Record)
+                                  else obj, ensure_ascii=False) + "\n"
+                       for obj in self._buffer)
+        member = gzip.compress(data.encode("utf-8"), mtime=0)
+        offset = self._f.tell()
+        self._f.write(member)
+        self._f.flush()
+        block = Block(offset, len(member), self._next, len(self._buffer))
+        # NOTE: index line after its block; an interrupted write is
+        # detected by `load_index` and the index rebuilt.
+        self._idx.write(json.dumps(block._asdict()) + "\n")
+        self._idx.flush()
+        self.blocks.append(block)
+        self._next += block.count
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self._f.close()
+        self._idx.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def append_records(path: Path, records: Iterable[dict | Record],
+                   block_records: int = BLOCK_RECORDS) -> int:
+    with ArchiveWriter(path, block_records) as writer:
+        return writer.write_all(records)
@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
-from bs4 import BeautifulSoup
-from .session import build_session
-import logging, requests
+from typing import TYPE_CHECKING
+import logging
+
+if TYPE_CHECKING:
+    import requests
+    from bs4 import BeautifulSoup
+
+# NOTE: requests and bs4 are imported when scraping, not with the module
+# (`clean_text` imports the raw archive naming of the sites).
 
 log = logging.getLogger(__name__)
 
@@ -9,17 +15,26 @@ class BaseScraper(ABC):
 
     url: str
     headers: dict = {}
-    session: requests.Session | None = None
+    session: "requests.Session | None" = None
     parser: str = "html.parser"
     timeout: int | float = 10
 
     def run(self):
+        return list(self.stream())
+
+    def stream(self):
+        """
+        Fetch and parse the page, then yield records as they are 
+        extracted (see `pipeline.run`).
+        """
         html = self.fetch()
-        dom: BeautifulSoup  = self.parse(html)
-        
-        return list(self.extract(dom))
+        dom: "BeautifulSoup" = self.parse(html)
+
+        yield from self.extract(dom)
 
     def fetch(self) -> str:
+        import requests
+        from .session import build_session
         s = self.session if self.session is not None else build_session()
         try:
             r = s.get(self.url, headers=self.headers, timeout=self.timeout)
@@ -31,8 +46,9 @@ class BaseScraper(ABC):
             raise
 
     def parse(self, html: str):
+        from bs4 import BeautifulSoup
         return BeautifulSoup(html, self.parser)
 
     @abstractmethod
-    def extract(self, dom: BeautifulSoup):
+    def extract(self, dom: "BeautifulSoup"):
         pass
@@ -1,28 +1,41 @@
-import jsonlines, gzip
 from pathlib import Path
 from datetime import datetime, timezone
-from bs4 import NavigableString
 
+from jobnlp.records import RawRecord
+from jobnlp.scraper.archive import append_records
 from jobnlp.scraper.base import BaseScraper
 from jobnlp.utils.logger import get_logger
 
 log = get_logger(__name__)
 
+# key of `scraping_url.newsp` in `scraper.yml`
+DEFAULT_SITE = "classif_ads_s1"
+
+def raw_name(ts: str, site: str = DEFAULT_SITE) -> str:
+    """
+    Raw archive file name for a `%Y%m%d` stamp and site. The default 
+    site keeps the original name.
+    """
+    if site == DEFAULT_SITE:
+        return f"NewsPapAds_{ts}.jsonl.gz"
+    return f"NewsPapAds_{site}_{ts}.jsonl.gz"
+
 class NewsPapAds(BaseScraper):
 
-    def __init__(self, config):
-        self.url: str = config["scraping_url"]["newsp"]["classif_ads_s1"]
+    def __init__(self, config, site: str = DEFAULT_SITE):
+        self.site = site
+        self.url: str = config["scraping_url"]["newsp"][site]
         self.RAW_STORAGE_DIR = Path("data/raw")
 
     @staticmethod
-    def _dump_jsonl(records: list[dict], dest: Path) -> None:
-        dest = dest.with_suffix(dest.suffix + ".gz")
-        dest.parent.mkdir(parents=True, exist_ok=True)
-        with gzip.open(dest, "wt", encoding="utf-8") as gz:
-            writer = jsonlines.Writer(gz)
-            writer.write_all(records)
+    def _dump_jsonl(records: list[RawRecord], dest: Path) -> None:
+        # NOTE: appended as new gzip members (see `scraper.archive`), so 
+        # several scrapes per day keep the record offsets of the `clean` 
+        # checkpoint valid.
+        append_records(dest, records)
 
     def extract(self, dom):
+        from bs4 import NavigableString
 
         ts = datetime.now(timezone.utc).isoformat(timespec="seconds")
 
@@ -32,25 +45,25 @@ class NewsPapAds(BaseScraper):
             log.warning("0 avisos pagos encontrados en %s", self.url)
 
         for p in paid:
-            yield {
-                "raw": str(p),
-                "type":"html",
-                "selector": "css_class=pago",
-                "scraped_at": ts,
-                "source_url": self.url,
-            }
+            yield RawRecord(
+                raw=str(p),
+                type="html",
+                selector="css_class=pago",
+                scraped_at=ts,
+                source_url=self.url,
+            )
 
         normal = dom.select_one(".avisos.normal")
         if normal:
             for nodo in normal.find_all(string=True, recursive=True):
                 if isinstance(nodo, NavigableString) and nodo.strip():
-                    yield {
-                        "raw": str(nodo),
-                        "type":"text_node",
-                        "selector": "css_class=avisos normal",
-                        "scraped_at": ts,
-                        "source_url": self.url,
-                    }
+                    yield RawRecord(
+                        raw=str(nodo),
+                        type="text_node",
+                        selector="css_class=avisos normal",
+                        scraped_at=ts,
+                        source_url=self.url,
+                    )
         else:
             log.warning("Bloque .avisos.normal no encontrado en %s", self.url)
 
@@ -58,7 +71,7 @@ class NewsPapAds(BaseScraper):
         records = list(self.run())
         if not records: log.warning("0 registros – no se graba."); return None
         ts = datetime.now().strftime("%Y%m%d")
-        out = self.RAW_STORAGE_DIR / f"NewsPapAds_{ts}.jsonl"
+        out = self.RAW_STORAGE_DIR / raw_name(ts, self.site)
         self._dump_jsonl(records, out)
         log.info("Grabados %s anuncios en %s", len(records), out)
         return out
\ No newline at end of file
@@ -10,14 +10,34 @@ class DateFormatError(Exception):
             super().__init__("Invalid date format. Expected YYYY-MM-DD.")
 
 
-def parse_date_arg() -> date:
-    parser = argparse.ArgumentParser()
+def valid_date(value: str) -> date:
+    """
+    `argparse` type for YYYY-MM-DD arguments.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(
+            f"Invalid date '{value}'. Use YYYY-MM-DD.") from e
+
+
+def date_parser(description: str | None = None) -> argparse.ArgumentParser:
+    """
+    Base CLI parser with the `--date` argument. Entry points with 
+    extra options add them to this parser.
+    """
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "--date",
         type=str,
         help="Execution date in format: YYYY-MM-DD (default: today)",
     )
-    args = parser.parse_args()
+    return parser
+
+
+def parse_date_arg(args: argparse.Namespace | None = None) -> date:
+    if args is None:
+        args = date_parser().parse_args()
 
     if args.date:
         try:
@@ -35,13 +55,15 @@ def today():
     """
     return date.today()
 
-def get_exec_date(log, caller_name: str = "") -> date:
+def get_exec_date(log, caller_name: str = "",
+                  args: argparse.Namespace | None = None) -> date:
     """
     Parses date argument and logs execution context.
     Returns a datetime.date object.
+    `args`: already parsed arguments (see `date_parser`).
     """
     try:
-        exec_date = parse_date_arg()
+        exec_date = parse_date_arg(args)
         exec_date_f = exec_date.strftime("%Y-%m-%d")
         log.info((f"Running {caller_name or '__main__'}"
                  f"for date: {exec_date_f}"))
@@ -0,0 +1,218 @@
+'''
+Per-stage run metrics.
+
+`StageMetrics` is created by `PipeInit` (or directly by entry points
+without a database) and records wall time, records in/out, records/s,
+storage backend calls (DB round trips), rows inserted vs skipped by
+conflict per table, and peak RSS. Used as a context manager, it writes
+on exit:
+
+    - a JSON run report: `<dir>/<stage>_<start time>.json`
+    - a Prometheus textfile: `<dir>/jobnlp_<stage>.prom` (for the
+      node_exporter textfile collector; gauges of the last run)
+
+`<dir>` is `JOBNLP_METRICS_DIR` (default: `log/metrics`).
+'''
+import json
+import os
+import pathlib
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+from jobnlp.utils.logger import Logger
+
+METRICS_DIR = pathlib.Path(os.getenv("JOBNLP_METRICS_DIR", "log/metrics"))
+
+# backend insert methods -> table (rows inserted vs skipped)
+INSERT_METHODS = {
+    "insert_bronze": "ads_bronze",
+    "insert_bronze_many": "ads_bronze",
+    "insert_silver": "ads_silver",
+    "insert_silver_many": "ads_silver",
+    "insert_gold": "ads_gold",
+    "replace_gold_cooc": "ads_gold_cooc",
+    "replace_gold_trends": "ads_gold_trends",
+    "replace_gold_hll": "ads_gold_hll",
+}
+
+
+def peak_rss_bytes() -> int | None:
+    '''
+    Peak resident set size of this process and its finished children
+    (e.g. `nlp.pipe` workers).
+    '''
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # NOTE: kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class _InstrumentedBackend:
+    '''
+    Proxy of a `StorageBackend` that counts the calls of its methods
+    (one DB round trip each; `iter_layer` fetches in several) and the
+    rows inserted/skipped by the insert methods.
+    '''
+    def __init__(self, backend, metrics: "StageMetrics"):
+        self._backend = backend
+        self._metrics = metrics
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._backend, name)
+        # NOTE: methods only; `conn` is callable too (sqlite3)
+        if (not callable(getattr(type(self._backend), name, None))
+                or name.startswith("_") or name == "close"):
+            return attr
+        metrics = self._metrics
+
+        def call(*args, **kwargs):
+            metrics.add_call(name)
+            result = attr(*args, **kwargs)
+            table = INSERT_METHODS.get(name)
+            if table is not None:
+                rows = args[0] if args else kwargs.get("adds",
+                                                       kwargs.get("add"))
+                attempted = len(rows) if isinstance(rows, list) else 1
+                inserted = (len(result) if isinstance(result, list)
+                            else int(result or 0))
+                metrics.add_rows(table, attempted, inserted)
+            return result
+
+        return call
+
+
+class StageMetrics:
+    '''
+    Metrics of one stage run. See the module docstring.
+    '''
+    def __init__(self, stage: str, log: Logger | None = None,
+                 out_dir: pathlib.Path | None = None):
+        self.stage = stage
+        self.log = log
+        self.out_dir = out_dir or METRICS_DIR
+        self.started_at = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.records_in = 0
+        self.records_out = 0
+        self.calls: dict[str, int] = {}
+        self.rows: dict[str, dict[str, int]] = {}
+        self.extra: dict[str, Any] = {}
+        self.status = "running"
+
+    def instrument(self, backend):
+        return _InstrumentedBackend(backend, self)
+
+    def add_call(self, name: str) -> None:
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def add_rows(self, table: str, attempted: int, inserted: int) -> None:
+        with self._lock:
+            rows = self.rows.setdefault(table,
+                                        {"inserted": 0, "skipped": 0})
+            rows["inserted"] += inserted
+            rows["skipped"] += attempted - inserted
+
+    def add_records(self, records_in: int = 0, records_out: int = 0
+                    ) -> None:
+        self.records_in += records_in
+        self.records_out += records_out
+
+    def report(self) -> dict:
+        wall = time.perf_counter() - self._start
+        return {
+            "stage": self.stage,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_secs": round(wall, 3),
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "records_per_sec": round(self.records_in / wall, 1)
+                               if wall > 0 else 0.0,
+            "db_round_trips": sum(self.calls.values()),
+            "db_calls": dict(self.calls),
+            "rows": {t: dict(r) for t, r in self.rows.items()},
+            "peak_rss_bytes": peak_rss_bytes(),
+            **self.extra,
+        }
+
+    def _prometheus(self, rep: dict) -> str:
+        label = f'stage="{self.stage}"'
+        gauges = [
+            ("jobnlp_stage_success", "1 if the last run succeeded",
+             int(rep["status"] == "ok"), {}),
+            ("jobnlp_stage_last_run_timestamp_seconds",
+             "Start time of the last run",
+             self.started_at.timestamp(), {}),
+            ("jobnlp_stage_wall_seconds", "Wall time of the last run",
+             rep["wall_secs"], {}),
+            ("jobnlp_stage_records_in", "Records read by the last run",
+             rep["records_in"], {}),
+            ("jobnlp_stage_records_out", "Records written by the last run",
+             rep["records_out"], {}),
+            ("jobnlp_stage_records_per_second", "Records in per second",
+             rep["records_per_sec"], {}),
+            ("jobnlp_stage_db_round_trips", "Storage backend calls",
+             rep["db_round_trips"], {}),
+        ]
+        for table, rows in rep["rows"].items():
+            for kind in ("inserted", "skipped"):
+                gauges.append((f"jobnlp_stage_rows_{kind}",
+                               f"Rows {kind} by the last run",
+                               rows[kind], {"table": table}))
+        if rep["peak_rss_bytes"] is not None:
+            gauges.append(("jobnlp_stage_peak_rss_bytes",
+                           "Peak resident set size",
+                           rep["peak_rss_bytes"], {}))
+
+        lines, seen = [], set()
+        for name, help_, value, labels in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines += [f"# HELP {name} {help_}", f"# TYPE {name} gauge"]
+            extra = "".join(f',{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label}{extra}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> dict:
+        rep = self.report()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = self.started_at.strftime("%Y%m%dT%H%M%S")
+        json_path = self.out_dir / f"{self.stage}_{stamp}.json"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+        # NOTE: written to a temporary file and renamed, so the
+        # textfile collector never reads a partial file.
+        prom_path = self.out_dir / f"jobnlp_{self.stage}.prom"
+        tmp = prom_path.with_suffix(".prom.tmp")
+        tmp.write_text(self._prometheus(rep), encoding="utf-8")
+        tmp.replace(prom_path)
+        if self.log:
+            self.log.info(f"Metrics {self.stage}: {rep['records_in']} in, "
+                          f"{rep['records_out']} out, "
+                          f"{rep['records_per_sec']} rec/s, "
+                          f"{rep['db_round_trips']} DB round trips, "
+                          f"{rep['wall_secs']}s -> {json_path}")
+        return rep
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.status = "ok" if exc_type is None else "failed"
+        try:
+            self.write()
+        except OSError as e:
+            if self.log:
+                self.log.error(f"Could not write metrics: {e}")
+        return False
@@ -0,0 +1,218 @@
+'''
+Profiling mode for the entry points (`--profile`, or
+`JOBNLP_PROFILE=1` for Airflow runs).
+
+While enabled, a run is profiled with cProfile, allocations are traced
+with tracemalloc and the hot-path functions (`HOT_PATHS`) are timed.
+On exit two reports are written next to the stage logs (`log/`):
+
+    - `<stage>_<start time>.prof`: cProfile stats (`pstats`, snakeviz)
+    - `<stage>_<start time>.profile.txt`: hot-path timers, top
+      functions by cumulative time and top allocation sites
+
+Only the main process is profiled: `nlp.pipe` workers, `backfill`
+workers and the `nlp_server` of a client run are not. Hot-path timers
+also count calls from other threads (e.g. the silver writer), cProfile
+does not.
+'''
+import argparse
+import functools
+import importlib
+import os
+import pathlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterator
+
+# NOTE: cProfile, pstats, tracemalloc and inspect are imported only when
+# profiling is enabled; every entry point imports this module.
+if TYPE_CHECKING:
+    import cProfile
+    import tracemalloc
+
+from jobnlp.utils.logger import get_logger
+
+PROFILE_ENV = "JOBNLP_PROFILE"
+PROFILE_DIR = pathlib.Path("log")
+TOP_N = 25
+
+# (module, attribute) timed while profiling; `Class.method` attributes
+# are patched on the class.
+HOT_PATHS = [
+    ("jobnlp.pipeline.clean_text", "clean_html"),
+    ("jobnlp.pipeline.clean_text", "normalize_text"),
+    ("jobnlp.pipeline.nlp_extract", "extract_ents"),
+    ("jobnlp.pipeline.nlp_extract", "extract_ents_trie"),
+    ("jobnlp.db.models", "insert_bronze"),
+    ("jobnlp.db.models", "insert_bronze_many"),
+    ("jobnlp.db.models", "insert_silver"),
+    ("jobnlp.db.models", "insert_silver_many"),
+    ("jobnlp.db.models", "insert_gold"),
+    ("jobnlp.db.backends.sqlite", "SQLiteBackend.insert_bronze"),
+    ("jobnlp.db.backends.sqlite", "SQLiteBackend.insert_bronze_many"),
+    ("jobnlp.db.backends.sqlite", "SQLiteBackend.insert_silver"),
+    ("jobnlp.db.backends.sqlite", "SQLiteBackend.insert_silver_many"),
+    ("jobnlp.db.backends.sqlite", "SQLiteBackend.insert_gold"),
+]
+# NOTE: the pipeline modules are only timed if the entry point already
+# imported them (profiling `fetch_raw` must not load spaCy); the db
+# modules are imported here, before the backend imports them.
+_IMPORT_FOR_TIMING = ("jobnlp.db.models", "jobnlp.db.backends.sqlite")
+
+
+def add_profile_arg(parser: argparse.ArgumentParser
+                    ) -> argparse.ArgumentParser:
+    parser.add_argument("--profile", action="store_true",
+                        help="Write cProfile, tracemalloc and hot-path "
+                             f"reports to {PROFILE_DIR}/ "
+                             f"(or set {PROFILE_ENV}=1)")
+    return parser
+
+def profile_enabled(flag: bool | None = None) -> bool:
+    return bool(flag) or os.getenv(PROFILE_ENV, "").lower() in (
+        "1", "true", "yes")
+
+
+class HotPathTimers:
+    '''
+    Replaces the `HOT_PATHS` functions with timed wrappers while
+    installed. Generator functions are timed over their iteration.
+    '''
+    def __init__(self):
+        self.stats: dict[str, list] = {}    # name -> [calls, seconds]
+        self._lock = threading.Lock()
+        self._patched: list[tuple[object, str, object]] = []
+
+    def _add(self, name: str, secs: float, calls: int = 1) -> None:
+        with self._lock:
+            st = self.stats.setdefault(name, [0, 0.0])
+            st[0] += calls
+            st[1] += secs
+
+    def _wrap(self, name: str, fn):
+        import inspect
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def timed_gen(*args, **kwargs):
+                gen = fn(*args, **kwargs)
+                self._add(name, 0.0)
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(gen)
+                    except StopIteration:
+                        self._add(name, time.perf_counter() - start, 0)
+                        return
+                    self._add(name, time.perf_counter() - start, 0)
+                    yield item
+            return timed_gen
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._add(name, time.perf_counter() - start)
+        return timed
+
+    def install(self) -> None:
+        for mod_name in _IMPORT_FOR_TIMING:
+            try:
+                importlib.import_module(mod_name)
+            except ImportError:     # e.g. no psycopg2 with SQLite
+                pass
+        for mod_name, attr in HOT_PATHS:
+            owner = sys.modules.get(mod_name)
+            if owner is None:
+                continue
+            *cls, fn_name = attr.split(".")
+            if cls:
+                owner = getattr(owner, cls[0])
+            fn = getattr(owner, fn_name)
+            self._patched.append((owner, fn_name, fn))
+            setattr(owner, fn_name, self._wrap(f"{mod_name}.{attr}", fn))
+
+    def uninstall(self) -> None:
+        for owner, fn_name, fn in reversed(self._patched):
+            setattr(owner, fn_name, fn)
+        self._patched.clear()
+
+    def report(self) -> str:
+        lines = [f"{'calls':>10} {'total s':>10} {'ms/call':>10}  function"]
+        for name, (calls, secs) in sorted(self.stats.items(),
+                                          key=lambda kv: -kv[1][1]):
+            per_call = secs / calls * 1000 if calls else 0.0
+            lines.append(f"{calls:>10} {secs:>10.3f} {per_call:>10.3f}  "
+                         f"{name}")
+        return "\n".join(lines)
+
+
+def _write_reports(stage: str, started: datetime,
+                   prof: "cProfile.Profile", timers: HotPathTimers,
+                   snapshot: "tracemalloc.Snapshot",
+                   out_dir: pathlib.Path) -> pathlib.Path:
+    import io
+    import pstats
+    import tracemalloc
+    out_dir.mkdir(parents=True, exist_ok=True)
+    base = out_dir / f"{stage}_{started.strftime('%Y%m%dT%H%M%S')}"
+    prof.dump_stats(base.with_suffix(".prof"))
+
+    buf = io.StringIO()
+    pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(TOP_N)
+    allocs = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    )).statistics("lineno")[:TOP_N]
+
+    txt = base.with_suffix(".profile.txt")
+    with open(txt, "w", encoding="utf-8") as f:
+        f.write(f"# {stage} profile, started {started.isoformat()}\n\n")
+        f.write("## Hot-path timers\n\n" + timers.report() + "\n\n")
+        f.write(f"## Top {TOP_N} functions by cumulative time\n\n")
+        f.write(buf.getvalue() + "\n")
+        f.write(f"## Top {TOP_N} allocation sites (live at exit)\n\n")
+        f.write("\n".join(str(stat) for stat in allocs) + "\n")
+        peak = tracemalloc.get_traced_memory()[1]
+        f.write(f"\nPeak traced memory: {peak / 2**20:.1f} MiB\n")
+    return txt
+
+@contextmanager
+def profiling(stage: str, enabled: bool | None = None,
+              out_dir: pathlib.Path = PROFILE_DIR) -> Iterator[None]:
+    '''
+    Profile the block if `enabled` (the `--profile` flag) or
+    `JOBNLP_PROFILE` is set; otherwise do nothing.
+    '''
+    if not profile_enabled(enabled):
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+
+    log = get_logger(__name__)
+    started = datetime.now()
+    timers = HotPathTimers()
+    timers.install()
+    tracemalloc.start()
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        snapshot = tracemalloc.take_snapshot()
+        timers.uninstall()
+        try:
+            txt = _write_reports(stage, started, prof, timers, snapshot,
+                                 out_dir)
+            log.info(f"Profile of {stage} written to: {txt}")
+        except OSError as e:
+            log.error(f"Could not write profile of {stage}: {e}")
+        finally:
+            tracemalloc.stop()